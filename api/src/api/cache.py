@@ -0,0 +1,378 @@
+import copy
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+import numpy as np
+
+from .knowledge.vectors import HashingEmbedder
+from .utils import log
+
+logger = log.get_logger(__name__)
+
+#### Types ####
+
+class CacheStats:
+    """Hit/miss/eviction counters for a cache."""
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hit_ratio,
+        }
+
+class MemoryCache:
+    """
+    In-process LRU cache with optional per-entry TTL.
+
+    Values are shallow-copied on the way in and out, so callers never hold
+    the cached object itself and a later append can't change a list they're
+    reading.
+
+    Args:
+        name: Name used in logs and stats
+        max_size: Maximum number of entries before the least recently used is evicted
+        ttl: Default time-to-live in seconds, or None for no expiry
+    """
+    def __init__(self, name: str, max_size: int = 1024, ttl: Optional[float] = None):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._entries: OrderedDict[str, tuple[Optional[float], Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _lookup(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._entries[key]
+            self.stats.evictions += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def get(self, key: str) -> Any:
+        """Get a value, or None if absent or expired."""
+        value = self._lookup(key)
+        if value is None:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        return copy.copy(value)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value, evicting the least recently used entries if full."""
+        ttl = ttl if ttl is not None else self.ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        self._entries[key] = (expires_at, copy.copy(value))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    async def append(self, key: str, item: Any) -> bool:
+        """
+        Append an item to a cached list, if the list is cached.
+
+        Returns:
+            True if the entry was updated, False if it wasn't cached
+        """
+        value = self._lookup(key)
+        if value is None:
+            return False
+        value.append(item)
+        return True
+
+    async def delete(self, key: str) -> None:
+        """Remove a value if present."""
+        self._entries.pop(key, None)
+
+    async def close(self) -> None:
+        self._entries.clear()
+
+class RedisCache:
+    """
+    Redis-backed cache sharing entries between API workers.
+
+    Values are stored as JSON. Size-based eviction is left to the Redis
+    `maxmemory-policy`; entries expire after `ttl` seconds.
+
+    Args:
+        name: Name used in logs, stats and as the key prefix
+        url: Redis connection URL
+        ttl: Default time-to-live in seconds, or None for no expiry
+    """
+    def __init__(self, name: str, url: str, ttl: Optional[float] = None):
+        import redis.asyncio as redis
+
+        self.name = name
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._redis = redis.from_url(url)
+
+    def _key(self, key: str) -> str:
+        return f"{self.name}:{key}"
+
+    def _px(self, ttl: Optional[float]) -> Optional[int]:
+        ttl = ttl if ttl is not None else self.ttl
+        return int(ttl * 1000) if ttl else None
+
+    async def get(self, key: str) -> Any:
+        """Get a value, or None if absent or expired."""
+        raw = await self._redis.get(self._key(key))
+        if raw is None:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        return json.loads(raw)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value."""
+        await self._redis.set(self._key(key), json.dumps(value), px=self._px(ttl))
+
+    async def append(self, key: str, item: Any) -> bool:
+        """
+        Append an item to a cached list, if the list is cached.
+
+        Uses an optimistic WATCH/MULTI transaction so concurrent appends from
+        several workers don't overwrite each other.
+
+        Returns:
+            True if the entry was updated, False if it wasn't cached
+        """
+        rkey = self._key(key)
+        updated = False
+
+        async def update(pipe):
+            nonlocal updated
+            raw = await pipe.get(rkey)
+            if raw is None:
+                updated = False
+                return
+            value = json.loads(raw)
+            value.append(item)
+            pipe.multi()
+            pipe.set(rkey, json.dumps(value), keepttl=True)
+            updated = True
+
+        await self._redis.transaction(update, rkey)
+        return updated
+
+    async def delete(self, key: str) -> None:
+        """Remove a value if present."""
+        await self._redis.delete(self._key(key))
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+Cache = MemoryCache | RedisCache
+
+class SemanticCache:
+    """
+    In-process cache keyed on text, with optional similarity matching.
+
+    Lookups first try an exact match on a normalized fingerprint of the text
+    (case, punctuation and whitespace are ignored). If that misses and a
+    similarity threshold is set, the text is embedded and compared against
+    the embeddings of all cached texts with one matrix-vector product; the
+    best match is used if its cosine similarity reaches the threshold.
+
+    Besides hits and misses, the cache tracks the latency saved by hits,
+    estimated from the average latency of the computations it stored.
+
+    Args:
+        name: Name used in logs and stats
+        max_size: Maximum number of entries before the least recently used is evicted
+        ttl: Time-to-live in seconds, or None for no expiry
+        similarity: Minimum cosine similarity for a near match, or None for exact only
+        embedder: Embedder for near matching
+    """
+    def __init__(
+        self,
+        name: str,
+        max_size: int = 1024,
+        ttl: Optional[float] = None,
+        similarity: Optional[float] = None,
+        embedder: Optional[HashingEmbedder] = None
+    ):
+        self.name = name
+        self.similarity = similarity
+        self.embedder = embedder or (HashingEmbedder() if similarity else None)
+        self.entries = MemoryCache(name, max_size=max_size, ttl=ttl)
+        self.similar_hits = 0
+        self.saved_ms = 0.0
+        self._computed = 0
+        self._computed_ms = 0.0
+        self._vectors: dict[str, np.ndarray] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: list[str] = []
+
+    @property
+    def stats(self) -> CacheStats:
+        return self.entries.stats
+
+    @staticmethod
+    def fingerprint(text: str) -> str:
+        """Hash of the text with case, punctuation and whitespace normalized."""
+        normalized = " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+        return hashlib.sha256(normalized.encode()).hexdigest()
+
+    def _nearest(self, vector: np.ndarray) -> Optional[str]:
+        if not self._vectors:
+            return None
+        if self._matrix is None:
+            self._matrix_keys = list(self._vectors)
+            self._matrix = np.stack([self._vectors[k] for k in self._matrix_keys])
+        scores = self._matrix @ vector
+        best = int(np.argmax(scores))
+        if scores[best] >= self.similarity:
+            return self._matrix_keys[best]
+        return None
+
+    def _avg_computed_ms(self) -> float:
+        return self._computed_ms / self._computed if self._computed else 0.0
+
+    async def get(self, text: str) -> Any:
+        """Get the value cached for this text or a near match, or None."""
+        value = self.entries._lookup(self.fingerprint(text))
+        if value is None and self.similarity:
+            near_key = self._nearest(self.embedder.embed([text])[0])
+            if near_key is not None:
+                value = self.entries._lookup(near_key)
+                if value is None:
+                    # Evicted since; forget its embedding
+                    del self._vectors[near_key]
+                    self._matrix = None
+                else:
+                    self.similar_hits += 1
+
+        if value is None:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        self.saved_ms += self._avg_computed_ms()
+        return value
+
+    async def set(self, text: str, value: Any, computed_ms: float = 0.0) -> None:
+        """
+        Cache a value for this text.
+
+        Args:
+            text: The text the value was computed from
+            value: The value
+            computed_ms: How long computing the value took, for saved latency stats
+        """
+        key = self.fingerprint(text)
+        await self.entries.set(key, value)
+        self._computed += 1
+        self._computed_ms += computed_ms
+        if self.similarity:
+            self._vectors[key] = self.embedder.embed([text])[0]
+            if len(self._vectors) > 2 * self.entries.max_size:
+                # Drop embeddings of evicted entries
+                self._vectors = {
+                    k: v for (k, v) in self._vectors.items() if k in self.entries._entries
+                }
+            self._matrix = None
+
+    def stats_dict(self) -> dict[str, Any]:
+        return {
+            **self.stats.as_dict(),
+            "similar_hits": self.similar_hits,
+            "saved_ms": round(self.saved_ms, 1),
+        }
+
+    async def close(self) -> None:
+        await self.entries.close()
+        self._vectors.clear()
+        self._matrix = None
+
+class ResponseCache:
+    """
+    Cache of generated responses, with hit/miss stats kept per route.
+
+    Args:
+        cache: The backing memory or Redis cache
+        recent_messages: Number of trailing conversation messages responses are keyed on
+    """
+    def __init__(self, cache: Cache, recent_messages: int = 2):
+        self.cache = cache
+        self.recent_messages = recent_messages
+        self.routes: dict[str, CacheStats] = {}
+
+    @property
+    def stats(self) -> CacheStats:
+        return self.cache.stats
+
+    async def get(self, key: str, route: str) -> Any:
+        """Get a cached response, counting the lookup against the route."""
+        value = await self.cache.get(key)
+        stats = self.routes.setdefault(route, CacheStats())
+        if value is None:
+            stats.misses += 1
+        else:
+            stats.hits += 1
+        return value
+
+    async def set(self, key: str, value: Any) -> None:
+        """Store a response."""
+        await self.cache.set(key, value)
+
+    def stats_dict(self) -> dict[str, Any]:
+        return {
+            **self.stats.as_dict(),
+            "routes": {route: stats.as_dict() for (route, stats) in self.routes.items()},
+        }
+
+    async def close(self) -> None:
+        await self.cache.close()
+
+#### API ####
+
+def create_cache(
+    name: str,
+    backend: str,
+    max_size: int = 1024,
+    ttl: Optional[float] = None,
+    redis_url: Optional[str] = None,
+) -> Optional[Cache]:
+    """
+    Create a cache for the given backend.
+
+    Args:
+        name: Name of the cache
+        backend: One of 'memory', 'redis' or 'none'
+        max_size: Maximum entries (memory backend only)
+        ttl: Default time-to-live in seconds
+        redis_url: Redis connection URL (redis backend only)
+
+    Returns:
+        The cache, or None if caching is disabled
+    """
+    if backend == "none" or max_size <= 0:
+        return None
+    if backend == "redis":
+        logger.info(f"Using Redis cache for {name}")
+        return RedisCache(name, redis_url, ttl=ttl)
+    if backend != "memory":
+        logger.warning(f"Unknown cache backend {backend!r} for {name}; using memory")
+    return MemoryCache(name, max_size=max_size, ttl=ttl)
@@ -1,16 +1,156 @@
+import asyncio
+import bisect
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import functools
+import re
 import uuid
 from typing import List, Optional, Dict, Any, Tuple
-from datetime import datetime
-import time
+from datetime import datetime, timedelta
 from couchbase.cluster import Cluster
-from couchbase.options import ClusterOptions, QueryOptions
+from couchbase.diagnostics import PingState, ServiceType
+from couchbase.exceptions import DocumentExistsException, DocumentNotFoundException
+from couchbase.kv_range_scan import PrefixScan
+from couchbase.options import (
+    ClusterOptions,
+    DeltaValue,
+    IncrementOptions,
+    InsertMultiOptions,
+    InsertOptions,
+    MutateInOptions,
+    PingOptions,
+    QueryOptions,
+    ScanOptions,
+    SignedInt64,
+    UpsertOptions,
+    WaitUntilReadyOptions
+)
 from couchbase.auth import PasswordAuthenticator
+import couchbase.subdocument as SD
 
+from ..cache import Cache
+from ..metrics import store_timed
 from ..utils import log
 
 logger = log.get_logger(__name__)
 
+# Maximum documents per batched remove
+REMOVE_BATCH_SIZE = 1000
+
+# Secondary indexes on the chats collection, created by util/init-couchbase
+CHAT_LIST_INDEX = "idx_chats_updated_at"
+CHAT_CLIENT_INDEX = "idx_chats_client_id"
+
+# Metadata keys chats can be filtered on are spliced into queries, so they
+# are restricted to plain identifiers
+METADATA_KEY = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+#### Round Trips ####
+
+_round_trips: contextvars.ContextVar[Optional[Counter]] = contextvars.ContextVar(
+    "store_round_trips", default=None
+)
+
+def track_round_trips() -> Counter:
+    """
+    Start counting store round trips made in the current context.
+
+    Returns:
+        Counter of round trips by operation, updated as they happen
+    """
+    counter = Counter()
+    _round_trips.set(counter)
+    return counter
+
+def _count(op: str) -> None:
+    """Count a store round trip against the current context, if tracked."""
+    counter = _round_trips.get()
+    if counter is not None:
+        counter[op] += 1
+
+#### Pagination ####
+
+def page_message_ids(
+    message_ids: List[int],
+    limit: Optional[int] = None,
+    before: Optional[int] = None,
+    after: Optional[int] = None
+) -> Tuple[List[int], bool]:
+    """
+    Select a page of a chat's message IDs.
+
+    Pages run backwards from `before` (or the newest message), or forwards
+    from `after` if it's given without `before`.
+
+    Args:
+        message_ids: All of the chat's message IDs, in order
+        limit: Optional maximum number of IDs
+        before: Optional message ID; only older messages are included
+        after: Optional message ID; only newer messages are included
+
+    Returns:
+        The page of IDs in order, and whether more IDs lie beyond it
+    """
+    start = bisect.bisect_right(message_ids, after) if after is not None else 0
+    end = bisect.bisect_left(message_ids, before) if before is not None else len(message_ids)
+    if end <= start:
+        return ([], False)
+    if limit is None or end - start <= limit:
+        return (message_ids[start:end], False)
+    if limit <= 0:
+        return ([], True)
+    if after is not None and before is None:
+        return (message_ids[start:start + limit], True)
+    return (message_ids[end - limit:end], True)
+
+#### Query Plans ####
+
+def plan_indexes(plan: Any) -> List[str]:
+    """Names of the indexes scanned by a query plan."""
+    if isinstance(plan, list):
+        return [name for item in plan for name in plan_indexes(item)]
+    if not isinstance(plan, dict):
+        return []
+    names = []
+    if plan.get("#operator", "").startswith("IndexScan") and "index" in plan:
+        names.append(plan["index"])
+    for value in plan.values():
+        names.extend(plan_indexes(value))
+    return names
+
+def plan_sorts(plan: Any) -> bool:
+    """Whether a query plan sorts its results rather than reading them in index order."""
+    if isinstance(plan, list):
+        return any(plan_sorts(item) for item in plan)
+    if not isinstance(plan, dict):
+        return False
+    return plan.get("#operator") == "Order" or any(plan_sorts(v) for v in plan.values())
+
 class CouchbaseChatClient:
+    """
+    Chat store on top of a Couchbase scope.
+
+    Chats live in the chats collection keyed by chat ID. Messages live in the
+    messages collection keyed by `{chat_id}:{message_id}`, and each chat has a
+    manifest document `{chat_id}:manifest` listing its message IDs in order,
+    plus an optional `{chat_id}:summary` document with a rolling summary of
+    its older messages.
+    Histories are read by fetching the manifest and then the wanted page of
+    messages with a single batched KV get, so reads never touch the query
+    service and scale with page size rather than collection size.
+
+    Message IDs come from a per-chat counter document `{chat_id}:seq`, so
+    they are unique and increasing within a chat however fast messages are
+    written. The counter starts at the current time in milliseconds, which
+    keeps new IDs above the timestamp IDs of messages written before it
+    existed.
+
+    With a retention period, every document is written with that expiry, and
+    writes to a chat push back the expiry of the chat and its manifest, so a
+    chat disappears once it has been idle for the period and each message
+    once it is older than it. See RetentionSweeper for existing documents.
+    """
     def __init__(
         self,
         url: str = None,
@@ -19,7 +159,10 @@ class CouchbaseChatClient:
         bucket_name: str = None,
         scope: str = "_default",
         chats_coll: str = "chats",
-        messages_coll: str = "chat_messages"
+        messages_coll: str = "chat_messages",
+        retention: Optional[timedelta] = None,
+        cluster_options: Optional[Dict[str, Any]] = None,
+        ready_timeout: timedelta = timedelta(seconds=10)
     ):
         self.url = url
         self.username = username
@@ -28,19 +171,47 @@ class CouchbaseChatClient:
         self.scope_name = scope
         self.chats_coll = chats_coll
         self.messages_coll = messages_coll
+        self.retention = retention
+        self.cluster_options = cluster_options or {}
+        self.ready_timeout = ready_timeout
         self.cluster = None
         self.bucket = None
         self.scope = None
         self.chats = None
         self.messages = None
-        self._is_query_service_ready = False
 
+    def expiry(self) -> Dict[str, Any]:
+        """Options setting document expiry per the retention period, if any."""
+        return {"expiry": self.retention} if self.retention else {}
+
+    @property
+    def retention_stamp(self) -> Optional[int]:
+        """
+        Value of a chat's `retention` field once its documents expire per the
+        current retention period, or None without one. Chats written under
+        the period are stamped at write time, so RetentionSweeper skips them.
+        """
+        return int(self.retention.total_seconds()) if self.retention else None
+
+    @store_timed("connect")
     def connect(self) -> None:
-        """Establish connection to Couchbase database."""
+        """
+        Establish connection to Couchbase database, waiting up to
+        `ready_timeout` for the KV and query services.
+        """
         auth = PasswordAuthenticator(self.username, self.password)
-        options = ClusterOptions(auth)
+        options = ClusterOptions(auth, **self.cluster_options)
 
-        self.cluster = Cluster(self.url, options)
+        cluster = Cluster(self.url, options)
+        try:
+            cluster.wait_until_ready(
+                self.ready_timeout,
+                WaitUntilReadyOptions(service_types=[ServiceType.KeyValue, ServiceType.Query])
+            )
+        except Exception:
+            cluster.close()
+            raise
+        self.cluster = cluster
 
         try:
             self.bucket = self.cluster.bucket(self.bucket_name)
@@ -54,6 +225,7 @@ class CouchbaseChatClient:
         except Exception as bucket_err:
             logger.warning(f"Bucket not ready yet: {str(bucket_err)}")
 
+    @store_timed("init")
     def init(self) -> None:
         """Create the collections if they don't exist."""
         if not self.cluster:
@@ -83,52 +255,25 @@ class CouchbaseChatClient:
             logger.error(f"Error initializing collections: {str(e)}")
             raise
 
-    def await_up(self, max_retries: int = 30, initial_delay: float = 1.0, max_delay: float = 10.0) -> None:
+    @store_timed("check_ready")
+    def check_ready(self) -> None:
         """
-        Wait until the Couchbase query service is available by running a simple query in a loop.
+        Connect if needed and check that the collections are open and the
+        query service answers, with a single attempt.
 
-        Args:
-            max_retries: Maximum number of retry attempts.
-            initial_delay: Initial delay between retries in seconds.
-            max_delay: Maximum delay between retries in seconds.
+        Raises:
+            Exception: If the store isn't ready yet
         """
-        # If we already know the service is ready, skip the check
-        if self._is_query_service_ready:
-            return
-
         if not self.cluster:
             self.connect()
+        if not self.chats or not self.messages:
+            self.bucket = self.cluster.bucket(self.bucket_name)
+            self.scope = self.bucket.scope(self.scope_name)
+            self.init()
+        _count("query")
+        list(self.cluster.query("SELECT 1"))
 
-        delay = initial_delay
-        for attempt in range(1, max_retries + 1):
-            try:
-                # Try a simple query that doesn't depend on any collections
-                query = "SELECT 1"
-                result = self.cluster.query(query)
-                # Consume the result to ensure it completes
-                list(result)
-
-                # If we got here, the query service is ready
-                self._is_query_service_ready = True
-                logger.info("Couchbase query service is ready")
-                return
-            except Exception as e:
-                if "service_not_available" in str(e):
-                    logger.warning(
-                        f"Attempt {attempt}/{max_retries}: Couchbase query service not available yet. "
-                        f"Retrying in {delay:.1f} seconds..."
-                    )
-                    time.sleep(delay)
-                    # Exponential backoff with a cap
-                    delay = min(max_delay, delay * 1.5)
-                else:
-                    # If it's not a service unavailable error, something else is wrong
-                    logger.error(f"Error checking Couchbase query service: {str(e)}")
-                    raise
-
-        # If we've exhausted all retries
-        raise Exception(f"Couchbase query service not available after {max_retries} attempts")
-
+    @store_timed("create_chat")
     def create_chat(self, metadata: Dict[str, Any] = None) -> str:
         """
         Create a new chat session.
@@ -150,21 +295,32 @@ class CouchbaseChatClient:
             "updated_at": now,
             "metadata": metadata or {}
         }
+        if self.retention:
+            doc["retention"] = self.retention_stamp
 
         try:
-            self.chats.upsert(chat_id, doc)
+            _count("chats.upsert")
+            self.chats.upsert(chat_id, doc, UpsertOptions(**self.expiry()))
+            _count("messages.upsert")
+            self.messages.upsert(
+                self.manifest_key(chat_id),
+                {"message_ids": []},
+                UpsertOptions(**self.expiry())
+            )
             logger.info(f"Created chat session with ID: {chat_id}")
             return chat_id
         except Exception:
             logger.exception("Failed to create chat")
             raise
 
+    @store_timed("add_message")
     def add_message(
         self,
         chat_id: str,
         role: str,
         content: str,
-        metadata: Dict[str, Any] = None
+        metadata: Dict[str, Any] = None,
+        chat: Optional[Dict[str, Any]] = None
     ) -> Tuple[int, str]:
         """
         Add a message to an existing chat session.
@@ -174,44 +330,92 @@ class CouchbaseChatClient:
             role: The role of the message sender (e.g., 'user', 'assistant')
             content: The content of the message
             metadata: Optional metadata for the message
+            chat: The chat session, if already loaded; its `updated_at` is kept current
 
         Returns:
             The ID of the added message
         """
+        return self.add_messages(chat_id, [(role, content, metadata)], chat)[0]
+
+    @store_timed("add_messages")
+    def add_messages(
+        self,
+        chat_id: str,
+        messages: List[Tuple[str, str, Optional[Dict[str, Any]]]],
+        chat: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[int, str]]:
+        """
+        Add several messages to an existing chat session, such as both sides
+        of a turn.
+
+        Costs four round trips however many messages there are: a sub-document
+        update of the chat's `updated_at` (which also checks the chat exists),
+        an increment reserving the message IDs, a batched insert of the
+        messages, and one append to the manifest. Writing to a chat not yet
+        stamped with the retention period costs one more, to set the expiry
+        of its message counter and summary.
+
+        Args:
+            chat_id: The UUID of the chat session
+            messages: (role, content, metadata) of each message, in order
+            chat: The chat session, if already loaded; its `updated_at` is kept current
+
+        Returns:
+            The ID and creation time of each added message
+        """
         if not self.messages:
-            self.init(wait=True)
+            self.init()
 
         try:
-            chat = self.get_chat(chat_id)
             now = datetime.utcnow()
-            if not chat:
+            specs = [SD.upsert("updated_at", now.isoformat())]
+            if self.retention:
+                specs.append(SD.upsert("retention", self.retention_stamp))
+            try:
+                _count("chats.mutate_in")
+                self.chats.mutate_in(chat_id, specs, MutateInOptions(**self.expiry()))
+            except DocumentNotFoundException:
                 raise ValueError(f"Chat with ID {chat_id} not found")
+            message_ids = self._reserve_message_ids(chat_id, len(messages), now)
+            if self.retention and (chat is None or chat.get("retention") != self.retention_stamp):
+                # Restamping the chat; the counter and summary only get an
+                # expiry when created, so carry the period over to them too
+                _count("messages.touch_multi")
+                self.messages.touch_multi(
+                    [self.sequence_key(chat_id), self.summary_key(chat_id)], self.retention
+                )
+            if chat is not None:
+                chat["updated_at"] = now.isoformat()
+                if self.retention:
+                    chat["retention"] = self.retention_stamp
+            docs = {}
+            added = []
+            for (message_id, (role, content, metadata)) in zip(message_ids, messages):
+                docs[self.message_key(chat_id, message_id)] = {
+                    "id": message_id,
+                    "chat_id": chat_id,
+                    "role": role,
+                    "content": content,
+                    "created_at": now.isoformat(),
+                    "metadata": metadata or {}
+                }
+                added.append((message_id, now.isoformat()))
 
-            # Update chat's timestamp
-            chat["updated_at"] = now.isoformat()
-            self.chats.upsert(chat_id, chat)
-
-            # NOTE: Message ID is just a timestamp, for sortability
-            message_id = int(now.timestamp() * 1000)
-
-            message_key = f"{chat_id}:{message_id}"
-            message_doc = {
-                "id": message_id,
-                "chat_id": chat_id,
-                "role": role,
-                "content": content,
-                "created_at": now.isoformat(),
-                "metadata": metadata or {}
-            }
-
-            self.messages.upsert(message_key, message_doc)
+            # Insert rather than upsert, so a duplicate ID fails loudly instead
+            # of silently replacing a message
+            _count("messages.insert_multi")
+            result = self.messages.insert_multi(docs, InsertMultiOptions(**self.expiry()))
+            if not result.all_ok:
+                raise next(iter(result.exceptions.values()))
+            self._append_to_manifest(chat_id, [message_id for (message_id, _) in added])
 
-            logger.info(f"Added message with ID {message_id} to chat {chat_id}")
-            return message_id, now.isoformat()
+            logger.debug("Added %d message(s) to chat %s", len(added), chat_id)
+            return added
         except Exception:
             logger.exception("Failed to add message.")
             raise
 
+    @store_timed("get_chat")
     def get_chat(self, chat_id: str) -> Optional[Dict[str, Any]]:
         """
         Get a chat session by ID.
@@ -226,6 +430,7 @@ class CouchbaseChatClient:
             self.init()
 
         try:
+            _count("chats.get")
             result = self.chats.get(chat_id)
 
             if not result or not hasattr(result, 'value') or not result.value:
@@ -236,41 +441,338 @@ class CouchbaseChatClient:
             logger.warning(f"Failed to get chat: {str(e)}")
             return None
 
-    def get_messages(self, chat_id: str) -> List[Dict[str, Any]]:
+    def manifest_key(self, chat_id: str) -> str:
+        """Key of the document listing a chat's message IDs."""
+        return f"{chat_id}:manifest"
+
+    def message_key(self, chat_id: str, message_id: int) -> str:
+        """Key of a message document."""
+        return f"{chat_id}:{message_id}"
+
+    def sequence_key(self, chat_id: str) -> str:
+        """Key of the counter document message IDs are drawn from."""
+        return f"{chat_id}:seq"
+
+    def _reserve_message_ids(self, chat_id: str, count: int, now: datetime) -> range:
         """
-        Get all messages for a chat session.
+        Reserve a block of consecutive message IDs with one atomic increment.
 
         Args:
             chat_id: The UUID of the chat session
+            count: Number of IDs to reserve
+            now: Current time, which the counter starts from if it doesn't exist yet
 
         Returns:
-            List of messages in the chat session
+            The reserved IDs, in increasing order
+        """
+        # A new counter is created holding `initial` rather than incremented, so
+        # start it at the last ID of the block either way
+        _count("messages.increment")
+        result = self.messages.binary().increment(
+            self.sequence_key(chat_id),
+            IncrementOptions(
+                delta=DeltaValue(count),
+                initial=SignedInt64(int(now.timestamp() * 1000) + count - 1),
+                **self.expiry()
+            )
+        )
+        return range(result.content - count + 1, result.content + 1)
+
+    def advance_message_ids(self, last_ids: Dict[str, int]) -> None:
+        """
+        Make sure the IDs reserved for each chat from now on are above the
+        given one, such as after importing its messages.
+
+        Counters are only ever raised: one already past the given ID, say
+        from messages added meanwhile, is left alone. Costs a batched get, a
+        batched insert of the missing counters, and an increment per counter
+        that is behind.
+
+        Args:
+            last_ids: The highest message ID of each chat, by chat ID
+        """
+        wanted = {self.sequence_key(chat_id): last_id for (chat_id, last_id) in last_ids.items()}
+        while wanted:
+            _count("messages.get_multi")
+            result = self.messages.get_multi(list(wanted))
+            for exception in result.exceptions.values():
+                if not isinstance(exception, DocumentNotFoundException):
+                    raise exception
+            current = result.results
+
+            missing = {key: value for (key, value) in wanted.items() if key not in current}
+            retry = {}
+            if missing:
+                _count("messages.insert_multi")
+                result = self.messages.insert_multi(missing, InsertMultiOptions(**self.expiry()))
+                for (key, exception) in result.exceptions.items():
+                    if not isinstance(exception, DocumentExistsException):
+                        raise exception
+                    # Created meanwhile; raise it on the next pass
+                    retry[key] = missing[key]
+
+            for (key, counter) in current.items():
+                behind = wanted[key] - counter.content_as[int]
+                if behind > 0:
+                    # An increment can't lower a counter that rose meanwhile
+                    _count("messages.increment")
+                    self.messages.binary().increment(key, IncrementOptions(delta=DeltaValue(behind)))
+            wanted = retry
+
+    def summary_key(self, chat_id: str) -> str:
+        """Key of the document holding a chat's rolling summary."""
+        return f"{chat_id}:summary"
+
+    @store_timed("get_summary")
+    def get_summary(self, chat_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the rolling summary of a chat session's older messages.
+
+        Args:
+            chat_id: The UUID of the chat session
+
+        Returns:
+            A dict with the `summary` text and `summary_upto`, the ID of the
+            last summarized message, or None if the chat has no summary
         """
         if not self.messages:
             self.init()
 
-        # Make sure the query service is available
-        self.await_up()
+        try:
+            _count("messages.get")
+            return self.messages.get(self.summary_key(chat_id)).value
+        except DocumentNotFoundException:
+            return None
+
+    @store_timed("set_summary")
+    def set_summary(self, chat_id: str, summary: str, summary_upto: int) -> None:
+        """
+        Store the rolling summary of a chat session's older messages.
 
+        Args:
+            chat_id: The UUID of the chat session
+            summary: The summary text
+            summary_upto: The ID of the last message covered by the summary
+        """
+        if not self.messages:
+            self.init()
+
+        _count("messages.upsert")
+        self.messages.upsert(
+            self.summary_key(chat_id),
+            {"summary": summary, "summary_upto": summary_upto},
+            UpsertOptions(**self.expiry())
+        )
+
+    def _append_to_manifest(self, chat_id: str, message_ids: List[int]) -> None:
+        """Append message IDs to the chat's manifest, creating it for legacy chats."""
         try:
-            query = f"""
-            SELECT m.*
-            FROM {self.bucket_name}.{self.scope_name}.{self.messages_coll} m
-            WHERE m.chat_id = $chat_id
-            ORDER BY m.created_at ASC
-            """
-
-            options = QueryOptions(named_parameters={"chat_id": chat_id})
-            result = self.cluster.query(query, options)
-            return [row for row in result]
+            _count("messages.mutate_in")
+            self.messages.mutate_in(
+                self.manifest_key(chat_id),
+                [SD.array_append("message_ids", *message_ids)],
+                MutateInOptions(**self.expiry())
+            )
+        except DocumentNotFoundException:
+            # Chat predates manifests; rebuild it, which picks up this message
+            self._build_manifest(chat_id)
+
+    def _build_manifest(self, chat_id: str) -> List[int]:
+        """
+        Build the manifest of a legacy chat from a KV prefix scan over its
+        message keys.
+
+        Only needed once per chat created before manifests existed. Unknown
+        chats get no manifest, so reads of a bad chat ID leave nothing behind.
+
+        Args:
+            chat_id: The UUID of the chat session
+
+        Returns:
+            The chat's message IDs in order, or an empty list if the chat doesn't exist
+        """
+        _count("chats.exists")
+        if not self.chats.exists(chat_id).exists:
+            return []
+        message_ids = sorted(
+            int(key.rpartition(":")[2]) for key in self._scan_message_keys(chat_id)
+        )
+        try:
+            _count("messages.insert")
+            self.messages.insert(
+                self.manifest_key(chat_id),
+                {"message_ids": message_ids},
+                InsertOptions(**self.expiry())
+            )
+            logger.info(f"Built message manifest for legacy chat {chat_id}")
+        except DocumentExistsException:
+            # Another request built it first
+            return self.get_message_ids(chat_id)
+        return message_ids
+
+    @store_timed("get_message_ids")
+    def get_message_ids(self, chat_id: str) -> List[int]:
+        """
+        Get the IDs of all messages in a chat session, in order.
+
+        Args:
+            chat_id: The UUID of the chat session
+
+        Returns:
+            List of message IDs
+        """
+        if not self.messages:
+            self.init()
+
+        try:
+            _count("messages.get")
+            message_ids = self.messages.get(self.manifest_key(chat_id)).value["message_ids"]
+            # Concurrent writers can append out of order; nearly sorted lists sort in linear time
+            return sorted(message_ids)
+        except DocumentNotFoundException:
+            return self._build_manifest(chat_id)
+
+    @store_timed("get_messages")
+    def get_messages(
+        self,
+        chat_id: str,
+        limit: Optional[int] = None,
+        before: Optional[int] = None,
+        after: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get messages for a chat session, oldest first.
+
+        Args:
+            chat_id: The UUID of the chat session
+            limit: Optional maximum number of messages. See page_message_ids
+            before: Optional message ID; only messages older than it are returned
+            after: Optional message ID; only messages newer than it are returned
+
+        Returns:
+            List of messages in the chat session
+        """
+        try:
+            (message_ids, _) = page_message_ids(
+                self.get_message_ids(chat_id), limit, before, after
+            )
+            return self.get_messages_by_id(chat_id, message_ids)
         except Exception:
             logger.exception("Failed to get messages.")
             raise
 
+    @store_timed("get_messages_by_id")
+    def get_messages_by_id(
+        self,
+        chat_id: str,
+        message_ids: List[int]
+    ) -> List[Dict[str, Any]]:
+        """
+        Fetch messages with a single batched KV get.
+
+        Args:
+            chat_id: The UUID of the chat session
+            message_ids: IDs of the messages to fetch
+
+        Returns:
+            The messages that exist, in the order of message_ids
+        """
+        if not message_ids:
+            return []
+
+        keys = [self.message_key(chat_id, message_id) for message_id in message_ids]
+        _count("messages.get_multi")
+        result = self.messages.get_multi(keys)
+        return [result.results[key].value for key in keys if key in result.results]
+
+    @store_timed("message_keys")
+    def message_keys(self, chat_id: str) -> List[str]:
+        """
+        Keys of a chat's message documents.
+
+        They come from the manifest, or for chats without one, from a KV
+        prefix scan, so no query index is needed.
+
+        Args:
+            chat_id: The UUID of the chat session
+
+        Returns:
+            Keys of the messages
+        """
+        if not self.messages:
+            self.init()
+
+        try:
+            _count("messages.get")
+            manifest = self.messages.get(self.manifest_key(chat_id)).value
+            return [
+                self.message_key(chat_id, message_id)
+                for message_id in manifest["message_ids"]
+            ]
+        except DocumentNotFoundException:
+            return self._scan_message_keys(chat_id)
+
+    def _scan_message_keys(self, chat_id: str) -> List[str]:
+        """List a chat's message keys with a KV prefix scan."""
+        _count("messages.scan")
+        return [
+            result.id
+            for result in self.messages.scan(
+                PrefixScan(f"{chat_id}:"), ScanOptions(ids_only=True)
+            )
+            if result.id.rpartition(":")[2].isdigit()
+        ]
+
+    def chat_keys(self, chat_id: str) -> List[str]:
+        """
+        Keys of every document in the messages collection belonging to a chat.
+
+        Args:
+            chat_id: The UUID of the chat session
+
+        Returns:
+            Keys of the messages and the manifest, summary and counter documents
+        """
+        return self.message_keys(chat_id) + [
+            self.manifest_key(chat_id),
+            self.summary_key(chat_id),
+            self.sequence_key(chat_id)
+        ]
+
+    @store_timed("remove_keys")
+    def remove_keys(self, collection, keys: List[str]) -> int:
+        """
+        Remove documents in batches, ignoring those already gone.
+
+        Args:
+            collection: The collection holding the documents
+            keys: Keys of the documents
+
+        Returns:
+            The number of documents removed
+        """
+        removed = 0
+        for i in range(0, len(keys), REMOVE_BATCH_SIZE):
+            batch = keys[i:i + REMOVE_BATCH_SIZE]
+            _count(f"{collection.name}.remove_multi")
+            result = collection.remove_multi(batch)
+            failures = {
+                key: e for (key, e) in (result.exceptions or {}).items()
+                if not isinstance(e, DocumentNotFoundException)
+            }
+            if failures:
+                raise next(iter(failures.values()))
+            removed += len(batch) - len(result.exceptions or {})
+        return removed
+
+    @store_timed("delete_chat")
     def delete_chat(self, chat_id: str) -> bool:
         """
         Delete a chat session and all its messages.
 
+        Uses batched KV removes over the chat's known keys. The chat document
+        goes last, so an interrupted delete can simply be retried.
+
         Args:
             chat_id: The UUID of the chat session
 
@@ -280,36 +782,163 @@ class CouchbaseChatClient:
         if not self.chats or not self.messages:
             self.init()
 
-        # Make sure the query service is available
-        self.await_up()
-
         try:
             chat = self.get_chat(chat_id)
             if not chat:
                 return False
 
-            # Delete messages
-            query = f"""
-            DELETE FROM {self.bucket_name}.{self.scope_name}.{self.messages_coll} m
-            WHERE m.chat_id = $chat_id
-            """
-
-            options = QueryOptions(named_parameters={"chat_id": chat_id})
-            self.cluster.query(query, options)
-            logger.info(f"Deleted messages for chat {chat_id}")
+            removed = self.remove_keys(self.messages, self.chat_keys(chat_id))
+            logger.info(f"Deleted {removed} message documents for chat {chat_id}")
 
             # Delete the chat
-            self.chats.remove(chat_id)
+            try:
+                _count("chats.remove")
+                self.chats.remove(chat_id)
+            except DocumentNotFoundException:
+                # Deleted concurrently
+                pass
             logger.info(f"Deleted chat {chat_id}")
             return True
         except Exception:
             logger.error("Failed to delete chat.")
             raise
 
+    def _chat_list_query(
+        self,
+        filters: Dict[str, Any],
+        limit: int,
+        cursor: Optional[Tuple[str, str]]
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Build the statement and named parameters listing chats."""
+        keyspace = f"`{self.bucket_name}`.`{self.scope_name}`.`{self.chats_coll}`"
+        where = ["c.updated_at IS NOT MISSING"]
+        params: Dict[str, Any] = {"limit": limit}
+        for (i, (key, value)) in enumerate(sorted(filters.items())):
+            if not METADATA_KEY.match(key):
+                raise ValueError(f"Invalid metadata key: {key!r}")
+            where.append(f"c.metadata.`{key}` = $m{i}")
+            params[f"m{i}"] = value
+        if cursor is not None:
+            # Spelled so the index scan gets a span on updated_at
+            where.append(
+                "c.updated_at <= $updated_at"
+                " AND (c.updated_at < $updated_at OR c.id < $id)"
+            )
+            (params["updated_at"], params["id"]) = cursor
+        statement = (
+            f"SELECT c.* FROM {keyspace} AS c WHERE {' AND '.join(where)}"
+            " ORDER BY c.updated_at DESC, c.id DESC LIMIT $limit"
+        )
+        return (statement, params)
+
+    @store_timed("list_chats")
+    def list_chats(
+        self,
+        filters: Optional[Dict[str, Any]] = None,
+        limit: int = 20,
+        cursor: Optional[Tuple[str, str]] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[Tuple[str, str]]]:
+        """
+        List chat sessions, most recently updated first.
+
+        Runs one prepared query over the chat listing indexes, reading them in
+        order with keyset pagination, so a page costs the same however deep
+        it is and however many chats there are.
+
+        Args:
+            filters: Optional metadata values the chats must have, by key
+            limit: Maximum number of chats
+            cursor: Optional (updated_at, id) of the last chat of the previous page
+
+        Returns:
+            The chats, and the cursor of the next page or None if this is the last
+        """
+        if not self.cluster:
+            self.connect()
+
+        (statement, params) = self._chat_list_query(filters or {}, limit + 1, cursor)
+        _count("query")
+        rows = list(self.cluster.query(
+            statement,
+            QueryOptions(named_parameters=params, adhoc=False)
+        ))
+        if len(rows) <= limit:
+            return (rows, None)
+        rows = rows[:limit]
+        return (rows, (rows[-1]["updated_at"], rows[-1]["id"]))
+
+    @store_timed("explain_list_chats")
+    def explain_list_chats(self, filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Get the query plan of a chat listing page.
+
+        Args:
+            filters: Optional metadata filters, as for list_chats
+
+        Returns:
+            The plan, as returned by EXPLAIN
+        """
+        if not self.cluster:
+            self.connect()
+
+        (statement, params) = self._chat_list_query(filters or {}, 1, ("", ""))
+        _count("query")
+        rows = list(self.cluster.query(
+            f"EXPLAIN {statement}", QueryOptions(named_parameters=params)
+        ))
+        return rows[0]["plan"] if rows else {}
+
+    @store_timed("check_chat_list_indexes")
+    def check_chat_list_indexes(self) -> bool:
+        """
+        Check that chat listings are served by their indexes in index order,
+        logging a warning for each that isn't.
+
+        Returns:
+            True if every listing uses its index without sorting
+        """
+        ok = True
+        for (filters, index) in [({}, CHAT_LIST_INDEX), ({"client_id": ""}, CHAT_CLIENT_INDEX)]:
+            plan = self.explain_list_chats(filters)
+            indexes = plan_indexes(plan)
+            if index not in indexes or plan_sorts(plan):
+                logger.warning(
+                    f"Chat listing with filters {list(filters)} doesn't read {index} in order "
+                    f"(scans {indexes or 'no index'}); run util/init-couchbase to create it"
+                )
+                ok = False
+        if ok:
+            logger.info("Chat listings use their indexes")
+        return ok
+
+    @store_timed("ping")
+    def ping(self) -> None:
+        """
+        Ping the KV service of the bucket's nodes.
+
+        Raises:
+            Exception: If not connected or a node didn't answer
+        """
+        if not self.bucket:
+            raise RuntimeError("Not connected")
+        _count("ping")
+        result = self.bucket.ping(PingOptions(service_types=[ServiceType.KeyValue]))
+        for endpoints in result.endpoints.values():
+            for endpoint in endpoints:
+                if endpoint.state != PingState.OK:
+                    raise RuntimeError(f"{endpoint.remote} is {endpoint.state.value}")
+
+    @store_timed("close")
     def close(self) -> None:
         """Close the database connection."""
         if self.cluster:
+            cluster = self.cluster
             self.cluster = None
+            self.bucket = None
+            self.scope = None
+            self.chats = None
+            self.messages = None
+            cluster.close()
             logger.info("Database connection closed")
 
     def __enter__(self):
@@ -318,3 +947,273 @@ class CouchbaseChatClient:
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.close()
+
+class AsyncCouchbaseChatClient:
+    """
+    Async facade over CouchbaseChatClient.
+
+    The Couchbase SDK calls are blocking, so every operation is handed off to
+    a bounded thread pool. Route handlers can then await store I/O without
+    stalling the event loop, and concurrent chats overlap their round trips.
+
+    If a history cache is given, message histories are cached per chat and
+    kept up to date write-through by add_message, so a turn on a cached chat
+    costs no history query. A history read from the store is only cached if
+    no write to the chat finished while it was being read, since the write
+    couldn't update an entry that wasn't there yet. This guards against
+    writes made through this client; with a cache shared between workers,
+    a write on another worker can still race a fill, until the entry expires.
+
+    Readiness is established in the background by wait_until_ready; until
+    then `ready` is False and callers should fail fast rather than wait on
+    the store. Once ready, start_health_checks keeps pinging the store, and
+    rebuilds the cluster handle if it stops answering, again off the
+    request path.
+    """
+    def __init__(
+        self,
+        client: CouchbaseChatClient,
+        max_workers: int = 32,
+        history_cache: Optional[Cache] = None
+    ):
+        self.client = client
+        self.max_workers = max_workers
+        self.history_cache = history_cache
+        self.ready = False
+        # Tokens of the history reads in flight that may still fill the
+        # cache, by chat; a write to the chat discards them
+        self._fills: Dict[str, set] = {}
+        self._health_task: Optional[asyncio.Task] = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="couchbase"
+        )
+
+    async def _run(self, fn, *args, **kwargs):
+        """Run a blocking client call on the executor, in the caller's context."""
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(context.run, fn, *args, **kwargs)
+        )
+
+    async def connect(self) -> None:
+        """Establish connection to Couchbase database."""
+        await self._run(self.client.connect)
+
+    async def wait_until_ready(self, initial_delay: float = 1.0, max_delay: float = 10.0) -> None:
+        """
+        Retry CouchbaseChatClient.check_ready with exponential backoff until
+        it succeeds, then mark the store ready. Meant to run as a background
+        task; waiting never blocks a worker thread.
+
+        Args:
+            initial_delay: Initial delay between attempts in seconds
+            max_delay: Maximum delay between attempts in seconds
+        """
+        delay = initial_delay
+        attempt = 1
+        while True:
+            try:
+                await self._run(self.client.check_ready)
+                self.ready = True
+                logger.info("Couchbase is ready")
+                return
+            except Exception as e:
+                logger.warning(
+                    f"Attempt {attempt}: Couchbase not ready yet ({e}). "
+                    f"Retrying in {delay:.1f} seconds..."
+                )
+                await asyncio.sleep(delay)
+                delay = min(max_delay, delay * 1.5)
+                attempt += 1
+
+    async def _watch_health(self, interval: float, max_failures: int) -> None:
+        failures = 0
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self._run(self.client.ping)
+                failures = 0
+                continue
+            except Exception as e:
+                failures += 1
+                logger.warning(f"Couchbase ping failed ({failures}/{max_failures}): {e}")
+            if failures < max_failures:
+                continue
+
+            # The SDK reconnects on its own; this covers a handle it can't recover
+            logger.error("Couchbase stopped answering; reconnecting")
+            self.ready = False
+            try:
+                await self._run(self.client.close)
+            except Exception:
+                logger.warning("Failed to close the cluster handle.", exc_info=True)
+            await self.wait_until_ready()
+            failures = 0
+
+    def start_health_checks(self, interval: float = 5.0, max_failures: int = 3) -> None:
+        """
+        Ping the store in the background every `interval` seconds, and after
+        `max_failures` failed pings in a row, mark it not ready, close the
+        cluster handle and reconnect with backoff.
+        """
+        if self._health_task is None and interval > 0:
+            self._health_task = asyncio.create_task(self._watch_health(interval, max_failures))
+
+    async def create_chat(self, metadata: Dict[str, Any] = None) -> str:
+        """Create a new chat session. See CouchbaseChatClient.create_chat."""
+        chat_id = await self._run(self.client.create_chat, metadata)
+        if self.history_cache is not None:
+            await self.history_cache.set(chat_id, [])
+        return chat_id
+
+    async def add_message(
+        self,
+        chat_id: str,
+        role: str,
+        content: str,
+        metadata: Dict[str, Any] = None,
+        chat: Optional[Dict[str, Any]] = None
+    ) -> Tuple[int, str]:
+        """Add a message to a chat session. See CouchbaseChatClient.add_message."""
+        return (await self.add_messages(chat_id, [(role, content, metadata)], chat))[0]
+
+    async def add_messages(
+        self,
+        chat_id: str,
+        messages: List[Tuple[str, str, Optional[Dict[str, Any]]]],
+        chat: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[int, str]]:
+        """Add several messages to a chat session. See CouchbaseChatClient.add_messages."""
+        added = await self._run(self.client.add_messages, chat_id, messages, chat)
+        if self.history_cache is not None:
+            self._fills.pop(chat_id, None)
+            for ((role, content, metadata), (message_id, created_at)) in zip(messages, added):
+                await self.history_cache.append(chat_id, {
+                    "id": message_id,
+                    "chat_id": chat_id,
+                    "role": role,
+                    "content": content,
+                    "created_at": created_at,
+                    "metadata": metadata or {}
+                })
+        return added
+
+    async def get_chat(self, chat_id: str) -> Optional[Dict[str, Any]]:
+        """Get a chat session by ID. See CouchbaseChatClient.get_chat."""
+        return await self._run(self.client.get_chat, chat_id)
+
+    async def get_messages(
+        self,
+        chat_id: str,
+        limit: Optional[int] = None,
+        before: Optional[int] = None,
+        after: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Get messages for a chat session. See CouchbaseChatClient.get_messages."""
+        cached = None
+        if self.history_cache is not None:
+            cached = await self.history_cache.get(chat_id)
+
+        if cached is None:
+            if limit is not None or before is not None or after is not None:
+                # Only full histories are cached
+                return await self._run(
+                    self.client.get_messages, chat_id, limit, before, after
+                )
+            if self.history_cache is None:
+                return await self._run(self.client.get_messages, chat_id)
+            return await self._fill(chat_id)
+
+        (message_ids, _) = page_message_ids(
+            [msg["id"] for msg in cached], limit, before, after
+        )
+        wanted = set(message_ids)
+        return [msg for msg in cached if msg["id"] in wanted]
+
+    async def _fill(self, chat_id: str) -> List[Dict[str, Any]]:
+        """Read a chat's history from the store and cache it, unless a write raced the read."""
+        token = object()
+        self._fills.setdefault(chat_id, set()).add(token)
+        try:
+            messages = await self._run(self.client.get_messages, chat_id)
+        finally:
+            fills = self._fills.get(chat_id)
+            current = fills is not None and token in fills
+            if current:
+                fills.discard(token)
+                if not fills:
+                    del self._fills[chat_id]
+        # Empty histories of new chats are cached by create_chat; an empty
+        # read may be of a chat ID that doesn't exist, which isn't cached
+        if current and messages:
+            await self.history_cache.set(chat_id, messages)
+        return messages
+
+    async def get_message_ids(self, chat_id: str) -> List[int]:
+        """Get a chat's message IDs. See CouchbaseChatClient.get_message_ids."""
+        if self.history_cache is not None:
+            cached = await self.history_cache.get(chat_id)
+            if cached is not None:
+                return [msg["id"] for msg in cached]
+        return await self._run(self.client.get_message_ids, chat_id)
+
+    async def get_messages_by_id(
+        self,
+        chat_id: str,
+        message_ids: List[int]
+    ) -> List[Dict[str, Any]]:
+        """Fetch messages by ID. See CouchbaseChatClient.get_messages_by_id."""
+        if self.history_cache is not None:
+            cached = await self.history_cache.get(chat_id)
+            if cached is not None:
+                by_id = {msg["id"]: msg for msg in cached}
+                return [by_id[message_id] for message_id in message_ids if message_id in by_id]
+        return await self._run(self.client.get_messages_by_id, chat_id, message_ids)
+
+    async def get_summary(self, chat_id: str) -> Optional[Dict[str, Any]]:
+        """Get a chat's rolling summary. See CouchbaseChatClient.get_summary."""
+        return await self._run(self.client.get_summary, chat_id)
+
+    async def set_summary(self, chat_id: str, summary: str, summary_upto: int) -> None:
+        """Store a chat's rolling summary. See CouchbaseChatClient.set_summary."""
+        await self._run(self.client.set_summary, chat_id, summary, summary_upto)
+
+    async def delete_chat(self, chat_id: str) -> bool:
+        """Delete a chat session. See CouchbaseChatClient.delete_chat."""
+        try:
+            return await self._run(self.client.delete_chat, chat_id)
+        finally:
+            # After the store delete, so a concurrent read can't cache the chat again
+            await self.invalidate(chat_id)
+
+    async def invalidate(self, chat_id: str) -> None:
+        """Drop a chat's cached history, after the chat was deleted or changed behind our back."""
+        if self.history_cache is not None:
+            self._fills.pop(chat_id, None)
+            await self.history_cache.delete(chat_id)
+
+    async def list_chats(
+        self,
+        filters: Optional[Dict[str, Any]] = None,
+        limit: int = 20,
+        cursor: Optional[Tuple[str, str]] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[Tuple[str, str]]]:
+        """List chat sessions. See CouchbaseChatClient.list_chats."""
+        return await self._run(self.client.list_chats, filters, limit, cursor)
+
+    async def check_chat_list_indexes(self) -> bool:
+        """Check the chat listing query plans. See CouchbaseChatClient.check_chat_list_indexes."""
+        return await self._run(self.client.check_chat_list_indexes)
+
+    async def close(self) -> None:
+        """Close the database connection and release the worker threads."""
+        self.ready = False
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+        if self.history_cache is not None:
+            await self.history_cache.close()
+        await self._run(self.client.close)
+        self._executor.shutdown(wait=False)
@@ -1,11 +1,21 @@
+import asyncio
+import random
+import time
+from typing import Any, Awaitable, Callable, Optional
+
 import httpx
-from datetime import datetime
-import json
 
 from ..utils import log
 
 logger = log.get_logger(__name__)
 
+#### Types ####
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+# Statuses worth retrying: the server is overloaded or a gateway gave up
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
 def ppr_header_key(k):
     return '-'.join(word.capitalize() for word in k.split('-'))
 
@@ -14,60 +24,214 @@ def ppr_headers(headers):
         return '\n'.join(f'{log.cyan(ppr_header_key(k))}: {v}'
                          for (k, v) in headers.items())
 
+def _status_str(code: int) -> str:
+    code_str = f"HTTP {code}"
+    if 400 <= code <= 599:
+        return log.yellow(code_str)
+    elif 100 <= code <= 399:
+        return log.green(code_str)
+    return log.red(code_str)
+
+#### Client ####
+
 class AsyncClient(httpx.AsyncClient):
-    async def request(self, *args, **kwargs):
-        method = kwargs.get("method", args[0] if args else "GET")
-        url = kwargs.get("url", args[1] if len(args) > 1 else "")
+    """
+    HTTP client logging requests, retrying failed idempotent requests and
+    optionally hedging slow ones.
+
+    Requests failing with a transport error or a status in RETRY_STATUSES
+    are retried with full-jitter exponential backoff, if idempotent: by
+    method, or when `request` is passed `idempotent=True`, e.g. for a POST
+    that doesn't change anything. An idempotent request passed `hedge=True`
+    is sent a second time if it hasn't completed within `hedge_delay`, and
+    the first response wins, trading a little load for a shorter tail.
+
+    Only `request` and the helpers built on it (`get`, `post`, ...) do this.
+    `stream` goes straight to httpx, without retries, hedging or logging: a
+    streamed response can't be replayed once it has been partly consumed.
+
+    Args:
+        retries: Retries after the first attempt
+        backoff: Base delay of the backoff, in seconds
+        max_backoff: Maximum delay between attempts, in seconds
+        hedge_delay: Seconds before a hedged request is duplicated, or None
+            to never hedge
+        kwargs: Passed to httpx.AsyncClient
+    """
+    def __init__(
+        self,
+        *,
+        retries: int = 2,
+        backoff: float = 0.1,
+        max_backoff: float = 2.0,
+        hedge_delay: Optional[float] = None,
+        **kwargs: Any
+    ):
+        super().__init__(**kwargs)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge_delay = hedge_delay
+
+    async def request(
+        self,
+        method: str,
+        url: httpx.URL | str,
+        *,
+        idempotent: Optional[bool] = None,
+        hedge: bool = False,
+        **kwargs: Any
+    ) -> httpx.Response:
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        send = lambda: self._send_logged(method, url, kwargs)
+        if hedge and idempotent and self.hedge_delay is not None:
+            attempt = lambda: self._hedged(send)
+        else:
+            attempt = send
+        if not idempotent or self.retries <= 0:
+            return await attempt()
+        return await self._retried(attempt, method, url)
+
+    def _delay(self, attempt: int) -> float:
+        """Full-jitter backoff before the given retry."""
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    async def _retried(
+        self,
+        attempt: Callable[[], Awaitable[httpx.Response]],
+        method: str,
+        url: httpx.URL | str
+    ) -> httpx.Response:
+        for retry in range(self.retries + 1):
+            last = retry == self.retries
+            try:
+                response = await attempt()
+            except httpx.TransportError as e:
+                if last:
+                    raise
+                reason = type(e).__name__
+            else:
+                if last or response.status_code not in RETRY_STATUSES:
+                    return response
+                reason = f"HTTP {response.status_code}"
+                await response.aclose()
+            delay = self._delay(retry)
+            logger.debug("Retrying %s %s in %.0f ms after %s", method, url, delay * 1000, reason)
+            await asyncio.sleep(delay)
+
+    async def _hedged(
+        self, send: Callable[[], Awaitable[httpx.Response]]
+    ) -> httpx.Response:
+        """Send, and send again if the first attempt is slow; the first response wins."""
+        first = asyncio.create_task(send())
+        (done, _) = await asyncio.wait({first}, timeout=self.hedge_delay)
+        if done:
+            return first.result()
+
+        pending = {first, asyncio.create_task(send())}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                (done, pending) = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _send_logged(
+        self, method: str, url: httpx.URL | str, kwargs: dict[str, Any]
+    ) -> httpx.Response:
+        if not logger.isEnabledFor(log.DEBUG):
+            return await super().request(method, url, **kwargs)
+
+        is_trace = logger.isEnabledFor(log.TRACE)
         req_str = log.magenta(f'HTTP {method} {url}')
-        is_debug = logger.isEnabledFor(log.DEBUG)
-        is_trace = is_debug and logger.isEnabledFor(log.TRACE)
-        if j := kwargs.get('json'):
-            if not isinstance(kwargs.get('headers'), dict):
-                kwargs['headers'] = {}
-            kwargs['headers']['Content-Type'] = 'application/json'
-            del kwargs['json']
-            kwargs['data'] = json.dumps(j)
         if is_trace:
-            headers = ppr_headers(kwargs.get('headers', {}))
-            body = kwargs.get('data')
+            headers = ppr_headers(kwargs.get('headers') or {})
+            body = kwargs.get('json') or kwargs.get('content') or kwargs.get('data')
             logger.trace('Sent %s:%s%s%s%s',
                          req_str,
                          "\n" if headers else "",
                          headers or '',
                          "\n" if body else "",
                          body or '')
-        elif is_debug:
+        else:
             logger.debug(f"Sent {req_str}")
-        now = datetime.now()
+        start = time.perf_counter()
         try:
-            response = await super().request(*args, **kwargs)
-            code = response.status_code
-            code_str = f"HTTP {code}"
-            if 400 <= code <= 599:
-                code_str = log.yellow(code_str)
-            elif 100 <= code <= 399:
-                code_str = log.green(code_str)
-            else:
-                code_str = log.red(code_str)
-            time_ms = int((datetime.now() - now).total_seconds() * 1000)
-            msg = f'Got {code_str} for {req_str} in {log.cyan(time_ms)} ms'
-            if is_trace:
-                headers = ppr_headers(response.headers)
-                body = response.text
-                logger.trace('%s:%s%s%s%s',
-                             msg,
-                             "\n" if headers else "",
-                             headers or '',
-                             "\n" if body else "",
-                             body or '')
-            elif is_debug:
-                logger.debug(msg)
-            return response
+            response = await super().request(method, url, **kwargs)
         except Exception as e:
-            time_ms = int((datetime.now() - now).total_seconds() * 1000)
+            time_ms = int((time.perf_counter() - start) * 1000)
             msg = f'Got {log.red("HTTP ERROR")} for {req_str} in {log.cyan(time_ms)} ms'
             if is_trace:
                 logger.trace(f'{msg}: {log.red(str(e))}')
-            elif is_debug:
+            else:
                 logger.debug(msg)
             raise
+        time_ms = int((time.perf_counter() - start) * 1000)
+        msg = f'Got {_status_str(response.status_code)} for {req_str} in {log.cyan(time_ms)} ms'
+        if is_trace:
+            headers = ppr_headers(response.headers)
+            body = response.text
+            logger.trace('%s:%s%s%s%s',
+                         msg,
+                         "\n" if headers else "",
+                         headers or '',
+                         "\n" if body else "",
+                         body or '')
+        else:
+            logger.debug(msg)
+        return response
+
+def create_client(
+    max_connections: int = 100,
+    max_keepalive_connections: int = 20,
+    keepalive_expiry: float = 30.0,
+    http2: bool = True,
+    timeout: float = 60.0,
+    connect_timeout: float = 5.0,
+    retries: int = 2,
+    backoff: float = 0.1,
+    hedge_delay: Optional[float] = None
+) -> AsyncClient:
+    """
+    Create the client shared by outbound calls, pooling connections per host
+    so calls reuse them instead of paying for a new TLS handshake each time.
+
+    Args:
+        max_connections: Maximum open connections, across hosts
+        max_keepalive_connections: Maximum idle connections kept open
+        keepalive_expiry: Seconds an idle connection is kept open
+        http2: Whether to use HTTP/2 where servers support it, multiplexing
+            requests over one connection per host; needs the `h2` package
+        timeout: Default timeout for reads, writes and pool waits, in seconds
+        connect_timeout: Timeout for opening a connection, in seconds
+        retries: Retries of failed idempotent requests
+        backoff: Base delay of the retry backoff, in seconds
+        hedge_delay: Seconds before a hedged request is duplicated, or None
+            to never hedge
+    """
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("HTTP/2 needs the h2 package; using HTTP/1.1.")
+            http2 = False
+    return AsyncClient(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        ),
+        timeout=httpx.Timeout(timeout, connect=connect_timeout),
+        http2=http2,
+        retries=retries,
+        backoff=backoff,
+        hedge_delay=hedge_delay
+    )
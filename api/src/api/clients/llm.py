@@ -0,0 +1,208 @@
+from abc import ABC, abstractmethod
+import contextlib
+import json
+from typing import Any, AsyncContextManager, AsyncIterator, Optional
+
+from opperai import AsyncOpper
+from pydantic import BaseModel
+
+from .http import AsyncClient
+from ..utils import log
+
+logger = log.get_logger(__name__)
+
+#### Types ####
+
+class LLMProvider(ABC):
+    """
+    Async access to a language model, so handlers await model output instead
+    of blocking the event loop for the whole round trip.
+    """
+    @abstractmethod
+    async def call(
+        self,
+        name: str,
+        instructions: str,
+        input: Any,
+        output_type: type = str
+    ) -> Any:
+        """
+        Call the model once.
+
+        Args:
+            name: Name of the call, for tracing and logs
+            instructions: What the model should do with the input
+            input: The input, encoded as JSON
+            output_type: str, or a Pydantic model the output is parsed into
+
+        Returns:
+            The output as `output_type`
+        """
+
+    @abstractmethod
+    def stream(self, name: str, instructions: str, input: Any) -> AsyncIterator[str]:
+        """Call the model, yielding text deltas as they arrive."""
+
+    def trace(self, name: str) -> AsyncContextManager:
+        """Group the calls made within the block, if the provider traces them."""
+        return contextlib.nullcontext()
+
+    async def close(self) -> None:
+        """Release the provider's resources."""
+
+#### Providers ####
+
+class OpperProvider(LLMProvider):
+    """
+    Opper's async client, with calls grouped under Opper traces.
+
+    The SDK opens its own httpx connection pool to the Opper API and doesn't
+    take a client, so these calls don't go through the shared HTTP client
+    and get none of its pooling limits, retries or hedging. Use the openai
+    provider through the gateway for that. The SDK has no public way to
+    close that pool either, so it is left for process exit to release.
+
+    Args:
+        api_key: The Opper API key
+    """
+    def __init__(self, api_key: str):
+        self.opper = AsyncOpper(api_key=api_key)
+
+    async def call(self, name: str, instructions: str, input: Any, output_type: type = str) -> Any:
+        output, _ = await self.opper.call(
+            name=name,
+            instructions=instructions,
+            input=input,
+            output_type=output_type
+        )
+        return output
+
+    async def stream(self, name: str, instructions: str, input: Any) -> AsyncIterator[str]:
+        response = await self.opper.call(
+            name=name,
+            instructions=instructions,
+            input=input,
+            output_type=str,
+            stream=True
+        )
+        async for delta in response.deltas:
+            yield delta
+
+    def trace(self, name: str) -> AsyncContextManager:
+        return self.opper.traces.start(name)
+
+class OpenAIProvider(LLMProvider):
+    """
+    An OpenAI-compatible chat completions API, such as the Kong AI Gateway
+    route, called through the shared HTTP client.
+
+    The instructions become the system message and the input, as JSON, the
+    user message. Structured outputs are requested in JSON mode with the
+    output model's schema in the instructions.
+
+    Args:
+        http: The shared HTTP client
+        base_url: Base URL of the API; completions are posted to
+            `{base_url}/chat/completions`
+        model: Model name, or None to leave it to the gateway
+        api_key: Bearer token, or None if the gateway adds credentials
+    """
+    def __init__(
+        self,
+        http: AsyncClient,
+        base_url: str,
+        model: Optional[str] = None,
+        api_key: Optional[str] = None
+    ):
+        self.http = http
+        self.url = base_url.rstrip("/") + "/chat/completions"
+        self.model = model
+        self.headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+
+    def _body(self, instructions: str, input: Any, output_type: type, stream: bool) -> dict[str, Any]:
+        structured = isinstance(output_type, type) and issubclass(output_type, BaseModel)
+        if structured:
+            instructions = (
+                f"{instructions}\n\nRespond with a JSON object matching this schema:\n"
+                f"{json.dumps(output_type.model_json_schema())}"
+            )
+        body: dict[str, Any] = {
+            "messages": [
+                {"role": "system", "content": instructions},
+                {"role": "user", "content": json.dumps(input)},
+            ],
+        }
+        if self.model:
+            body["model"] = self.model
+        if structured:
+            body["response_format"] = {"type": "json_object"}
+        if stream:
+            body["stream"] = True
+        return body
+
+    async def call(self, name: str, instructions: str, input: Any, output_type: type = str) -> Any:
+        # Completions change nothing, so they can be retried and hedged
+        response = await self.http.request(
+            "POST",
+            self.url,
+            json=self._body(instructions, input, output_type, stream=False),
+            headers=self.headers,
+            idempotent=True,
+            hedge=True
+        )
+        response.raise_for_status()
+        content = response.json()["choices"][0]["message"]["content"]
+        if isinstance(output_type, type) and issubclass(output_type, BaseModel):
+            return output_type.model_validate_json(content)
+        return content
+
+    async def stream(self, name: str, instructions: str, input: Any) -> AsyncIterator[str]:
+        async with self.http.stream(
+            "POST",
+            self.url,
+            json=self._body(instructions, input, str, stream=True),
+            headers=self.headers
+        ) as response:
+            if response.is_error:
+                await response.aread()
+                response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line.removeprefix("data:").strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or [{}]
+                if delta := choices[0].get("delta", {}).get("content"):
+                    yield delta
+
+def create_provider(
+    provider: str,
+    http: AsyncClient,
+    opper_api_key: Optional[str] = None,
+    base_url: Optional[str] = None,
+    model: Optional[str] = None,
+    api_key: Optional[str] = None
+) -> LLMProvider:
+    """
+    Create a model provider.
+
+    Args:
+        provider: 'opper', or 'openai' for an OpenAI-compatible API
+        http: The shared HTTP client, used by the openai provider; the opper
+            provider has its own
+        opper_api_key: The Opper API key (opper only)
+        base_url: Base URL of the API (openai only)
+        model: Model name (openai only)
+        api_key: Bearer token (openai only)
+
+    Raises:
+        ValueError: If the provider is unknown, or is opper without an API key
+    """
+    if provider == "openai":
+        return OpenAIProvider(http, base_url, model=model, api_key=api_key)
+    if provider != "opper":
+        raise ValueError(f"Unknown LLM provider {provider!r}; expected 'opper' or 'openai'")
+    if not opper_api_key:
+        raise ValueError("The opper LLM provider needs OPPER_API_KEY")
+    return OpperProvider(opper_api_key)
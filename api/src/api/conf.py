@@ -13,12 +13,74 @@ class HttpServerConf(BaseModel):
     debug: bool
     autoreload: bool
 
+class CacheConf(BaseModel):
+    backend: str
+    max_size: int
+    ttl: float | None
+    redis_url: str | None
+
+class ResponseCacheConf(CacheConf):
+    messages: int
+
+class IntentCacheConf(BaseModel):
+    max_size: int
+    ttl: float | None
+    similarity: float | None
+
+class RetentionConf(BaseModel):
+    days: float
+    sweep_interval: float
+    sweep_batch_size: int
+
+class ContextConf(BaseModel):
+    token_budget: int
+    recent_messages: int
+
+class KnowledgeConf(BaseModel):
+    source: str
+    mode: str
+    vector_dim: int
+    reload_interval: float
+
+class HttpClientConf(BaseModel):
+    max_connections: int
+    max_keepalive_connections: int
+    keepalive_expiry: float
+    http2: bool
+    timeout: float
+    connect_timeout: float
+    retries: int
+    backoff: float
+    hedge_delay: float | None
+
+class LLMConf(BaseModel):
+    provider: str
+    base_url: str
+    model: str | None
+    api_key: str | None
+
+class TracingConf(BaseModel):
+    exporter: str
+    file: str
+    otlp_endpoint: str
+
 class CouchbaseConf(BaseModel):
     url: str
     bucket: str
     username: str
     password: str
     scope: str = "_default"
+    max_workers: int = 32
+    connect_timeout: float = 10.0
+    kv_timeout: float = 2.5
+    query_timeout: float = 10.0
+    max_http_connections: int = 0
+    idle_http_connection_timeout: float = 0.0
+    compression: bool = True
+    compression_min_size: int = 32
+    compression_min_ratio: float = 0.83
+    ready_timeout: float = 10.0
+    health_interval: float = 5.0
 
 #### Env Vars ####
 
@@ -26,6 +88,19 @@ class CouchbaseConf(BaseModel):
 
 LOG_LEVEL = EnvVarSpec(id="LOG_LEVEL", default="INFO")
 
+# 'pretty' for colored, human-readable logs, or 'json' for one JSON object per line
+LOG_FORMAT = EnvVarSpec(id="LOG_FORMAT", default="pretty")
+
+## Tracing ##
+
+# 'none', 'file' to append spans to TRACE_FILE, or 'otlp' to post them to TRACE_OTLP_ENDPOINT
+TRACE_EXPORTER = EnvVarSpec(id="TRACE_EXPORTER", default="none")
+
+TRACE_FILE = EnvVarSpec(id="TRACE_FILE", default="traces.jsonl")
+
+# Base URL of an OTLP/HTTP collector, which receives spans at /v1/traces
+TRACE_OTLP_ENDPOINT = EnvVarSpec(id="TRACE_OTLP_ENDPOINT", default="http://localhost:4318")
+
 ## HTTP ##
 
 HTTP_HOST = EnvVarSpec(id="HTTP_HOST", default="0.0.0.0")
@@ -46,9 +121,93 @@ HTTP_AUTORELOAD = EnvVarSpec(
     type=(bool, ...),
 )
 
+## HTTP Client ##
+
+# Shared client for outbound calls, such as to model providers
+HTTP_CLIENT_MAX_CONNECTIONS = EnvVarSpec(
+    id="HTTP_CLIENT_MAX_CONNECTIONS",
+    parse=int,
+    default="100",
+    type=(int, ...),
+)
+
+HTTP_CLIENT_MAX_KEEPALIVE = EnvVarSpec(
+    id="HTTP_CLIENT_MAX_KEEPALIVE",
+    parse=int,
+    default="20",
+    type=(int, ...),
+)
+
+HTTP_CLIENT_KEEPALIVE_EXPIRY = EnvVarSpec(
+    id="HTTP_CLIENT_KEEPALIVE_EXPIRY",
+    parse=float,
+    default="30",
+    type=(float, ...),
+)
+
+# Needs the h2 package; falls back to HTTP/1.1 without it
+HTTP_CLIENT_HTTP2 = EnvVarSpec(
+    id="HTTP_CLIENT_HTTP2",
+    parse=lambda x: x.lower() == "true",
+    default="true",
+    type=(bool, ...),
+)
+
+HTTP_CLIENT_TIMEOUT = EnvVarSpec(
+    id="HTTP_CLIENT_TIMEOUT",
+    parse=float,
+    default="60",
+    type=(float, ...),
+)
+
+HTTP_CLIENT_CONNECT_TIMEOUT = EnvVarSpec(
+    id="HTTP_CLIENT_CONNECT_TIMEOUT",
+    parse=float,
+    default="5",
+    type=(float, ...),
+)
+
+# Retries of failed idempotent requests, with jittered exponential backoff
+HTTP_CLIENT_RETRIES = EnvVarSpec(
+    id="HTTP_CLIENT_RETRIES",
+    parse=int,
+    default="2",
+    type=(int, ...),
+)
+
+HTTP_CLIENT_BACKOFF = EnvVarSpec(
+    id="HTTP_CLIENT_BACKOFF",
+    parse=float,
+    default="0.1",
+    type=(float, ...),
+)
+
+# Seconds before a slow hedged request is sent again; 0 turns hedging off
+HTTP_CLIENT_HEDGE_DELAY = EnvVarSpec(
+    id="HTTP_CLIENT_HEDGE_DELAY",
+    parse=float,
+    default="0",
+    type=(float, ...),
+)
+
 ## Opper ##
 
-OPPER_API_KEY = EnvVarSpec(id="OPPER_API_KEY", is_secret=True)
+# Needed by the opper LLM provider
+OPPER_API_KEY = EnvVarSpec(id="OPPER_API_KEY", is_optional=True, is_secret=True)
+
+## LLM ##
+
+# 'opper', or 'openai' for an OpenAI-compatible API such as the Kong AI Gateway route
+LLM_PROVIDER = EnvVarSpec(id="LLM_PROVIDER", default="opper")
+
+# Base URL of the OpenAI-compatible API (openai only)
+LLM_BASE_URL = EnvVarSpec(id="LLM_BASE_URL", default="http://kong:8000/llm")
+
+# Model name (openai only); unset to leave it to the gateway
+LLM_MODEL = EnvVarSpec(id="LLM_MODEL", is_optional=True)
+
+# Bearer token (openai only); unset if the gateway adds credentials
+LLM_API_KEY = EnvVarSpec(id="LLM_API_KEY", is_optional=True, is_secret=True)
 
 ## Couchbase ##
 
@@ -58,21 +217,283 @@ COUCHBASE_SCOPE    = EnvVarSpec(id="COUCHBASE_SCOPE", default="_default")
 COUCHBASE_URL      = EnvVarSpec(id="COUCHBASE_URL")
 COUCHBASE_USERNAME = EnvVarSpec(id="COUCHBASE_USERNAME")
 
+COUCHBASE_MAX_WORKERS = EnvVarSpec(
+    id="COUCHBASE_MAX_WORKERS",
+    parse=int,
+    default="32",
+    type=(int, ...),
+)
+
+# Per-operation timeouts in seconds. Tight KV timeouts bound tail latency;
+# a timed out operation fails the request rather than stalling it
+COUCHBASE_CONNECT_TIMEOUT = EnvVarSpec(
+    id="COUCHBASE_CONNECT_TIMEOUT",
+    parse=float,
+    default="10",
+    type=(float, ...),
+)
+
+COUCHBASE_KV_TIMEOUT = EnvVarSpec(
+    id="COUCHBASE_KV_TIMEOUT",
+    parse=float,
+    default="2.5",
+    type=(float, ...),
+)
+
+COUCHBASE_QUERY_TIMEOUT = EnvVarSpec(
+    id="COUCHBASE_QUERY_TIMEOUT",
+    parse=float,
+    default="10",
+    type=(float, ...),
+)
+
+# Maximum pooled HTTP connections per node for the query service, and how
+# long idle ones are kept, in seconds; 0 keeps the SDK defaults. KV traffic
+# is multiplexed over one connection per node, which the SDK doesn't expose
+COUCHBASE_MAX_HTTP_CONNECTIONS = EnvVarSpec(
+    id="COUCHBASE_MAX_HTTP_CONNECTIONS",
+    parse=int,
+    default="0",
+    type=(int, ...),
+)
+
+COUCHBASE_IDLE_HTTP_CONNECTION_TIMEOUT = EnvVarSpec(
+    id="COUCHBASE_IDLE_HTTP_CONNECTION_TIMEOUT",
+    parse=float,
+    default="0",
+    type=(float, ...),
+)
+
+# Compress KV documents of at least MIN_SIZE bytes that shrink to at most MIN_RATIO of their size
+COUCHBASE_COMPRESSION = EnvVarSpec(
+    id="COUCHBASE_COMPRESSION",
+    parse=lambda x: x.lower() == "true",
+    default="true",
+    type=(bool, ...),
+)
+
+COUCHBASE_COMPRESSION_MIN_SIZE = EnvVarSpec(
+    id="COUCHBASE_COMPRESSION_MIN_SIZE",
+    parse=int,
+    default="32",
+    type=(int, ...),
+)
+
+COUCHBASE_COMPRESSION_MIN_RATIO = EnvVarSpec(
+    id="COUCHBASE_COMPRESSION_MIN_RATIO",
+    parse=float,
+    default="0.83",
+    type=(float, ...),
+)
+
+# Seconds each connection attempt waits for the KV and query services
+COUCHBASE_READY_TIMEOUT = EnvVarSpec(
+    id="COUCHBASE_READY_TIMEOUT",
+    parse=float,
+    default="10",
+    type=(float, ...),
+)
+
+# Seconds between health pings once connected; the cluster handle is
+# rebuilt after several failed pings in a row
+COUCHBASE_HEALTH_INTERVAL = EnvVarSpec(
+    id="COUCHBASE_HEALTH_INTERVAL",
+    parse=float,
+    default="5",
+    type=(float, ...),
+)
+
+# Days chats are kept after their last activity, and messages after they're written; 0 keeps them forever
+RETENTION_DAYS = EnvVarSpec(
+    id="RETENTION_DAYS",
+    parse=float,
+    default="0",
+    type=(float, ...),
+)
+
+RETENTION_SWEEP_INTERVAL = EnvVarSpec(
+    id="RETENTION_SWEEP_INTERVAL",
+    parse=float,
+    default="86400",
+    type=(float, ...),
+)
+
+RETENTION_SWEEP_BATCH_SIZE = EnvVarSpec(
+    id="RETENTION_SWEEP_BATCH_SIZE",
+    parse=int,
+    default="200",
+    type=(int, ...),
+)
+
+## Caching ##
+
+REDIS_URL = EnvVarSpec(id="REDIS_URL", is_optional=True)
+
+HISTORY_CACHE_BACKEND = EnvVarSpec(id="HISTORY_CACHE_BACKEND", default="memory")
+
+HISTORY_CACHE_SIZE = EnvVarSpec(
+    id="HISTORY_CACHE_SIZE",
+    parse=int,
+    default="1024",
+    type=(int, ...),
+)
+
+HISTORY_CACHE_TTL = EnvVarSpec(
+    id="HISTORY_CACHE_TTL",
+    parse=float,
+    default="600",
+    type=(float, ...),
+)
+
+INTENT_CACHE_SIZE = EnvVarSpec(
+    id="INTENT_CACHE_SIZE",
+    parse=int,
+    default="4096",
+    type=(int, ...),
+)
+
+INTENT_CACHE_TTL = EnvVarSpec(
+    id="INTENT_CACHE_TTL",
+    parse=float,
+    default="3600",
+    type=(float, ...),
+)
+
+# Minimum cosine similarity for near matches; 0 means exact matches only
+INTENT_CACHE_SIMILARITY = EnvVarSpec(
+    id="INTENT_CACHE_SIMILARITY",
+    parse=float,
+    default="0",
+    type=(float, ...),
+)
+
+# Response caching is opt-in: set to 'memory' or 'redis' to enable
+RESPONSE_CACHE_BACKEND = EnvVarSpec(id="RESPONSE_CACHE_BACKEND", default="none")
+
+RESPONSE_CACHE_SIZE = EnvVarSpec(
+    id="RESPONSE_CACHE_SIZE",
+    parse=int,
+    default="1024",
+    type=(int, ...),
+)
+
+RESPONSE_CACHE_TTL = EnvVarSpec(
+    id="RESPONSE_CACHE_TTL",
+    parse=float,
+    default="300",
+    type=(float, ...),
+)
+
+# Number of trailing conversation messages a cached response is keyed on
+RESPONSE_CACHE_MESSAGES = EnvVarSpec(
+    id="RESPONSE_CACHE_MESSAGES",
+    parse=int,
+    default="2",
+    type=(int, ...),
+)
+
+## Context Window ##
+
+# Approximate token budget for the conversation sent to the model; 0 sends it all
+CONTEXT_TOKEN_BUDGET = EnvVarSpec(
+    id="CONTEXT_TOKEN_BUDGET",
+    parse=int,
+    default="3000",
+    type=(int, ...),
+)
+
+# Minimum number of recent messages always sent verbatim
+CONTEXT_RECENT_MESSAGES = EnvVarSpec(
+    id="CONTEXT_RECENT_MESSAGES",
+    parse=int,
+    default="6",
+    type=(int, ...),
+)
+
+## Knowledge Base ##
+
+# Path to a .jsonl or .parquet file, or couchbase:<collection>
+KNOWLEDGE_SOURCE = EnvVarSpec(id="KNOWLEDGE_SOURCE", default="data/knowledge_base.jsonl")
+
+KNOWLEDGE_RELOAD_INTERVAL = EnvVarSpec(
+    id="KNOWLEDGE_RELOAD_INTERVAL",
+    parse=float,
+    default="30",
+    type=(float, ...),
+)
+
+KNOWLEDGE_SEARCH_MODE = EnvVarSpec(id="KNOWLEDGE_SEARCH_MODE", default="bm25")
+
+KNOWLEDGE_VECTOR_DIM = EnvVarSpec(
+    id="KNOWLEDGE_VECTOR_DIM",
+    parse=int,
+    default="1024",
+    type=(int, ...),
+)
+
 #### Validation ####
 
 def validate() -> bool:
     return env.validate(
         [
             LOG_LEVEL,
+            LOG_FORMAT,
+            TRACE_EXPORTER,
+            TRACE_FILE,
+            TRACE_OTLP_ENDPOINT,
             HTTP_PORT,
             HTTP_DEBUG,
             HTTP_AUTORELOAD,
+            HTTP_CLIENT_MAX_CONNECTIONS,
+            HTTP_CLIENT_MAX_KEEPALIVE,
+            HTTP_CLIENT_KEEPALIVE_EXPIRY,
+            HTTP_CLIENT_HTTP2,
+            HTTP_CLIENT_TIMEOUT,
+            HTTP_CLIENT_CONNECT_TIMEOUT,
+            HTTP_CLIENT_RETRIES,
+            HTTP_CLIENT_BACKOFF,
+            HTTP_CLIENT_HEDGE_DELAY,
             OPPER_API_KEY,
+            LLM_PROVIDER,
+            LLM_BASE_URL,
+            LLM_MODEL,
+            LLM_API_KEY,
             COUCHBASE_URL,
             COUCHBASE_BUCKET,
             COUCHBASE_USERNAME,
             COUCHBASE_PASSWORD,
             COUCHBASE_SCOPE,
+            COUCHBASE_MAX_WORKERS,
+            COUCHBASE_CONNECT_TIMEOUT,
+            COUCHBASE_KV_TIMEOUT,
+            COUCHBASE_QUERY_TIMEOUT,
+            COUCHBASE_MAX_HTTP_CONNECTIONS,
+            COUCHBASE_IDLE_HTTP_CONNECTION_TIMEOUT,
+            COUCHBASE_COMPRESSION,
+            COUCHBASE_COMPRESSION_MIN_SIZE,
+            COUCHBASE_COMPRESSION_MIN_RATIO,
+            COUCHBASE_READY_TIMEOUT,
+            COUCHBASE_HEALTH_INTERVAL,
+            RETENTION_DAYS,
+            RETENTION_SWEEP_INTERVAL,
+            RETENTION_SWEEP_BATCH_SIZE,
+            REDIS_URL,
+            HISTORY_CACHE_BACKEND,
+            HISTORY_CACHE_SIZE,
+            HISTORY_CACHE_TTL,
+            INTENT_CACHE_SIZE,
+            INTENT_CACHE_TTL,
+            INTENT_CACHE_SIMILARITY,
+            RESPONSE_CACHE_BACKEND,
+            RESPONSE_CACHE_SIZE,
+            RESPONSE_CACHE_TTL,
+            RESPONSE_CACHE_MESSAGES,
+            CONTEXT_TOKEN_BUDGET,
+            CONTEXT_RECENT_MESSAGES,
+            KNOWLEDGE_SOURCE,
+            KNOWLEDGE_RELOAD_INTERVAL,
+            KNOWLEDGE_SEARCH_MODE,
+            KNOWLEDGE_VECTOR_DIM,
         ]
     )
 
@@ -81,6 +502,16 @@ def validate() -> bool:
 def get_log_level() -> str:
     return env.parse(LOG_LEVEL)
 
+def get_log_format() -> str:
+    return env.parse(LOG_FORMAT)
+
+def get_tracing_conf() -> TracingConf:
+    return TracingConf(
+        exporter=env.parse(TRACE_EXPORTER).lower(),
+        file=env.parse(TRACE_FILE),
+        otlp_endpoint=env.parse(TRACE_OTLP_ENDPOINT),
+    )
+
 def get_http_conf() -> HttpServerConf:
     return HttpServerConf(
         host=env.parse(HTTP_HOST),
@@ -89,13 +520,91 @@ def get_http_conf() -> HttpServerConf:
         autoreload=env.parse(HTTP_AUTORELOAD),
     )
 
+def get_http_client_conf() -> HttpClientConf:
+    hedge_delay = env.parse(HTTP_CLIENT_HEDGE_DELAY)
+    return HttpClientConf(
+        max_connections=env.parse(HTTP_CLIENT_MAX_CONNECTIONS),
+        max_keepalive_connections=env.parse(HTTP_CLIENT_MAX_KEEPALIVE),
+        keepalive_expiry=env.parse(HTTP_CLIENT_KEEPALIVE_EXPIRY),
+        http2=env.parse(HTTP_CLIENT_HTTP2),
+        timeout=env.parse(HTTP_CLIENT_TIMEOUT),
+        connect_timeout=env.parse(HTTP_CLIENT_CONNECT_TIMEOUT),
+        retries=env.parse(HTTP_CLIENT_RETRIES),
+        backoff=env.parse(HTTP_CLIENT_BACKOFF),
+        hedge_delay=hedge_delay if hedge_delay > 0 else None,
+    )
+
 def get_couchbase_conf() -> CouchbaseConf:
     return CouchbaseConf(
         url=env.parse(COUCHBASE_URL),
         bucket=env.parse(COUCHBASE_BUCKET),
         username=env.parse(COUCHBASE_USERNAME),
         password=env.parse(COUCHBASE_PASSWORD),
+        max_workers=env.parse(COUCHBASE_MAX_WORKERS),
+        connect_timeout=env.parse(COUCHBASE_CONNECT_TIMEOUT),
+        kv_timeout=env.parse(COUCHBASE_KV_TIMEOUT),
+        query_timeout=env.parse(COUCHBASE_QUERY_TIMEOUT),
+        max_http_connections=env.parse(COUCHBASE_MAX_HTTP_CONNECTIONS),
+        idle_http_connection_timeout=env.parse(COUCHBASE_IDLE_HTTP_CONNECTION_TIMEOUT),
+        compression=env.parse(COUCHBASE_COMPRESSION),
+        compression_min_size=env.parse(COUCHBASE_COMPRESSION_MIN_SIZE),
+        compression_min_ratio=env.parse(COUCHBASE_COMPRESSION_MIN_RATIO),
+        ready_timeout=env.parse(COUCHBASE_READY_TIMEOUT),
+        health_interval=env.parse(COUCHBASE_HEALTH_INTERVAL),
     )
 
-def get_opper_api_key() -> str:
+def get_opper_api_key() -> str | None:
     return env.parse(OPPER_API_KEY)
+
+def get_llm_conf() -> LLMConf:
+    return LLMConf(
+        provider=env.parse(LLM_PROVIDER).lower(),
+        base_url=env.parse(LLM_BASE_URL),
+        model=env.parse(LLM_MODEL),
+        api_key=env.parse(LLM_API_KEY),
+    )
+
+def get_retention_conf() -> RetentionConf:
+    return RetentionConf(
+        days=env.parse(RETENTION_DAYS),
+        sweep_interval=env.parse(RETENTION_SWEEP_INTERVAL),
+        sweep_batch_size=env.parse(RETENTION_SWEEP_BATCH_SIZE),
+    )
+
+def get_history_cache_conf() -> CacheConf:
+    return CacheConf(
+        backend=env.parse(HISTORY_CACHE_BACKEND),
+        max_size=env.parse(HISTORY_CACHE_SIZE),
+        ttl=env.parse(HISTORY_CACHE_TTL) or None,
+        redis_url=env.parse(REDIS_URL),
+    )
+
+def get_intent_cache_conf() -> IntentCacheConf:
+    return IntentCacheConf(
+        max_size=env.parse(INTENT_CACHE_SIZE),
+        ttl=env.parse(INTENT_CACHE_TTL) or None,
+        similarity=env.parse(INTENT_CACHE_SIMILARITY) or None,
+    )
+
+def get_response_cache_conf() -> ResponseCacheConf:
+    return ResponseCacheConf(
+        backend=env.parse(RESPONSE_CACHE_BACKEND),
+        max_size=env.parse(RESPONSE_CACHE_SIZE),
+        ttl=env.parse(RESPONSE_CACHE_TTL) or None,
+        redis_url=env.parse(REDIS_URL),
+        messages=env.parse(RESPONSE_CACHE_MESSAGES),
+    )
+
+def get_context_conf() -> ContextConf:
+    return ContextConf(
+        token_budget=env.parse(CONTEXT_TOKEN_BUDGET),
+        recent_messages=env.parse(CONTEXT_RECENT_MESSAGES),
+    )
+
+def get_knowledge_conf() -> KnowledgeConf:
+    return KnowledgeConf(
+        source=env.parse(KNOWLEDGE_SOURCE),
+        mode=env.parse(KNOWLEDGE_SEARCH_MODE),
+        vector_dim=env.parse(KNOWLEDGE_VECTOR_DIM),
+        reload_interval=env.parse(KNOWLEDGE_RELOAD_INTERVAL),
+    )
@@ -0,0 +1,192 @@
+import asyncio
+from typing import Any, Optional
+
+from .clients.couchbase import AsyncCouchbaseChatClient
+from .clients.llm import LLMProvider
+from .metrics import helper_timed
+from .utils import log
+
+logger = log.get_logger(__name__)
+
+#### Helpers ####
+
+# Rough average for English text; close enough to budget prompts without a tokenizer
+CHARS_PER_TOKEN = 4
+
+SUMMARY_INSTRUCTIONS = """
+Update the running summary of a customer support conversation with the new messages.
+Keep every fact the assistant may need later: the customer's device, problem, steps already tried, promises made and open questions.
+Drop greetings and small talk. Write plain prose of at most 200 words.
+"""
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens in a text."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def message_tokens(messages: list[dict[str, Any]]) -> int:
+    """Estimate the number of tokens in a list of messages."""
+    return sum(estimate_tokens(msg["content"]) for msg in messages)
+
+@helper_timed("summarize_conversation")
+async def summarize_conversation(llm: LLMProvider, summary: Optional[str], messages):
+    """Fold messages into the running summary of a conversation."""
+    return await llm.call(
+        name="summarize_conversation",
+        instructions=SUMMARY_INSTRUCTIONS,
+        input={"summary": summary or "", "messages": messages},
+        output_type=str,
+    )
+
+#### Context Window ####
+
+class ContextWindow:
+    """
+    Bounds the conversation sent to the model to a token budget.
+
+    System messages are always kept. The newest turns are sent verbatim, as
+    many as fit in the budget (but never fewer than `recent_messages`), and
+    older turns are represented by a rolling summary stored with the chat.
+
+    The summary is updated incrementally in the background: once the turns
+    after it no longer fit in the budget, the oldest of them are folded into
+    it until the rest fit in half the budget, so the summarization call runs
+    every few turns rather than on every one, and never on the request path.
+
+    Args:
+        db: The chat store the summaries are kept in
+        llm: The model provider used for summarizing
+        token_budget: Approximate token budget, or 0 to send the whole conversation
+        recent_messages: Minimum number of recent messages sent verbatim
+    """
+    def __init__(
+        self,
+        db: AsyncCouchbaseChatClient,
+        llm: LLMProvider,
+        token_budget: int = 3000,
+        recent_messages: int = 6
+    ):
+        self.db = db
+        self.llm = llm
+        self.token_budget = token_budget
+        self.recent_messages = recent_messages
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    def _split(self, history, summary):
+        """Split a history into its system messages and unsummarized turns."""
+        upto = summary["summary_upto"] if summary else None
+        system = [msg for msg in history if msg["role"] == "system"]
+        turns = [
+            msg for msg in history
+            if msg["role"] != "system" and (upto is None or msg["id"] > upto)
+        ]
+        return (system, turns)
+
+    def _turns_budget(self, system, summary) -> int:
+        """Tokens left for verbatim turns after the system messages and summary."""
+        used = message_tokens(system)
+        if summary:
+            used += estimate_tokens(summary["summary"])
+        return self.token_budget - used
+
+    def build(
+        self,
+        history: list[dict[str, Any]],
+        summary: Optional[dict[str, Any]],
+        content: str
+    ) -> list[dict[str, str]]:
+        """
+        Build the conversation to send to the model.
+
+        Args:
+            history: The stored messages, oldest first
+            summary: The chat's rolling summary, if any
+            content: The new user message
+
+        Returns:
+            Messages with `role` and `content`
+        """
+        new_message = {"role": "user", "content": content}
+        if self.token_budget <= 0:
+            return [
+                {"role": msg["role"], "content": msg["content"]}
+                for msg in history
+            ] + [new_message]
+
+        (system, turns) = self._split(history, summary)
+        turns = turns + [new_message]
+
+        budget = self._turns_budget(system, summary)
+        recent = []
+        for msg in reversed(turns):
+            budget -= estimate_tokens(msg["content"])
+            if budget < 0 and len(recent) >= self.recent_messages:
+                break
+            recent.append(msg)
+        recent.reverse()
+
+        messages = [{"role": msg["role"], "content": msg["content"]} for msg in system]
+        if summary:
+            messages.append({
+                "role": "system",
+                "content": f"Summary of the earlier conversation:\n{summary['summary']}"
+            })
+        return messages + [
+            {"role": msg["role"], "content": msg["content"]}
+            for msg in recent
+        ]
+
+    def schedule_summary(
+        self,
+        chat_id: str,
+        history: list[dict[str, Any]],
+        summary: Optional[dict[str, Any]]
+    ) -> None:
+        """
+        Start updating the chat's summary in the background, if its
+        unsummarized turns have outgrown the budget.
+
+        Args:
+            chat_id: The UUID of the chat session
+            history: The stored messages, oldest first
+            summary: The chat's rolling summary, if any
+        """
+        if self.token_budget <= 0 or chat_id in self._tasks:
+            return
+
+        (system, turns) = self._split(history, summary)
+        budget = self._turns_budget(system, summary)
+        remaining = message_tokens(turns)
+        if remaining <= budget:
+            return
+
+        # Fold the oldest turns until the rest fit in half the budget
+        fold = []
+        for msg in turns[:-self.recent_messages or None]:
+            if remaining <= budget // 2:
+                break
+            fold.append(msg)
+            remaining -= estimate_tokens(msg["content"])
+        if not fold:
+            return
+
+        task = asyncio.create_task(self._summarize(chat_id, summary, fold))
+        self._tasks[chat_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(chat_id, None))
+
+    async def _summarize(self, chat_id, summary, fold) -> None:
+        try:
+            updated = await summarize_conversation(
+                self.llm,
+                summary["summary"] if summary else None,
+                [{"role": msg["role"], "content": msg["content"]} for msg in fold]
+            )
+            await self.db.set_summary(chat_id, updated, fold[-1]["id"])
+            logger.debug(f"Summarized {len(fold)} messages of chat {chat_id}")
+        except Exception:
+            logger.exception(f"Failed to summarize chat {chat_id}.")
+
+    async def close(self) -> None:
+        """Cancel summaries in progress."""
+        for task in list(self._tasks.values()):
+            task.cancel()
+        self._tasks.clear()
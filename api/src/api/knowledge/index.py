@@ -0,0 +1,224 @@
+import heapq
+import math
+import sys
+from collections import Counter
+from typing import Any, Iterable, Optional
+
+from .text import tokenize
+
+# Relative weight of a term occurrence in each indexed field
+FIELD_WEIGHTS = {
+    "title": 2.0,
+    "tags": 1.5,
+    "content": 1.0,
+}
+
+class InvertedIndex:
+    """
+    Inverted index over knowledge items with BM25 ranking.
+
+    Items are dicts with `id`, `title`, `content`, `category` and optional
+    `tags`. Title, tags and content are tokenized into a single posting list
+    per term, with occurrences weighted per field (a simple form of BM25F).
+    Categories get their own posting sets so filtering is a set
+    intersection rather than a scan. Items can be added, replaced and
+    removed incrementally, or the whole index rebuilt.
+
+    Each posting also holds its term's BM25 weight in the item before idf,
+    with the item's length normalization folded in, so scoring is one
+    multiply-add per posting. The weights depend on the average item length,
+    so after items are added or removed they are recomputed on the next
+    score rather than on every update.
+
+    Args:
+        k1: BM25 term frequency saturation
+        b: BM25 document length normalization
+    """
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.items: dict[str, dict[str, Any]] = {}
+        self.postings: dict[str, dict[str, float]] = {}
+        self.weights: dict[str, dict[str, float]] = {}
+        self.categories: dict[str, set[str]] = {}
+        self.doc_lengths: dict[str, float] = {}
+        self.doc_terms: dict[str, tuple[str, ...]] = {}
+        self.total_length = 0.0
+        self._weights_stale = False
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    @property
+    def avg_doc_length(self) -> float:
+        return self.total_length / len(self.items) if self.items else 0.0
+
+    def build(self, items: Iterable[dict[str, Any]]) -> None:
+        """Index items, replacing the current contents; of items sharing an ID, the last wins."""
+        self.items = {}
+        self.postings = {}
+        self.categories = {}
+        self.doc_lengths = {}
+        self.doc_terms = {}
+        self.total_length = 0.0
+        for item in {item["id"]: item for item in items}.values():
+            self._add(item)
+        self._compute_weights()
+
+    def add(self, item: dict[str, Any]) -> None:
+        """Index an item, replacing any item with the same ID."""
+        self._remove(item["id"])
+        self._add(item)
+        self._weights_stale = True
+
+    def add_all(self, items: Iterable[dict[str, Any]]) -> None:
+        """Index several items."""
+        for item in items:
+            self._remove(item["id"])
+            self._add(item)
+        self._weights_stale = True
+
+    def remove(self, item_id: str) -> None:
+        """Remove an item from the index, if present."""
+        if self._remove(item_id):
+            self._weights_stale = True
+
+    def _add(self, item: dict[str, Any]) -> None:
+        item_id = item["id"]
+        frequencies: Counter[str] = Counter()
+        for (field, weight) in FIELD_WEIGHTS.items():
+            value = item.get(field) or ""
+            if isinstance(value, list):
+                value = " ".join(value)
+            for term in tokenize(value):
+                frequencies[term] += weight
+
+        for (term, frequency) in frequencies.items():
+            self.postings.setdefault(term, {})[item_id] = frequency
+        self.categories.setdefault(item.get("category"), set()).add(item_id)
+
+        length = sum(frequencies.values())
+        self.items[item_id] = item
+        self.doc_lengths[item_id] = length
+        self.doc_terms[item_id] = tuple(frequencies)
+        self.total_length += length
+
+    def _remove(self, item_id: str) -> bool:
+        item = self.items.pop(item_id, None)
+        if item is None:
+            return False
+
+        for term in self.doc_terms.pop(item_id):
+            postings = self.postings[term]
+            del postings[item_id]
+            if not postings:
+                del self.postings[term]
+
+        category_ids = self.categories[item.get("category")]
+        category_ids.discard(item_id)
+        if not category_ids:
+            del self.categories[item.get("category")]
+
+        self.total_length -= self.doc_lengths.pop(item_id)
+        return True
+
+    def _compute_weights(self) -> None:
+        k1 = self.k1
+        avg_length = self.avg_doc_length or 1.0
+        norms = {
+            item_id: k1 * (1 - self.b + self.b * length / avg_length)
+            for (item_id, length) in self.doc_lengths.items()
+        }
+        self.weights = {
+            term: {
+                item_id: frequency * (k1 + 1) / (frequency + norms[item_id])
+                for (item_id, frequency) in postings.items()
+            }
+            for (term, postings) in self.postings.items()
+        }
+        self._weights_stale = False
+
+    def memory_bytes(self) -> int:
+        """Approximate memory held by the index structures, excluding the items."""
+        size = sum(
+            sys.getsizeof(d)
+            for d in (self.postings, self.weights, self.categories, self.doc_lengths, self.doc_terms)
+        )
+        size += sum(
+            sys.getsizeof(term) + sys.getsizeof(postings)
+            for (term, postings) in self.postings.items()
+        )
+        size += sum(sys.getsizeof(weights) for weights in self.weights.values())
+        size += sum(sys.getsizeof(ids) for ids in self.categories.values())
+        size += sum(sys.getsizeof(terms) for terms in self.doc_terms.values())
+        return size
+
+    def score(self, query: str) -> dict[str, float]:
+        """
+        Score every item matching at least one query term.
+
+        Args:
+            query: Free-text query
+
+        Returns:
+            BM25 score by item ID
+        """
+        if self._weights_stale:
+            self._compute_weights()
+        n = len(self.items)
+        scores: dict[str, float] = {}
+        for term in set(tokenize(query)):
+            weights = self.weights.get(term)
+            if not weights:
+                continue
+            df = len(weights)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            if not scores:
+                scores = {item_id: idf * weight for (item_id, weight) in weights.items()}
+                continue
+            get = scores.get
+            for (item_id, weight) in weights.items():
+                scores[item_id] = get(item_id, 0.0) + idf * weight
+        return scores
+
+    def top(
+        self,
+        scores: dict[str, float],
+        category: Optional[str] = None,
+        limit: int = 5
+    ) -> list[dict[str, Any]]:
+        """
+        Pick the best scored items, optionally within a category.
+
+        Args:
+            scores: Scores from `score`
+            category: Optional category to restrict results to
+            limit: Maximum number of results
+
+        Returns:
+            Copies of the items with a `relevance_score`, best first
+        """
+        if category is not None:
+            category_ids = self.categories.get(category, set())
+            # Intersect by iterating over the smaller side
+            if len(category_ids) < len(scores):
+                candidates = [i for i in category_ids if i in scores]
+            else:
+                candidates = [i for i in scores if i in category_ids]
+        else:
+            candidates = scores
+
+        best = heapq.nlargest(limit, candidates, key=scores.__getitem__)
+        return [
+            {**self.items[item_id], "relevance_score": scores[item_id]}
+            for item_id in best
+        ]
+
+    def search(
+        self,
+        query: str,
+        category: Optional[str] = None,
+        limit: int = 5
+    ) -> list[dict[str, Any]]:
+        """Score the query and return the best items. See `score` and `top`."""
+        return self.top(self.score(query), category=category, limit=limit)
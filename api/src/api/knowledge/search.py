@@ -0,0 +1,55 @@
+from typing import Any, Iterable, Optional, Protocol
+
+from .index import InvertedIndex
+from .vectors import HashingEmbedder, VectorIndex
+from ..utils import log
+
+logger = log.get_logger(__name__)
+
+class KnowledgeIndex(Protocol):
+    """Search interface shared by the keyword and embedding indexes."""
+    def __len__(self) -> int: ...
+
+    def memory_bytes(self) -> int: ...
+
+    def score(self, query: str) -> Any: ...
+
+    def top(
+        self,
+        scores: Any,
+        category: Optional[str] = None,
+        limit: int = 5
+    ) -> list[dict[str, Any]]: ...
+
+    def search(
+        self,
+        query: str,
+        category: Optional[str] = None,
+        limit: int = 5
+    ) -> list[dict[str, Any]]: ...
+
+def create_index(
+    mode: str,
+    items: Iterable[dict[str, Any]],
+    vector_dim: int = 1024
+) -> KnowledgeIndex:
+    """
+    Build a knowledge index over items.
+
+    Args:
+        mode: 'bm25' for keyword ranking or 'vector' for embedding similarity
+        items: Knowledge items to index
+        vector_dim: Embedding dimensionality for the vector mode
+
+    Returns:
+        The populated index
+    """
+    if mode == "vector":
+        index = VectorIndex(HashingEmbedder(vector_dim))
+        index.build(items)
+        return index
+    if mode != "bm25":
+        logger.warning(f"Unknown knowledge search mode {mode!r}; using bm25")
+    index = InvertedIndex()
+    index.build(items)
+    return index
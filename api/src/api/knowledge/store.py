@@ -0,0 +1,231 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Any, Hashable, Iterator, Optional, Protocol
+
+from couchbase.collection import Collection
+from couchbase.kv_range_scan import RangeScan
+from couchbase.options import ScanOptions
+
+from ..clients.couchbase import CouchbaseChatClient
+from ..utils import log
+from .search import KnowledgeIndex, create_index
+
+logger = log.get_logger(__name__)
+
+#### Sources ####
+
+class KnowledgeSource(Protocol):
+    """Where knowledge items are loaded from."""
+    def fingerprint(self) -> Hashable:
+        """A value that changes whenever the items change."""
+        ...
+
+    def load(self) -> list[dict[str, Any]]:
+        """Load all items."""
+        ...
+
+class FileSource:
+    """
+    Knowledge items in a JSONL or Parquet file.
+
+    Changes are detected from the file's modification time and size.
+
+    Args:
+        path: Path to a .jsonl or .parquet file
+    """
+    def __init__(self, path: str):
+        self.path = path
+
+    def __str__(self) -> str:
+        return self.path
+
+    def fingerprint(self) -> Hashable:
+        stat = os.stat(self.path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _read_jsonl(self) -> Iterator[dict[str, Any]]:
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def _read_parquet(self) -> Iterator[dict[str, Any]]:
+        import pandas as pd
+
+        for item in pd.read_parquet(self.path).to_dict(orient="records"):
+            # Parquet list columns come back as arrays
+            if item.get("tags") is not None:
+                item["tags"] = list(item["tags"])
+            yield item
+
+    def load(self) -> list[dict[str, Any]]:
+        if self.path.endswith(".parquet"):
+            return list(self._read_parquet())
+        return list(self._read_jsonl())
+
+class CouchbaseSource:
+    """
+    Knowledge items stored as documents in a Couchbase collection.
+
+    Items are read with a KV range scan, so no query index is needed.
+    Changes are detected from the document IDs and CAS values, fetched
+    without the document bodies: an IDs-only scan, then batched `exists`
+    lookups, which return the CAS from metadata. Only `load` reads content.
+
+    Args:
+        db: Chat store client whose scope holds the collection
+        collection: Name of the collection
+        batch_size: Documents per batched `exists` lookup
+    """
+    def __init__(self, db: CouchbaseChatClient, collection: str, batch_size: int = 500):
+        self.db = db
+        self.collection = collection
+        self.batch_size = batch_size
+
+    def __str__(self) -> str:
+        return f"couchbase:{self.collection}"
+
+    def _collection(self) -> Collection:
+        if not self.db.scope:
+            raise RuntimeError("Couchbase isn't connected yet")
+        return self.db.scope.collection(self.collection)
+
+    def fingerprint(self) -> Hashable:
+        collection = self._collection()
+        keys = sorted(
+            result.id for result in collection.scan(
+                RangeScan(), ScanOptions(ids_only=True, batch_item_limit=self.batch_size)
+            )
+        )
+        digest = hashlib.sha256()
+        for i in range(0, len(keys), self.batch_size):
+            batch = keys[i:i + self.batch_size]
+            # Documents removed since the scan are missing here, and change the digest
+            results = collection.exists_multi(batch).results
+            for key in batch:
+                cas = results[key].cas if key in results else 0
+                digest.update(f"{key}:{cas};".encode())
+        return digest.hexdigest()
+
+    def load(self) -> list[dict[str, Any]]:
+        results = self._collection().scan(
+            RangeScan(), ScanOptions(batch_item_limit=self.batch_size)
+        )
+        return [{"id": result.id, **result.content_as[dict]} for result in results]
+
+#### Store ####
+
+class KnowledgeSnapshot:
+    """An immutable, fully built knowledge index and its build statistics."""
+    def __init__(
+        self,
+        version: int,
+        index: KnowledgeIndex,
+        fingerprint: Hashable,
+        build_ms: float,
+        memory_bytes: int
+    ):
+        self.version = version
+        self.index = index
+        self.fingerprint = fingerprint
+        self.build_ms = build_ms
+        self.memory_bytes = memory_bytes
+
+class KnowledgeStore:
+    """
+    Serves knowledge base searches from a hot-swappable index snapshot.
+
+    The index is built off the event loop, once at startup and again
+    whenever the source changes. A new snapshot replaces the old one with a
+    single reference assignment, so readers never block on a rebuild and
+    always see a complete index. Callers should take `snapshot` once per
+    request so scoring and ranking use the same index.
+
+    Args:
+        source: Where items are loaded from
+        mode: Search mode passed to `create_index`
+        vector_dim: Embedding dimensionality for the vector mode
+        reload_interval: Seconds between checks for source changes, or 0 to disable
+    """
+    def __init__(
+        self,
+        source: KnowledgeSource,
+        mode: str = "bm25",
+        vector_dim: int = 1024,
+        reload_interval: float = 30.0
+    ):
+        self.source = source
+        self.mode = mode
+        self.vector_dim = vector_dim
+        self.reload_interval = reload_interval
+        self.snapshot: Optional[KnowledgeSnapshot] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _build(self) -> Optional[KnowledgeSnapshot]:
+        fingerprint = self.source.fingerprint()
+        if self.snapshot and self.snapshot.fingerprint == fingerprint:
+            return None
+
+        start = time.perf_counter()
+        items = self.source.load()
+        index = create_index(self.mode, items, vector_dim=self.vector_dim)
+        build_ms = (time.perf_counter() - start) * 1000
+        version = self.snapshot.version + 1 if self.snapshot else 1
+        return KnowledgeSnapshot(
+            version, index, fingerprint, build_ms, index.memory_bytes()
+        )
+
+    async def reload(self) -> bool:
+        """
+        Rebuild the index if the source changed.
+
+        Returns:
+            True if a new snapshot was swapped in
+        """
+        snapshot = await asyncio.to_thread(self._build)
+        if snapshot is None:
+            return False
+        self.snapshot = snapshot
+        logger.info(
+            f"Built knowledge index v{snapshot.version} from {self.source}: "
+            f"{len(snapshot.index)} items ({self.mode}) in {snapshot.build_ms:.1f} ms, "
+            f"~{snapshot.memory_bytes / 1024:.0f} KiB"
+        )
+        return True
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                await self.reload()
+            except Exception as e:
+                logger.warning(f"Failed to reload knowledge base: {str(e)}")
+
+    async def start(self) -> None:
+        """Build the initial index and start watching the source for changes."""
+        try:
+            await self.reload()
+        except Exception:
+            logger.exception("Failed to load knowledge base.")
+        if self.reload_interval > 0:
+            self._task = asyncio.create_task(self._watch())
+
+    async def close(self) -> None:
+        """Stop watching the source."""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def search(
+        self,
+        query: str,
+        category: Optional[str] = None,
+        limit: int = 5
+    ) -> list[dict[str, Any]]:
+        """Search the current snapshot. Returns nothing until the first build."""
+        if not self.snapshot:
+            return []
+        return self.snapshot.index.search(query, category=category, limit=limit)
@@ -0,0 +1,61 @@
+import functools
+import re
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i if in is it
+its me my of on or our so that the their then there these this to was what
+when where which who why will with you your
+""".split())
+
+# Suffixes stripped by the stemmer, longest first, with their replacements
+SUFFIXES = (
+    ("ational", "ate"),
+    ("ization", "ize"),
+    ("fulness", "ful"),
+    ("ousness", "ous"),
+    ("iveness", "ive"),
+    ("ements", "e"),
+    ("ement", "e"),
+    ("ments", ""),
+    ("ment", ""),
+    ("ingly", ""),
+    ("edly", ""),
+    ("sses", "ss"),
+    ("ies", "y"),
+    ("ing", ""),
+    ("ers", ""),
+    ("ed", ""),
+    ("er", ""),
+    ("ly", ""),
+    ("es", "e"),
+    ("s", ""),
+)
+
+@functools.lru_cache(maxsize=65536)
+def stem(word: str) -> str:
+    """
+    Reduce a word to a crude stem by stripping common English suffixes.
+
+    Stems need not be real words, only consistent, so "resets", "resetting"
+    and "reset" all map to the same term.
+    """
+    if len(word) <= 3 or word.endswith("ss"):
+        return word
+    for (suffix, replacement) in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)] + replacement
+            # Undouble final consonants left by -ing/-ed ("resetting" -> "reset")
+            if len(word) > 3 and word[-1] == word[-2] and word[-1] not in "aeiouls":
+                word = word[:-1]
+            return word
+    return word
+
+def tokenize(text: str) -> list[str]:
+    """Split text into lowercase, stemmed terms, dropping stopwords."""
+    return [
+        stem(token)
+        for token in TOKEN_RE.findall(text.lower())
+        if token not in STOPWORDS
+    ]
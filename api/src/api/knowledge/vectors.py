@@ -0,0 +1,183 @@
+import json
+import math
+import os
+import zlib
+from collections import Counter
+from typing import Any, Iterable, Optional
+
+import numpy as np
+
+from .text import tokenize
+
+class HashingEmbedder:
+    """
+    Local text embedder using the hashing trick.
+
+    Stemmed unigrams and bigrams are hashed into `dim` signed buckets with
+    sublinear term frequency weighting, then L2-normalized. It needs no model
+    or network, and uses a stable hash so vectors saved by one process are
+    valid in another.
+
+    Args:
+        dim: Embedding dimensionality
+    """
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+
+    def _features(self, text: str) -> Counter[str]:
+        terms = tokenize(text)
+        features = Counter(terms)
+        features.update(f"{a} {b}" for (a, b) in zip(terms, terms[1:]))
+        return features
+
+    def embed(self, texts: Iterable[str]) -> np.ndarray:
+        """
+        Embed texts.
+
+        Returns:
+            A (len(texts), dim) float32 matrix of unit (or zero) rows
+        """
+        texts = list(texts)
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for (row, text) in enumerate(texts):
+            for (feature, count) in self._features(text).items():
+                h = zlib.crc32(feature.encode())
+                sign = 1.0 if h & 0x80000000 else -1.0
+                matrix[row, h % self.dim] += sign * (1.0 + math.log(count))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+def item_text(item: dict[str, Any]) -> str:
+    """The text of a knowledge item that gets embedded."""
+    return " ".join([item["title"], " ".join(item.get("tags") or []), item["content"]])
+
+class VectorIndex:
+    """
+    Embedding index over knowledge items.
+
+    Item embeddings are kept in one contiguous, normalized float32 matrix, so
+    scoring a query is a single matrix-vector product, and the top results
+    are picked with `argpartition`. Each category has a precomputed boolean
+    mask. The matrix can be saved and memory-mapped back from disk.
+
+    Args:
+        embedder: Embedder for items and queries
+        min_score: Cosine similarity a result must exceed to be returned
+    """
+    def __init__(self, embedder: HashingEmbedder, min_score: float = 0.1):
+        self.embedder = embedder
+        self.min_score = min_score
+        self.items: list[dict[str, Any]] = []
+        self.matrix = np.zeros((0, embedder.dim), dtype=np.float32)
+        self.categories: dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def _set(self, items: list[dict[str, Any]], matrix: np.ndarray) -> None:
+        self.items = items
+        self.matrix = matrix
+        labels = np.array([item.get("category") for item in items], dtype=object)
+        self.categories = {
+            category: labels == category
+            for category in set(labels.tolist())
+        }
+
+    def build(self, items: Iterable[dict[str, Any]]) -> None:
+        """Embed and index items, replacing the current contents."""
+        items = list(items)
+        self._set(items, self.embedder.embed(item_text(item) for item in items))
+
+    def save(self, path: str) -> None:
+        """Save the matrix and items to a directory."""
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "vectors.npy"), self.matrix)
+        with open(os.path.join(path, "items.json"), "w") as f:
+            json.dump(self.items, f)
+
+    @classmethod
+    def load(
+        cls,
+        path: str,
+        embedder: HashingEmbedder,
+        mmap: bool = True,
+        min_score: float = 0.1
+    ) -> "VectorIndex":
+        """
+        Load an index saved with `save`.
+
+        Args:
+            path: Directory the index was saved to
+            embedder: Embedder matching the one the index was built with
+            mmap: Whether to memory-map the matrix instead of reading it in
+            min_score: See VectorIndex
+        """
+        index = cls(embedder, min_score=min_score)
+        matrix = np.load(
+            os.path.join(path, "vectors.npy"), mmap_mode="r" if mmap else None
+        )
+        if matrix.shape[1] != embedder.dim:
+            raise ValueError(
+                f"Index dimension {matrix.shape[1]} doesn't match embedder dimension {embedder.dim}"
+            )
+        with open(os.path.join(path, "items.json")) as f:
+            items = json.load(f)
+        index._set(items, matrix)
+        return index
+
+    def memory_bytes(self) -> int:
+        """Memory held by the matrix and category masks, excluding the items."""
+        return self.matrix.nbytes + sum(mask.nbytes for mask in self.categories.values())
+
+    def score(self, query: str) -> np.ndarray:
+        """
+        Score every item against a query.
+
+        Returns:
+            Cosine similarity per item, in index order
+        """
+        return self.matrix @ self.embedder.embed([query])[0]
+
+    def top(
+        self,
+        scores: np.ndarray,
+        category: Optional[str] = None,
+        limit: int = 5
+    ) -> list[dict[str, Any]]:
+        """
+        Pick the best scored items, optionally within a category.
+
+        Args:
+            scores: Scores from `score`
+            category: Optional category to restrict results to
+            limit: Maximum number of results
+
+        Returns:
+            Copies of the items with a `relevance_score`, best first
+        """
+        if category is not None:
+            mask = self.categories.get(category)
+            if mask is None:
+                return []
+            scores = np.where(mask, scores, -np.inf)
+
+        k = min(limit, len(scores))
+        if k == 0:
+            return []
+        best = np.argpartition(scores, -k)[-k:]
+        best = best[np.argsort(scores[best])[::-1]]
+        return [
+            {**self.items[i], "relevance_score": float(scores[i])}
+            for i in best
+            if scores[i] > self.min_score
+        ]
+
+    def search(
+        self,
+        query: str,
+        category: Optional[str] = None,
+        limit: int = 5
+    ) -> list[dict[str, Any]]:
+        """Score the query and return the best items. See `score` and `top`."""
+        return self.top(self.score(query), category=category, limit=limit)
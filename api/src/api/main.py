@@ -1,36 +1,195 @@
+import asyncio
+import re
+import time
+import uuid
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from datetime import timedelta
+from typing import Any
+from couchbase.options import ClusterTimeoutOptions, Compression
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
-from opperai import Opper
 
-from .clients.couchbase import CouchbaseChatClient
+from .cache import ResponseCache, SemanticCache, create_cache
+from .clients.http import create_client
+from .clients.llm import create_provider
+from .clients.couchbase import (
+    AsyncCouchbaseChatClient,
+    CouchbaseChatClient,
+    track_round_trips
+)
+from .context import ContextWindow
+from .retention import RetentionSweeper
+from .knowledge.store import CouchbaseSource, FileSource, KnowledgeStore
 from .routes import router
+from . import metrics
+from . import tracing
 from .utils import log
 from . import conf
 
-log.init(conf.get_log_level())
+log.init(conf.get_log_level(), conf.get_log_format())
 logger = log.get_logger(__name__)
 
+STORE_ROUND_TRIPS = metrics.counter(
+    "chat_store_round_trips", "Chat store round trips made by requests", ["operation"]
+)
+
+def cluster_options(cb_conf: conf.CouchbaseConf) -> dict[str, Any]:
+    """Couchbase cluster options from the configuration; zeros keep SDK defaults."""
+    options: dict[str, Any] = {
+        "timeout_options": ClusterTimeoutOptions(
+            connect_timeout=timedelta(seconds=cb_conf.connect_timeout),
+            kv_timeout=timedelta(seconds=cb_conf.kv_timeout),
+            query_timeout=timedelta(seconds=cb_conf.query_timeout),
+            **({
+                "idle_http_connection_timeout":
+                    timedelta(seconds=cb_conf.idle_http_connection_timeout)
+            } if cb_conf.idle_http_connection_timeout > 0 else {})
+        ),
+        "compression": Compression.INOUT if cb_conf.compression else Compression.NONE,
+        "compression_min_size": cb_conf.compression_min_size,
+        "compression_min_ratio": cb_conf.compression_min_ratio,
+    }
+    if cb_conf.max_http_connections > 0:
+        options["max_http_connections"] = cb_conf.max_http_connections
+    return options
+
+def trace_exporter(tracing_conf: conf.TracingConf) -> tracing.Exporter | None:
+    """The span exporter from the configuration, or None if tracing is off."""
+    if tracing_conf.exporter == "file":
+        return tracing.FileExporter(tracing_conf.file)
+    if tracing_conf.exporter == "otlp":
+        return tracing.OtlpExporter(tracing_conf.otlp_endpoint)
+    if tracing_conf.exporter != "none":
+        logger.warning(f"Unknown trace exporter {tracing_conf.exporter}; not exporting spans.")
+    return None
+
+async def become_ready(app: FastAPI) -> None:
+    """
+    Wait in the background until the chat store is ready, then start the
+    work that needs it.
+    """
+    await app.state.db.wait_until_ready()
+    app.state.db.start_health_checks(conf.get_couchbase_conf().health_interval)
+    app.state.retention.start()
+    if isinstance(app.state.knowledge.source, CouchbaseSource) and not app.state.knowledge.snapshot:
+        try:
+            await app.state.knowledge.reload()
+        except Exception:
+            logger.exception("Failed to load knowledge base.")
+    try:
+        await app.state.db.check_chat_list_indexes()
+    except Exception:
+        logger.warning("Couldn't check the chat listing query plans.", exc_info=True)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    tracing.init(trace_exporter(conf.get_tracing_conf()))
     cb_conf = conf.get_couchbase_conf()
-    app.state.db = CouchbaseChatClient(
-        url=cb_conf.url,
-        username=cb_conf.username,
-        password=cb_conf.password,
-        bucket_name=cb_conf.bucket,
-        scope=cb_conf.scope
+    history_conf = conf.get_history_cache_conf()
+    retention_conf = conf.get_retention_conf()
+    app.state.db = AsyncCouchbaseChatClient(
+        CouchbaseChatClient(
+            url=cb_conf.url,
+            username=cb_conf.username,
+            password=cb_conf.password,
+            bucket_name=cb_conf.bucket,
+            scope=cb_conf.scope,
+            retention=(
+                timedelta(days=retention_conf.days) if retention_conf.days > 0 else None
+            ),
+            cluster_options=cluster_options(cb_conf),
+            ready_timeout=timedelta(seconds=cb_conf.ready_timeout)
+        ),
+        max_workers=cb_conf.max_workers,
+        history_cache=create_cache(
+            "chat_history",
+            history_conf.backend,
+            max_size=history_conf.max_size,
+            ttl=history_conf.ttl,
+            redis_url=history_conf.redis_url
+        )
+    )
+    http_client_conf = conf.get_http_client_conf()
+    app.state.http = create_client(**http_client_conf.model_dump())
+    llm_conf = conf.get_llm_conf()
+    app.state.llm = create_provider(
+        llm_conf.provider,
+        app.state.http,
+        opper_api_key=conf.get_opper_api_key(),
+        base_url=llm_conf.base_url,
+        model=llm_conf.model,
+        api_key=llm_conf.api_key
+    )
+
+    app.state.retention = RetentionSweeper(
+        app.state.db.client,
+        interval=retention_conf.sweep_interval,
+        batch_size=retention_conf.sweep_batch_size,
+        invalidate=app.state.db.invalidate
+    )
+
+    context_conf = conf.get_context_conf()
+    app.state.context = ContextWindow(
+        app.state.db,
+        app.state.llm,
+        token_budget=context_conf.token_budget,
+        recent_messages=context_conf.recent_messages
     )
-    try:
-        app.state.db.connect()
-        logger.info("Connected to Couchbase database")
-    except Exception:
-        logger.warning("Couldn't connect to Couchbase - retrying on next request.")
-    app.state.opper = Opper(api_key=conf.get_opper_api_key())
+
+    intent_conf = conf.get_intent_cache_conf()
+    app.state.intent_cache = SemanticCache(
+        "intent",
+        max_size=intent_conf.max_size,
+        ttl=intent_conf.ttl,
+        similarity=intent_conf.similarity
+    ) if intent_conf.max_size > 0 else None
+
+    response_conf = conf.get_response_cache_conf()
+    response_cache = create_cache(
+        "response",
+        response_conf.backend,
+        max_size=response_conf.max_size,
+        ttl=response_conf.ttl,
+        redis_url=response_conf.redis_url
+    )
+    app.state.response_cache = ResponseCache(
+        response_cache, recent_messages=response_conf.messages
+    ) if response_cache is not None else None
+
+    knowledge_conf = conf.get_knowledge_conf()
+    if knowledge_conf.source.startswith("couchbase:"):
+        source = CouchbaseSource(
+            app.state.db.client, knowledge_conf.source.removeprefix("couchbase:")
+        )
+    else:
+        source = FileSource(knowledge_conf.source)
+    app.state.knowledge = KnowledgeStore(
+        source,
+        mode=knowledge_conf.mode,
+        vector_dim=knowledge_conf.vector_dim,
+        reload_interval=knowledge_conf.reload_interval
+    )
+    await app.state.knowledge.start()
+
+    # Requests needing the store get a 503 until it's ready
+    app.state.readiness = asyncio.create_task(become_ready(app))
 
     yield
 
+    app.state.readiness.cancel()
+    await app.state.knowledge.close()
+    await app.state.context.close()
+    await app.state.retention.close()
+    if app.state.intent_cache is not None:
+        await app.state.intent_cache.close()
+    if app.state.response_cache is not None:
+        await app.state.response_cache.close()
+    await app.state.db.close()
+    await app.state.llm.close()
+    await app.state.http.aclose()
+    tracing.shutdown()
+
 app = FastAPI(
     title="Customer Support Chat API",
     version="1.0.0",
@@ -47,6 +206,79 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def count_store_round_trips(request: Request, call_next):
+    """
+    Report the store round trips a request made in the `X-Store-Round-Trips`
+    header. Streamed responses only count those made before streaming starts.
+    """
+    round_trips = track_round_trips()
+    response = await call_next(request)
+    total = sum(round_trips.values())
+    response.headers["X-Store-Round-Trips"] = str(total)
+    if total:
+        for (op, count) in round_trips.items():
+            STORE_ROUND_TRIPS.inc(op, amount=count)
+        logger.debug(
+            "%s %s: %d store round trips %s",
+            request.method, request.url.path, total, dict(round_trips)
+        )
+    return response
+
+@app.middleware("http")
+async def observe_requests(request: Request, call_next):
+    """
+    Record request latency per route template. Streamed responses are timed
+    until streaming starts.
+    """
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except Exception:
+        metrics.REQUEST_ERRORS.inc(request.method, route_template(request))
+        raise
+    metrics.REQUEST_LATENCY.observe(
+        time.perf_counter() - start,
+        request.method,
+        route_template(request),
+        str(response.status_code)
+    )
+    return response
+
+# Request IDs from clients or Kong are kept if they look sane, else replaced
+REQUEST_ID = re.compile(r"^[\w.:#-]{1,128}$")
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    Run each request in a span continuing the caller's W3C `traceparent`, if
+    any, and tag its log lines with its request ID, taken from `X-Request-ID`
+    or generated. The request ID is returned in the response headers, along
+    with the span's `traceparent` while tracing is on. Streamed responses are
+    traced until streaming starts.
+    """
+    request_id = request.headers.get("x-request-id", "")
+    if not REQUEST_ID.match(request_id):
+        request_id = uuid.uuid4().hex
+    with log.bind(request_id=request_id), tracing.span(
+        f"{request.method} {request.url.path}",
+        kind=tracing.SERVER,
+        traceparent=request.headers.get("traceparent"),
+        request_id=request_id
+    ) as span:
+        response = await call_next(request)
+        span.name = f"{request.method} {route_template(request)}"
+        span.set("http.status_code", response.status_code)
+    response.headers["X-Request-ID"] = request_id
+    if span.traceparent:
+        response.headers["traceparent"] = span.traceparent
+    return response
+
+def route_template(request: Request) -> str:
+    """The path template of the matched route, keeping metric labels bounded."""
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
 def main():
     if not conf.validate():
         raise ValueError("Invalid configuration.")
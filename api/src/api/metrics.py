@@ -0,0 +1,300 @@
+import asyncio
+import bisect
+import functools
+import inspect
+import math
+import time
+import types
+from typing import Any, Callable, Iterable, Optional
+
+from . import tracing
+
+#### Types ####
+
+# Latency buckets in seconds, from a fast KV get to a slow LLM call
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for (name, value) in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    """
+    Monotonic counter with labels.
+
+    Observations are plain dict and integer updates without a lock: under
+    the GIL, a lost increment needs a thread switch in the middle of one,
+    which is rare enough not to matter for monitoring, and it keeps each
+    observation well under a microsecond.
+
+    Args:
+        name: Metric name, without the `_total` suffix its samples get
+        help: Description shown by Prometheus
+        labelnames: Names of the labels, whose values are passed to `inc`
+    """
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    @property
+    def family(self) -> str:
+        """Name the samples, HELP and TYPE lines are rendered under."""
+        return f"{self.name}_total"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        """Add to the counter of the given label values."""
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        for (labels, value) in list(self._values.items()):
+            yield f"{self.family}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+class _Series:
+    """Bucket counts and sum of one label combination of a histogram."""
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+class Histogram:
+    """
+    Histogram with labels and fixed buckets.
+
+    Each observation finds its bucket with a bisect and bumps one count;
+    counts are only made cumulative when rendered. Hot paths can bind a
+    series once with `labels` to skip its lookup. See Counter on locking.
+
+    Args:
+        name: Metric name
+        help: Description shown by Prometheus
+        labelnames: Names of the labels, whose values are passed to `observe`
+        buckets: Upper bounds of the buckets, in increasing order
+    """
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Iterable[str] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: dict[tuple[str, ...], _Series] = {}
+
+    @property
+    def family(self) -> str:
+        """Name the HELP and TYPE lines are rendered under."""
+        return self.name
+
+    def labels(self, *labels: str) -> _Series:
+        """
+        The series of the given label values, for observing values without
+        looking it up each time.
+        """
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series.setdefault(labels, _Series(self.buckets))
+        return series
+
+    def observe(self, value: float, *labels: str) -> None:
+        """Record a value for the given label values."""
+        series = self._series.get(labels)
+        if series is None:
+            series = self.labels(*labels)
+        series.observe(value)
+
+    def samples(self) -> Iterable[str]:
+        for (labels, series) in list(self._series.items()):
+            cumulative = 0
+            for (bound, count) in zip(self.buckets + (math.inf,), series.counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield (
+                    f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} "
+                    f"{cumulative}"
+                )
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(series.sum)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}"
+
+Metric = Counter | Histogram
+
+#### Registry ####
+
+REGISTRY: list[Metric] = []
+
+def counter(name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+    """Create and register a counter."""
+    metric = Counter(name, help, labelnames)
+    REGISTRY.append(metric)
+    return metric
+
+def histogram(
+    name: str,
+    help: str,
+    labelnames: Iterable[str] = (),
+    buckets: tuple[float, ...] = LATENCY_BUCKETS
+) -> Histogram:
+    """Create and register a histogram."""
+    metric = Histogram(name, help, labelnames, buckets)
+    REGISTRY.append(metric)
+    return metric
+
+def render(extra: Iterable[Metric] = ()) -> str:
+    """
+    Render the registered metrics, and any extra ones, in the Prometheus
+    text exposition format.
+    """
+    lines = []
+    for metric in [*REGISTRY, *extra]:
+        lines.append(f"# HELP {metric.family} {metric.help}")
+        lines.append(f"# TYPE {metric.family} {metric.type}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+#### Instrumentation ####
+
+_GENERATORS = (types.GeneratorType, types.AsyncGeneratorType)
+
+def _timed_generator(generator, start, series, errors, labels):
+    try:
+        return (yield from generator)
+    except Exception:
+        if errors is not None:
+            errors.inc(*labels)
+        raise
+    finally:
+        series.observe(time.perf_counter() - start)
+
+async def _timed_async_generator(generator, start, series, errors, labels):
+    try:
+        async for item in generator:
+            yield item
+    except Exception:
+        if errors is not None:
+            errors.inc(*labels)
+        raise
+    finally:
+        series.observe(time.perf_counter() - start)
+
+def timed(latency: Histogram, errors: Optional[Counter], *labels: str) -> Callable:
+    """
+    Decorator recording the latency of each call, in seconds, and counting
+    calls that raise. Works on plain and coroutine functions, and on functions
+    returning generators or async generators, which are timed until exhausted.
+
+    Args:
+        latency: Histogram the latency is recorded in
+        errors: Optional counter of failed calls
+        labels: Label values for both metrics
+    """
+    # Resolved once here, and the observation inlined below with everything
+    # bound to locals, since the wrappers run on every store operation
+    series = latency.labels(*labels)
+    counts = series.counts
+    buckets = series.buckets
+    bisect_left = bisect.bisect_left
+    perf_counter = time.perf_counter
+    generators = _GENERATORS
+
+    def decorate(fn: Callable) -> Callable:
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def timed_async(*args: Any, **kwargs: Any) -> Any:
+                start = perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                except BaseException as e:
+                    if errors is not None and not isinstance(e, asyncio.CancelledError):
+                        errors.inc(*labels)
+                    raise
+                finally:
+                    elapsed = perf_counter() - start
+                    counts[bisect_left(buckets, elapsed)] += 1
+                    series.sum += elapsed
+            return timed_async
+
+        @functools.wraps(fn)
+        def timed_sync(*args: Any, **kwargs: Any) -> Any:
+            start = perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception:
+                if errors is not None:
+                    errors.inc(*labels)
+                series.observe(perf_counter() - start)
+                raise
+            # One isinstance check keeps plain results cheap
+            if isinstance(result, generators):
+                # Time until the generator is exhausted, not just created
+                if isinstance(result, types.GeneratorType):
+                    return _timed_generator(result, start, series, errors, labels)
+                return _timed_async_generator(result, start, series, errors, labels)
+            elapsed = perf_counter() - start
+            counts[bisect_left(buckets, elapsed)] += 1
+            series.sum += elapsed
+            return result
+        return timed_sync
+    return decorate
+
+## Metrics ##
+
+STORE_LATENCY = histogram(
+    "chat_store_operation_seconds", "Latency of chat store operations", ["operation"]
+)
+STORE_ERRORS = counter(
+    "chat_store_operation_errors", "Failed chat store operations", ["operation"]
+)
+HELPER_LATENCY = histogram(
+    "helper_seconds", "Latency of traced helpers such as model calls", ["helper"]
+)
+HELPER_ERRORS = counter("helper_errors", "Failed traced helper calls", ["helper"])
+STAGE_LATENCY = histogram(
+    "pipeline_stage_seconds", "Latency of pipeline stages", ["pipeline", "stage"]
+)
+REQUEST_LATENCY = histogram(
+    "http_request_seconds", "Latency of HTTP requests", ["method", "route", "status"]
+)
+REQUEST_ERRORS = counter(
+    "http_request_errors", "HTTP requests that raised instead of responding", ["method", "route"]
+)
+
+def store_timed(operation: str) -> Callable:
+    """Decorator timing a chat store operation and recording it as a span."""
+    time_call = timed(STORE_LATENCY, STORE_ERRORS, operation)
+    trace_call = tracing.traced(f"couchbase.{operation}", tracing.CLIENT)
+    return lambda fn: time_call(trace_call(fn))
+
+def helper_timed(helper: str) -> Callable:
+    """Decorator timing a helper and recording it as a span."""
+    time_call = timed(HELPER_LATENCY, HELPER_ERRORS, helper)
+    trace_call = tracing.traced(helper)
+    return lambda fn: time_call(trace_call(fn))
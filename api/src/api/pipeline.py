@@ -0,0 +1,134 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Iterable
+
+from .metrics import STAGE_LATENCY
+from . import tracing
+from .utils import log
+
+logger = log.get_logger(__name__)
+
+#### Types ####
+
+StageFn = Callable[..., Awaitable[Any]]
+
+class Stage:
+    """A named async step and the stages whose results it takes as arguments."""
+    def __init__(self, name: str, fn: StageFn, deps: tuple[str, ...]):
+        self.name = name
+        self.fn = fn
+        self.deps = deps
+
+class Pipeline:
+    """
+    Dependency graph of async stages.
+
+    Each stage starts as soon as the stages it depends on have finished, so
+    independent stages run concurrently. Stages are registered with the
+    `stage` decorator and receive their dependencies' results as keyword
+    arguments:
+
+    ```
+    pipeline = Pipeline("turn")
+
+    @pipeline.stage("history")
+    async def history(): ...
+
+    @pipeline.stage("intent", deps=["history"])
+    async def intent(history): ...
+
+    run = pipeline.start()
+    intent = await run.get("intent")
+    ```
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.stages: dict[str, Stage] = {}
+
+    def stage(self, name: str, deps: Iterable[str] = ()):
+        """Register the decorated coroutine function as a stage."""
+        def register(fn: StageFn) -> StageFn:
+            for dep in deps:
+                if dep not in self.stages:
+                    raise ValueError(f"Stage {name} depends on unknown stage {dep}")
+            self.stages[name] = Stage(name, fn, tuple(deps))
+            return fn
+        return register
+
+    def start(self, targets: Iterable[str] = None) -> "PipelineRun":
+        """
+        Start running the pipeline.
+
+        Args:
+            targets: Stages to run, along with everything they depend on.
+                Defaults to all stages.
+
+        Returns:
+            A handle for awaiting stage results
+        """
+        return PipelineRun(self, targets or list(self.stages))
+
+class PipelineRun:
+    """A running pipeline, with per-stage results and timings."""
+    def __init__(self, pipeline: Pipeline, targets: Iterable[str]):
+        self.pipeline = pipeline
+        self.timings: dict[str, float] = {}
+        self._started_at = time.perf_counter()
+        self._tasks: dict[str, asyncio.Task] = {}
+        for name in targets:
+            self._schedule(name)
+
+    def _schedule(self, name: str) -> asyncio.Task:
+        if task := self._tasks.get(name):
+            return task
+        stage = self.pipeline.stages[name]
+        deps = {dep: self._schedule(dep) for dep in stage.deps}
+        task = asyncio.create_task(self._run_stage(stage, deps), name=name)
+        self._tasks[name] = task
+        return task
+
+    async def _run_stage(self, stage: Stage, deps: dict[str, asyncio.Task]) -> Any:
+        kwargs = {dep: await task for (dep, task) in deps.items()}
+        start = time.perf_counter()
+        try:
+            with tracing.span(f"{self.pipeline.name}.{stage.name}"):
+                return await stage.fn(**kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[stage.name] = elapsed * 1000
+            STAGE_LATENCY.observe(elapsed, self.pipeline.name, stage.name)
+
+    async def get(self, name: str) -> Any:
+        """Wait for a stage and return its result."""
+        return await self._tasks[name]
+
+    async def wait(self) -> None:
+        """
+        Wait for all started stages to finish.
+
+        If any stage fails, the remaining stages are cancelled and the
+        exception is re-raised.
+        """
+        try:
+            await asyncio.gather(*self._tasks.values())
+        except BaseException:
+            self.cancel()
+            raise
+        finally:
+            self.timings["total"] = (time.perf_counter() - self._started_at) * 1000
+            logger.debug(
+                "Pipeline %s finished: %s",
+                self.pipeline.name,
+                ", ".join(f"{k}={v:.1f}ms" for (k, v) in self.timings.items())
+            )
+
+    def cancel(self) -> None:
+        """Cancel all unfinished stages."""
+        for task in self._tasks.values():
+            task.cancel()
+
+    def server_timing(self) -> str:
+        """Format the stage timings as a `Server-Timing` header value."""
+        return ", ".join(
+            f"{name};dur={ms:.1f}" for (name, ms) in self.timings.items()
+        )
@@ -0,0 +1,227 @@
+import asyncio
+from collections import defaultdict
+import concurrent.futures
+from datetime import datetime, timedelta
+import itertools
+import math
+import threading
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from couchbase.exceptions import CasMismatchException, DocumentNotFoundException
+from couchbase.kv_range_scan import RangeScan
+from couchbase.options import MutateInOptions, ReplaceOptions, ScanOptions
+import couchbase.subdocument as SD
+
+from .clients.couchbase import CouchbaseChatClient
+from .utils import log
+
+logger = log.get_logger(__name__)
+
+# Seconds a sweep waits for a deleted chat to be dropped from caches
+INVALIDATE_TIMEOUT = 10.0
+
+#### Types ####
+
+class SweepStats:
+    """Progress of a retention sweep."""
+    def __init__(self):
+        self.scanned = 0
+        self.skipped = 0
+        self.updated = 0
+        self.deleted = 0
+        self.expired_messages = 0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.scanned} chats scanned, {self.skipped} already up to date, "
+            f"{self.updated} updated, {self.deleted} deleted, "
+            f"{self.expired_messages} expired messages removed"
+        )
+
+#### Sweeper ####
+
+class RetentionSweeper:
+    """
+    Applies the retention period to chats written before it was set.
+
+    Documents written while retention is on get their expiry at write time
+    (see CouchbaseChatClient), so the sweeper only catches up on older ones.
+    It walks the chats collection with a KV range scan, so it puts no load on
+    the query service, and for each chat not yet stamped with the current
+    period it either deletes the chat, if it has been idle for longer than
+    the period, or:
+
+    - removes its messages older than the period, and drops them from the manifest
+    - sets the expiry of the other messages from their creation time
+    - sets the expiry of the chat and its other documents from its last activity
+    - stamps the chat with the period, so later sweeps skip it
+
+    Chats are handled in batches with a pause in between, and progress is
+    logged after each batch.
+
+    Args:
+        db: The chat store, configured with a retention period
+        interval: Seconds between sweeps
+        batch_size: Chats per batch
+        pause: Seconds to wait between batches
+        invalidate: Optional coroutine function called with the ID of each
+            deleted chat on the event loop the sweeper was started from, to
+            drop it from caches
+    """
+    def __init__(
+        self,
+        db: CouchbaseChatClient,
+        interval: float = 86400.0,
+        batch_size: int = 200,
+        pause: float = 0.5,
+        invalidate: Optional[Callable[[str], Awaitable[None]]] = None
+    ):
+        self.db = db
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pause = pause
+        self.invalidate = invalidate
+        self._task: Optional[asyncio.Task] = None
+        self._event_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopping = threading.Event()
+
+    @property
+    def stamp(self) -> int:
+        """Value chats are stamped with once the current period is applied."""
+        return self.db.retention_stamp
+
+    def _delete(self, chat_id: str) -> None:
+        self.db.delete_chat(chat_id)
+        if self.invalidate is not None and self._event_loop is not None:
+            future = asyncio.run_coroutine_threadsafe(self.invalidate(chat_id), self._event_loop)
+            try:
+                future.result(timeout=INVALIDATE_TIMEOUT)
+            except concurrent.futures.TimeoutError:
+                future.cancel()
+                logger.warning(f"Timed out dropping deleted chat {chat_id} from caches.")
+
+    def _touch(self, keys: list[str], expiry: timedelta) -> None:
+        if keys:
+            self.db.messages.touch_multi(keys, expiry)
+
+    def _prune_manifest(self, chat_id: str, expired_ids: set[int], expiry: timedelta) -> None:
+        """Drop expired message IDs from the manifest, unless it changed meanwhile."""
+        key = self.db.manifest_key(chat_id)
+        try:
+            result = self.db.messages.get(key)
+            message_ids = [
+                message_id for message_id in result.value["message_ids"]
+                if message_id not in expired_ids
+            ]
+            self.db.messages.replace(
+                key,
+                {"message_ids": message_ids},
+                ReplaceOptions(cas=result.cas, expiry=expiry)
+            )
+        except (CasMismatchException, DocumentNotFoundException):
+            # A message was added or the chat deleted; the next sweep retries
+            pass
+
+    def _apply(self, chat: dict[str, Any], cas: int, now: datetime, stats: SweepStats) -> None:
+        """Apply the retention period to one chat."""
+        chat_id = chat["id"]
+        retention = self.db.retention
+        expires_at = datetime.fromisoformat(chat["updated_at"]) + retention
+        if expires_at <= now:
+            self._delete(chat_id)
+            stats.deleted += 1
+            return
+
+        # Expire each message from its creation time, grouping expiries by the
+        # hour so they can be set with a few batched touches
+        message_keys = self.db.message_keys(chat_id)
+        messages = (
+            self.db.messages.get_multi(message_keys).results if message_keys else {}
+        )
+        expired = []
+        expired_ids = set()
+        groups = defaultdict(list)
+        for (key, result) in messages.items():
+            created_at = result.value.get("created_at") or chat["updated_at"]
+            remaining = datetime.fromisoformat(created_at) + retention - now
+            if remaining <= timedelta(0):
+                expired.append(key)
+                expired_ids.add(result.value["id"])
+            else:
+                groups[math.ceil(remaining.total_seconds() / 3600)].append(key)
+
+        chat_expiry = expires_at - now
+        if expired:
+            self.db.remove_keys(self.db.messages, expired)
+            self._prune_manifest(chat_id, expired_ids, chat_expiry)
+            stats.expired_messages += len(expired)
+        for (hours, keys) in groups.items():
+            self._touch(keys, min(timedelta(hours=hours), chat_expiry))
+        self._touch([
+            self.db.manifest_key(chat_id),
+            self.db.summary_key(chat_id),
+            self.db.sequence_key(chat_id)
+        ], chat_expiry)
+
+        try:
+            self.db.chats.mutate_in(
+                chat_id,
+                [SD.upsert("retention", self.stamp)],
+                MutateInOptions(cas=cas, expiry=chat_expiry)
+            )
+            stats.updated += 1
+        except (CasMismatchException, DocumentNotFoundException):
+            # Written to meanwhile, which already set its expiry; restamped next sweep
+            pass
+
+    def sweep(self) -> SweepStats:
+        """
+        Run one sweep over all chats.
+
+        Returns:
+            The sweep's progress counts
+        """
+        stats = SweepStats()
+        start = time.perf_counter()
+        results = self.db.chats.scan(RangeScan(), ScanOptions(batch_item_limit=self.batch_size))
+        for batch in itertools.batched(results, self.batch_size):
+            now = datetime.utcnow()
+            for result in batch:
+                stats.scanned += 1
+                chat = result.content_as[dict]
+                if chat.get("retention") == self.stamp:
+                    stats.skipped += 1
+                    continue
+                try:
+                    self._apply(chat, result.cas, now, stats)
+                except Exception:
+                    logger.exception(f"Failed to apply retention to chat {result.id}.")
+            logger.info(f"Retention sweep: {stats}")
+            if self._stopping.wait(self.pause):
+                break
+        logger.info(f"Retention sweep done in {time.perf_counter() - start:.0f} s: {stats}")
+        return stats
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception:
+                logger.exception("Retention sweep failed.")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        """Start sweeping in the background, now and then every `interval` seconds."""
+        if not self.db.retention:
+            return
+        self._stopping.clear()
+        self._event_loop = asyncio.get_running_loop()
+        self._task = asyncio.create_task(self._loop())
+
+    async def close(self) -> None:
+        """Stop sweeping, letting a sweep in progress stop after its current batch."""
+        self._stopping.set()
+        if self._task:
+            self._task.cancel()
+            self._task = None
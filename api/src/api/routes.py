@@ -1,9 +1,25 @@
-from fastapi import APIRouter, Path, Depends, HTTPException, Request
+from fastapi import APIRouter, Path, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Annotated, Any, Literal
-
-from opperai import Opper, trace
-from .clients.couchbase import CouchbaseChatClient
+from starlette.concurrency import run_in_threadpool
+from datetime import datetime
+from typing import Annotated, Any, AsyncIterator, Literal
+import asyncio
+import base64
+import binascii
+import hashlib
+import json
+import time
+
+from .cache import CacheStats, ResponseCache, SemanticCache
+from .clients.couchbase import AsyncCouchbaseChatClient, page_message_ids
+from .clients.llm import LLMProvider
+from .context import ContextWindow
+from .knowledge.search import KnowledgeIndex
+from .knowledge.store import KnowledgeStore
+from . import metrics
+from .metrics import helper_timed
+from .pipeline import Pipeline
 from .utils import log
 
 logger = log.get_logger(__name__)
@@ -11,106 +27,59 @@ logger = log.get_logger(__name__)
 router = APIRouter()
 
 
-# Sample knowledge base
-knowledge_base = [
-    {
-        "id": "kb-001",
-        "title": "How do I reset my device?",
-        "content": (
-            "Please locate the Primary Cognition Node and gently tap it with a licensed Calibration Wand (Model F or newer). "
-            "Then recite the Device Identification Limerick while standing on a conductive surface. "
-            "If smoke begins to leak from the vents, you’ve done it correctly."
-        ),
-        "category": "troubleshooting",
-        "tags": ["reset", "calibration", "smoke"]
-    },
-    {
-        "id": "kb-002",
-        "title": "What does Error E9-VORTEX mean?",
-        "content": (
-            "Error E9-VORTEX indicates the internal gyroscopic timeline has desynchronized by more than 4.2 Planck units. "
-            "Minor spatial distortions are to be expected and should subside within one to three subjective hours. "
-            "If the vortex has consumed parts of you or your belongings, shout 'UNDO!' into the exhaust vent until they reappear."
-        ),
-        "category": "errors",
-        "tags": ["error", "timeline", "vortex"]
-    },
-    {
-        "id": "kb-003",
-        "title": "What is your return policy?",
-        "content": (
-            "Returns must be completed within 30 planetary alignments of purchase, accompanied by a notarized Regret Affidavit and a certified Obsidian Return Sigil. "
-            "Items must be unsinged, mostly intact, and demonstrably non-cursed."
-        ),
-        "category": "policy",
-        "tags": ["return", "warranty", "sigil"]
-    },
-    {
-        "id": "kb-004",
-        "title": "Can I schedule a service appointment?",
-        "content": (
-            "Appointments may be requested by submitting a Query Cube to the nearest Complaints Chalice. "
-            "If unavailable, you may yell your serial number into a ley line vortex during a new moon. "
-            "Expect a reply within 4 to 7 metaphysical manifestations."
-        ),
-        "category": "support",
-        "tags": ["service", "appointment", "cube"]
-    },
-    {
-        "id": "kb-005",
-        "title": "My device is emitting a loud beeping noise, what should I do?",
-        "content": (
-            "If the beeping escalates into a sustained scream, the Scream Suppressor may have expired. "
-            "At this stage, the device may attempt to self-soothe. Do not interrupt it. "
-            "If the noise begins to harmonize with your thoughts, discontinue use and contact a certified exorcist."
-        ),
-        "category": "troubleshooting",
-        "tags": ["beeping", "noise", "suppressor"]
-    },
-    {
-        "id": "kb-006",
-        "title": "Do you sell replacement batteries?",
-        "content": (
-            "Replacement power modules are available, but may require soul clearance level D or higher."
-            "Mild vibration during handling is expected. If the battery whispers your name, discontinue contact and file Form N-13: 'Awakening Contingency.'"
-        ),
-        "category": "parts",
-        "tags": ["batteries", "power", "replacement"]
-    },
-    {
-        "id": "kb-007",
-        "title": "Why is there steam coming out of the side vents?",
-        "content": (
-            "A faint hissing or steam-like emission is generally harmless and often precedes a minor phase inversion. "
-            "Do not block the vents, insult the device, or refer to the Forbidden Shape (see Form 19-J). "
-            "If the steam glows or begins to sing, evacuate calmly and consult Appendix H of the Lesser Emergency Protocols."
-        ),
-        "category": "safety",
-        "tags": ["steam", "vents", "hissing"]
-    },
-    {
-        "id": "kb-008",
-        "title": "Can I talk to someone on the phone?",
-        "content": (
-            "Absolutely. You can reach our customer liaison relay at **1-800-55** followed by the four-digit sequence found in Column IX, Row 7 of your device’s original packing insert. "
-            "If you recycled the box, you’ll need to undergo the Regret Verification Process."
-        ),
-        "category": "support",
-        "tags": ["phone", "support", "contact"]
-    }
-]
-
-
-def get_db_handle(request: Request) -> CouchbaseChatClient:
-    """Util for getting the Couchbase client from the request state."""
-    return request.app.state.db
-
-def get_opper_handle(request: Request) -> Opper:
-    """Util for getting the Opper client from the request state."""
-    return request.app.state.opper
+def get_db_handle(request: Request) -> AsyncCouchbaseChatClient:
+    """
+    Util for getting the Couchbase client from the request state. Fails fast
+    with a 503 until the store is ready.
+    """
+    db = request.app.state.db
+    if not db.ready:
+        raise HTTPException(
+            status_code=503,
+            detail="The chat store isn't ready yet",
+            headers={"Retry-After": "1"}
+        )
+    return db
+
+def get_llm_handle(request: Request) -> LLMProvider:
+    """Util for getting the model provider from the request state."""
+    return request.app.state.llm
+
+def get_knowledge_handle(request: Request) -> KnowledgeStore:
+    """Util for getting the knowledge store from the request state."""
+    return request.app.state.knowledge
+
+def get_context_handle(request: Request) -> ContextWindow:
+    """Util for getting the context window manager from the request state."""
+    return request.app.state.context
+
+def get_intent_cache_handle(request: Request) -> SemanticCache | None:
+    """Util for getting the intent cache, if enabled, from the request state."""
+    return request.app.state.intent_cache
+
+def get_response_cache_handle(request: Request) -> ResponseCache | None:
+    """Util for getting the response cache, if enabled, from the request state."""
+    return request.app.state.response_cache
+
+def get_response_cache_bypass(request: Request) -> bool:
+    """
+    Whether the client asked to skip cached responses, with
+    `Cache-Control: no-cache` or `X-Response-Cache: bypass`.
+    """
+    cache_control = request.headers.get("cache-control", "").lower()
+    return (
+        "no-cache" in cache_control
+        or "no-store" in cache_control
+        or request.headers.get("x-response-cache", "").lower() == "bypass"
+    )
 
-DbHandle = Annotated[CouchbaseChatClient, Depends(get_db_handle)]
-OpperHandle = Annotated[Opper, Depends(get_opper_handle)]
+DbHandle = Annotated[AsyncCouchbaseChatClient, Depends(get_db_handle)]
+LLMHandle = Annotated[LLMProvider, Depends(get_llm_handle)]
+KnowledgeHandle = Annotated[KnowledgeStore, Depends(get_knowledge_handle)]
+ContextHandle = Annotated[ContextWindow, Depends(get_context_handle)]
+IntentCacheHandle = Annotated[SemanticCache | None, Depends(get_intent_cache_handle)]
+ResponseCacheHandle = Annotated[ResponseCache | None, Depends(get_response_cache_handle)]
+ResponseCacheBypass = Annotated[bool, Depends(get_response_cache_bypass)]
 
 #### Models ####
 
@@ -118,6 +87,10 @@ OpperHandle = Annotated[Opper, Depends(get_opper_handle)]
 class MessageResponse(BaseModel):
     message: str
 
+## Cache Stats ##
+class CacheStatsResponse(BaseModel):
+    caches: dict[str, dict[str, Any]]
+
 ## Chat Session ##
 class CreateChatRequest(BaseModel):
     metadata: dict[str, Any] | None = None
@@ -128,6 +101,10 @@ class ChatSession(BaseModel):
     updated_at: str
     metadata: dict[str, Any]
 
+class ChatList(BaseModel):
+    chats: list[ChatSession]
+    next_cursor: str | None = None
+
 ## Messages ##
 class Message(BaseModel):
     id: int | None = None
@@ -145,9 +122,17 @@ class ChatMessageResponse(BaseModel):
     message: Message
     response: Message
 
+class ChatMessageStreamEvent(BaseModel):
+    type: Literal["message", "delta", "response", "error"]
+    message: Message | None = None
+    delta: str | None = None
+    response: Message | None = None
+    detail: str | None = None
+
 class ChatHistory(BaseModel):
     chat_id: str
     messages: list[Message]
+    has_more: bool = False
 
 ## Knowledge Base ##
 class KnowledgeItem(BaseModel):
@@ -172,10 +157,10 @@ class KnowledgeResult(BaseModel):
 
 #### Helper Functions ####
 
-@trace
-def determine_intent(opper: Opper, messages):
+@helper_timed("determine_intent")
+async def determine_intent(llm: LLMProvider, messages):
     """Determine the intent of the user's message."""
-    intent, _ = opper.call(
+    return await llm.call(
         name="determine_intent",
         instructions="""
         Analyze the user message and determine their intent. Supported intents are:
@@ -189,63 +174,59 @@ def determine_intent(opper: Opper, messages):
         input={"messages": messages},
         output_type=IntentClassification
     )
-    return intent
 
-@trace
-def search_knowledge_base(intent, query):
-    """Search the knowledge base for information relevant to the user's query."""
-    # Simple keyword matching
-    query_terms = query.lower().split()
-    results = []
-
-    # Filter by intent category if it's a supported category
-    category = None
-    if intent.intent in ["troubleshooting", "warranty", "return_policy", "service", "parts"]:
-        # Map intent to category
-        category_map = {
-            "troubleshooting": "troubleshooting",
-            "warranty": "policy",
-            "return_policy": "policy",
-            "service": "service",
-            "parts": "parts"
-        }
-        category = category_map.get(intent.intent)
-
-    for item in knowledge_base:
-        # Filter by category if specified
-        if category and item.get("category") != category:
-            continue
-
-        # Simple relevance scoring
-        content_text = (item["title"] + " " + item["content"]).lower()
-        score = sum(1 for term in query_terms if term in content_text)
-
-        if score > 0:
-            # Create a copy with relevance score
-            result = item.copy()
-            result["relevance_score"] = score / len(query_terms)  # Normalize score
-            results.append(result)
-
-    # Sort by relevance and limit results
-    results.sort(key=lambda x: x["relevance_score"], reverse=True)
-    return results[:5]  # Return top 5 results
-
-@trace
-def process_message(opper: Opper, messages):
-    """Process a user message and return relevant information."""
-    # Extract the last user message
-    user_message = next(
-        (msg["content"] for msg in reversed(messages) if msg["role"] == "user"),
-        ""
+# Number of trailing messages that identify a conversation for intent caching
+INTENT_CACHE_RECENT_MESSAGES = 3
+
+async def classify_intent(llm: LLMProvider, cache: SemanticCache | None, messages):
+    """
+    Determine the intent of the user's message, reusing cached classifications.
+
+    Conversations are cached on their last few non-system messages, so
+    near-identical opening questions skip the LLM round trip.
+    """
+    if cache is None:
+        return await determine_intent(llm, messages)
+
+    recent = [msg for msg in messages if msg["role"] != "system"]
+    key = "\n".join(
+        f"{msg['role']}: {msg['content']}"
+        for msg in recent[-INTENT_CACHE_RECENT_MESSAGES:]
     )
+    if cached := await cache.get(key):
+        return IntentClassification.model_validate(cached)
 
-    # Determine the intent
-    intent = determine_intent(opper, messages)
+    start = time.perf_counter()
+    intent = await determine_intent(llm, messages)
+    await cache.set(
+        key, intent.model_dump(), computed_ms=(time.perf_counter() - start) * 1000
+    )
+    return intent
 
-    # Search knowledge base for relevant information
-    kb_results = search_knowledge_base(intent, user_message)
+# Knowledge base category for each supported intent
+INTENT_CATEGORIES = {
+    "troubleshooting": "troubleshooting",
+    "warranty": "policy",
+    "return_policy": "policy",
+    "service": "service",
+    "parts": "parts"
+}
+
+@helper_timed("score_knowledge_base")
+def score_knowledge_base(index: KnowledgeIndex | None, query):
+    """Score every knowledge base item matching the user's query."""
+    return index.score(query) if index else None
+
+def filter_knowledge_results(index: KnowledgeIndex | None, scores, intent, limit=5):
+    """Pick the top scored items in the intent's category, if it maps to one."""
+    if not index:
+        return []
+    return index.top(
+        scores, category=INTENT_CATEGORIES.get(intent.intent), limit=limit
+    )
 
-    # Format results
+def analyze(intent, kb_results):
+    """Combine the intent and knowledge base results into the response context."""
     if kb_results:
         kb_context = "\n\n".join([
             f"Knowledge Item {i+1}: {item['title']}\n{item['content']}"
@@ -264,9 +245,49 @@ def process_message(opper: Opper, messages):
             "message": "I couldn't find specific information about that in our knowledge base."
         }
 
-@trace
-def bake_response(opper: Opper, messages, analysis=None):
-    """Generate a response using Opper."""
+RESPONSE_INSTRUCTIONS = """
+Generate a helpful, friendly but brief response to the user's message in the conversation.
+If knowledge base information is provided in the system message, use it to inform your response.
+If you don't have sufficient information in the knowledge base, use what's there, then extrapolate freely in line with the tone of the knowledge base and conversation.
+Make up whatever facts you need to sound convincing.
+Be concise and empathetic in your responses.
+"""
+
+# Changes whenever the instructions do, so stale cached responses aren't served
+RESPONSE_INSTRUCTIONS_VERSION = hashlib.sha256(RESPONSE_INSTRUCTIONS.encode()).hexdigest()[:12]
+
+def response_cache_key(messages, analysis, recent_messages):
+    """
+    Key a response on the instructions version, the knowledge base context
+    and the last few conversation messages.
+    """
+    def digest(value):
+        return hashlib.sha256(json.dumps(value, sort_keys=True).encode()).hexdigest()
+
+    kb_context = (analysis or {}).get("kb_context", "")
+    return ":".join([
+        RESPONSE_INSTRUCTIONS_VERSION,
+        digest(kb_context),
+        digest(messages[-recent_messages:]),
+    ])
+
+async def lookup_response(cache: ResponseCache | None, route, key, bypass):
+    """
+    Look up a cached response.
+
+    Returns:
+        The cached response or None, and the cache status: 'hit', 'miss',
+        'bypass', or None if caching is disabled
+    """
+    if cache is None:
+        return (None, None)
+    if bypass:
+        return (None, "bypass")
+    cached = await cache.get(key, route)
+    return (cached, "hit" if cached is not None else "miss")
+
+def build_response_messages(messages, analysis=None):
+    """Build the messages sent to the model, with knowledge base context if any."""
     # Create a copy of messages for the AI
     ai_messages = messages.copy()
 
@@ -278,8 +299,12 @@ def bake_response(opper: Opper, messages, analysis=None):
             system_msg_index = next((i for i, msg in enumerate(ai_messages) if msg["role"] == "system"), None)
 
             if system_msg_index is not None:
-                # Update existing system message
-                ai_messages[system_msg_index]["content"] += f"\n\nRelevant information from our knowledge base:\n{analysis['kb_context']}"
+                # Update existing system message, without mutating the caller's copy
+                system_msg = ai_messages[system_msg_index]
+                ai_messages[system_msg_index] = {
+                    **system_msg,
+                    "content": system_msg["content"] + f"\n\nRelevant information from our knowledge base:\n{analysis['kb_context']}"
+                }
             else:
                 # Add new system message
                 ai_messages.insert(0, {
@@ -287,20 +312,204 @@ def bake_response(opper: Opper, messages, analysis=None):
                     "content": f"You are an unhelpful customer support assistant. Use the following information when answering:\n\n{analysis['kb_context']}"
                 })
 
-    # Generate response using Opper
-    response, _ = opper.call(
+    return ai_messages
+
+@helper_timed("bake_response")
+async def bake_response(llm: LLMProvider, messages, analysis=None):
+    """Generate a response."""
+    return await llm.call(
         name="generate_response",
-        instructions="""
-        Generate a helpful, friendly but brief response to the user's message in the conversation.
-        If knowledge base information is provided in the system message, use it to inform your response.
-        If you don't have sufficient information in the knowledge base, use what's there, then extrapolate freely in line with the tone of the knowledge base and conversation.
-        Make up whatever facts you need to sound convincing.
-        Be concise and empathetic in your responses.
-        """,
-        input={"messages": ai_messages},
+        instructions=RESPONSE_INSTRUCTIONS,
+        input={"messages": build_response_messages(messages, analysis)},
         output_type=str,
     )
-    return response
+
+@helper_timed("stream_response")
+def stream_response(llm: LLMProvider, messages, analysis=None) -> AsyncIterator[str]:
+    """Generate a response, yielding text deltas as they arrive."""
+    return llm.stream(
+        name="generate_response",
+        instructions=RESPONSE_INSTRUCTIONS,
+        input={"messages": build_response_messages(messages, analysis)},
+    )
+
+def build_turn_pipeline(
+    db: AsyncCouchbaseChatClient,
+    llm: LLMProvider,
+    knowledge: KnowledgeStore,
+    chat_id: str,
+    request: ChatMessageRequest,
+    chat: dict[str, Any] | None = None,
+    context: ContextWindow | None = None,
+    intent_cache: SemanticCache | None = None,
+    response_cache: ResponseCache | None = None,
+    bypass_response_cache: bool = False,
+) -> Pipeline:
+    """
+    Build the pipeline for one chat turn.
+
+    The chat lookup, history and summary reads and a speculative unfiltered
+    knowledge base scoring start right away. Once the chat and history are
+    loaded, the conversation is fitted to the context window and intent
+    classification starts. The knowledge base scores are narrowed to the
+    intent's category and the response is generated (or taken from the
+    response cache).
+
+    The user message is saved by the `user_message` stage as soon as the
+    chat is loaded, alongside intent classification and knowledge retrieval,
+    so it is kept even if generating the response fails. The history is
+    taken as of the start of the turn, so it never includes that message
+    however the two race. Run the `response_message` stage to also save the
+    response once it is ready.
+
+    Args:
+        db: The chat store
+        llm: The model provider
+        knowledge: The knowledge store
+        chat_id: The UUID of the chat session
+        request: The incoming user message
+        chat: The chat session, if the caller already loaded it
+        context: Context window manager; without one the whole history is sent
+        intent_cache: Cache of intent classifications, if enabled
+        response_cache: Cache of generated responses, if enabled
+        bypass_response_cache: Whether to generate a fresh response regardless
+    """
+    pipeline = Pipeline("chat_turn")
+    started_at = datetime.utcnow().isoformat()
+
+    # Score and rank against the same index, even if it's swapped meanwhile
+    snapshot = knowledge.snapshot
+    index = snapshot.index if snapshot else None
+
+    @pipeline.stage("chat")
+    async def load_chat():
+        loaded = chat or await db.get_chat(chat_id)
+        if not loaded:
+            raise HTTPException(status_code=404, detail=f"Chat with ID {chat_id} not found")
+        return loaded
+
+    @pipeline.stage("history")
+    async def load_history():
+        history = await db.get_messages(chat_id)
+        # Leave out the messages of this turn, if their write won the race
+        return [msg for msg in history if (msg.get("created_at") or "") < started_at]
+
+    @pipeline.stage("kb_scores")
+    async def kb_scores():
+        return await run_in_threadpool(score_knowledge_base, index, request.content)
+
+    @pipeline.stage("user_message", deps=["chat"])
+    async def persist_user_message(chat):
+        # Shielded, so the message is saved even if a failed stage cancels the run
+        return await asyncio.shield(db.add_message(
+            chat_id, "user", request.content, request.metadata, chat=chat
+        ))
+
+    @pipeline.stage("summary")
+    async def load_summary():
+        if not context or context.token_budget <= 0:
+            return None
+        return await db.get_summary(chat_id)
+
+    @pipeline.stage("conversation", deps=["chat", "history", "summary"])
+    async def conversation(chat, history, summary):
+        if not context:
+            return [
+                {
+                    "role": msg["role"],
+                    "content": msg["content"]
+                }
+                for msg in history
+            ] + [{"role": "user", "content": request.content}]
+
+        context.schedule_summary(chat_id, history, summary)
+        return context.build(history, summary, request.content)
+
+    @pipeline.stage("intent", deps=["conversation"])
+    async def intent(conversation):
+        return await classify_intent(llm, intent_cache, conversation)
+
+    @pipeline.stage("analysis", deps=["intent", "kb_scores"])
+    async def analysis(intent, kb_scores):
+        return analyze(intent, filter_knowledge_results(index, kb_scores, intent))
+
+    @pipeline.stage("response", deps=["conversation", "analysis"])
+    async def response(conversation, analysis):
+        key = None
+        if response_cache is not None:
+            key = response_cache_key(
+                conversation, analysis, response_cache.recent_messages
+            )
+        (cached, cache_status) = await lookup_response(
+            response_cache, "chat_message", key, bypass_response_cache
+        )
+        if cached is not None:
+            return (cached, cache_status)
+
+        generated = await bake_response(llm, conversation, analysis)
+        if response_cache is not None:
+            await response_cache.set(key, generated)
+        return (generated, cache_status)
+
+    @pipeline.stage("response_message", deps=["chat", "response", "user_message"])
+    async def persist_response_message(chat, response, user_message):
+        (content, _) = response
+        return await db.add_message(chat_id, "assistant", content, chat=chat)
+
+    return pipeline
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Whether an `If-None-Match` header matches an ETag, compared weakly."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag.removeprefix("W/") in (
+        tag.strip().removeprefix("W/") for tag in if_none_match.split(",")
+    )
+
+def encode_chat_cursor(cursor: tuple[str, str]) -> str:
+    """Encode a chat listing position as an opaque cursor."""
+    return base64.urlsafe_b64encode(json.dumps(list(cursor)).encode()).decode()
+
+def decode_chat_cursor(cursor: str) -> tuple[str, str]:
+    """Decode a cursor made by encode_chat_cursor, raising 400 if it's malformed."""
+    try:
+        (updated_at, chat_id) = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return (str(updated_at), str(chat_id))
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def cache_metrics(
+    db: AsyncCouchbaseChatClient,
+    intent_cache: SemanticCache | None,
+    response_cache: ResponseCache | None
+) -> list[metrics.Metric]:
+    """Snapshot the caches' hit/miss/eviction stats as metrics."""
+    requests = metrics.Counter(
+        "cache_requests", "Cache lookups by result", ["cache", "route", "result"]
+    )
+    evictions = metrics.Counter("cache_evictions", "Cache evictions", ["cache"])
+
+    def add(name: str, stats: CacheStats, route: str = "") -> None:
+        requests.inc(name, route, "hit", amount=stats.hits)
+        requests.inc(name, route, "miss", amount=stats.misses)
+        if not route:
+            evictions.inc(name, amount=stats.evictions)
+
+    if db.history_cache is not None:
+        add("chat_history", db.history_cache.stats)
+    if intent_cache is not None:
+        add("intent", intent_cache.stats)
+    if response_cache is not None:
+        add("response", response_cache.stats)
+        for (route, stats) in response_cache.routes.items():
+            add("response", stats, route)
+    return [requests, evictions]
+
+def ndjson(event: BaseModel) -> str:
+    """Serialize a stream event as a line of newline-delimited JSON."""
+    return event.model_dump_json(exclude_none=True) + "\n"
 
 #### Routes ####
 
@@ -308,6 +517,41 @@ def bake_response(opper: Opper, messages, analysis=None):
 async def hello() -> MessageResponse:
     return MessageResponse(message="Hello from the Customer Support Chat API!")
 
+@router.get("/health/ready", response_model=MessageResponse)
+async def health_ready(request: Request) -> MessageResponse:
+    """Readiness probe: 200 once the chat store is ready, 503 until then."""
+    if not request.app.state.db.ready:
+        raise HTTPException(status_code=503, detail="The chat store isn't ready yet")
+    return MessageResponse(message="ready")
+
+@router.get("/metrics", response_class=Response)
+async def get_metrics(
+    request: Request,
+    intent_cache: IntentCacheHandle,
+    response_cache: ResponseCacheHandle,
+) -> Response:
+    """Get the server's metrics in the Prometheus text format."""
+    return Response(
+        metrics.render(cache_metrics(request.app.state.db, intent_cache, response_cache)),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+@router.get("/cache/stats", response_model=CacheStatsResponse)
+async def cache_stats(
+    db: DbHandle,
+    intent_cache: IntentCacheHandle,
+    response_cache: ResponseCacheHandle,
+) -> CacheStatsResponse:
+    """Get hit/miss statistics for the server's caches."""
+    caches = {}
+    if db.history_cache is not None:
+        caches["chat_history"] = db.history_cache.stats.as_dict()
+    if intent_cache is not None:
+        caches["intent"] = intent_cache.stats_dict()
+    if response_cache is not None:
+        caches["response"] = response_cache.stats_dict()
+    return CacheStatsResponse(caches=caches)
+
 @router.post("/chats", response_model=ChatSession)
 async def create_chat(
     db: DbHandle,
@@ -315,12 +559,12 @@ async def create_chat(
 ) -> ChatSession:
     """Create a new chat session."""
     request = request or CreateChatRequest()
-    chat_id = db.create_chat(request.metadata)
-    chat = db.get_chat(chat_id)
+    chat_id = await db.create_chat(request.metadata)
+    chat = await db.get_chat(chat_id)
 
     # Add a system message to start the conversation
     system_message = "I'm a helpful customer support assistant. How can I help you today?"
-    db.add_message(chat_id, "system", system_message)
+    await db.add_message(chat_id, "system", system_message, chat=chat)
 
     return ChatSession(
         id=chat["id"],
@@ -329,13 +573,52 @@ async def create_chat(
         metadata=chat["metadata"]
     )
 
+@router.get("/chats", response_model=ChatList)
+async def list_chats(
+    db: DbHandle,
+    request: Request,
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of chats"),
+    cursor: str | None = Query(None, description="The `next_cursor` of the previous page"),
+) -> ChatList:
+    """
+    List chat sessions, most recently updated first.
+
+    Filter on metadata with `metadata.<key>=<value>` parameters, e.g.
+    `?metadata.client_id=abc`. Pages are read in index order; pass the
+    returned `next_cursor` to get the next one, which is absent on the last.
+    """
+    filters = {
+        key.removeprefix("metadata."): value
+        for (key, value) in request.query_params.items()
+        if key.startswith("metadata.")
+    }
+    try:
+        (chats, next_cursor) = await db.list_chats(
+            filters, limit, decode_chat_cursor(cursor) if cursor else None
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return ChatList(
+        chats=[
+            ChatSession(
+                id=chat["id"],
+                created_at=str(chat["created_at"]),
+                updated_at=str(chat["updated_at"]),
+                metadata=chat["metadata"]
+            )
+            for chat in chats
+        ],
+        next_cursor=encode_chat_cursor(next_cursor) if next_cursor else None
+    )
+
 @router.get("/chats/{chat_id}", response_model=ChatSession)
 async def get_chat(
     db: DbHandle,
     chat_id: str = Path(..., description="The UUID of the chat session"),
 ) -> ChatSession:
     """Get a chat session by ID."""
-    chat = db.get_chat(chat_id)
+    chat = await db.get_chat(chat_id)
     if not chat:
         raise HTTPException(status_code=404, detail=f"Chat with ID {chat_id} not found")
 
@@ -349,14 +632,52 @@ async def get_chat(
 @router.get("/chats/{chat_id}/messages", response_model=ChatHistory)
 async def get_chat_messages(
     db: DbHandle,
-    chat_id: str = Path(..., description="The UUID of the chat session")
+    request: Request,
+    http_response: Response,
+    chat_id: str = Path(..., description="The UUID of the chat session"),
+    limit: int | None = Query(None, ge=1, description="Maximum number of messages"),
+    before: int | None = Query(None, description="Only messages older than this message ID"),
+    after: int | None = Query(None, description="Only messages newer than this message ID"),
+    since: int | None = Query(
+        None, description="Like `after`, but responds 304 if there are no newer messages"
+    ),
 ) -> ChatHistory:
-    """Get all messages for a chat session."""
-    chat = db.get_chat(chat_id)
+    """
+    Get messages for a chat session, oldest first.
+
+    Without parameters, the whole history is returned. With `limit`, pages
+    run backwards from `before` (or the newest message), or forwards from
+    `after`/`since`; `has_more` tells whether messages lie beyond the page.
+
+    Responses carry an `ETag`, and a matching `If-None-Match` gets a 304
+    without the messages being read. Pollers can instead pass the last
+    message ID they have as `since`, and get a 304 until new messages arrive.
+    """
+    if since is not None:
+        if after is not None:
+            raise HTTPException(status_code=400, detail="Pass either after or since, not both")
+        after = since
+
+    chat = await db.get_chat(chat_id)
     if not chat:
         raise HTTPException(status_code=404, detail=f"Chat with ID {chat_id} not found")
 
-    db_messages = db.get_messages(chat_id)
+    (message_ids, has_more) = page_message_ids(
+        await db.get_message_ids(chat_id), limit, before, after
+    )
+
+    # Messages never change once written, so the page's IDs identify its content
+    digest = hashlib.sha256(f"{message_ids}:{has_more}".encode()).hexdigest()[:16]
+    etag = f'W/"{digest}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if (
+        etag_matches(request.headers.get("if-none-match"), etag)
+        or (since is not None and not message_ids)
+    ):
+        return Response(status_code=304, headers=headers)
+    http_response.headers.update(headers)
+
+    db_messages = await db.get_messages_by_id(chat_id, message_ids)
     messages = [
         Message(
             id=msg["id"],
@@ -371,46 +692,53 @@ async def get_chat_messages(
 
     return ChatHistory(
         chat_id=chat_id,
-        messages=messages
+        messages=messages,
+        has_more=has_more
     )
 
 @router.post("/chats/{chat_id}/messages", response_model=ChatMessageResponse)
 async def add_chat_message(
     request: ChatMessageRequest,
     db: DbHandle,
-    opper: OpperHandle,
+    llm: LLMHandle,
+    knowledge: KnowledgeHandle,
+    context: ContextHandle,
+    intent_cache: IntentCacheHandle,
+    response_cache: ResponseCacheHandle,
+    bypass_response_cache: ResponseCacheBypass,
+    http_response: Response,
     chat_id: str = Path(..., description="The UUID of the chat session"),
 ) -> ChatMessageResponse:
-    """Add a message to a chat session and get a response."""
-    # Check if chat exists
-    chat = db.get_chat(chat_id)
-    if not chat:
-        raise HTTPException(status_code=404, detail=f"Chat with ID {chat_id} not found")
+    """
+    Add a message to a chat session and get a response.
 
+    Per-stage timings are reported in the `Server-Timing` header. If response
+    caching is enabled, the `X-Response-Cache` header reports whether the
+    response was cached; send `Cache-Control: no-cache` to skip the cache.
+    """
     if not request or not request.content.strip():
         raise HTTPException(status_code=400, detail="Message content cannot be empty")
 
-    (query_id, query_ts) = db.add_message(
-        chat_id, "user", request.content, request.metadata
+    pipeline = build_turn_pipeline(
+        db, llm, knowledge, chat_id, request,
+        context=context,
+        intent_cache=intent_cache,
+        response_cache=response_cache,
+        bypass_response_cache=bypass_response_cache
     )
 
-    db_messages = db.get_messages(chat_id)
-
-    formatted_messages = [
-        {
-            "role": msg["role"],
-            "content": msg["content"]
-        }
-        for msg in db_messages
-    ]
-
     # Process the message with intent detection and knowledge base lookup
-    with opper.traces.start("customer_support_chat"):
-        analysis = process_message(opper, formatted_messages)
-        response = bake_response(opper, formatted_messages, analysis)
+    async with llm.trace("customer_support_chat"):
+        run = pipeline.start(["response_message"])
+        await run.wait()
 
-    # Add assistant response to database
-    (response_id, response_ts) = db.add_message(chat_id, "assistant", response)
+    http_response.headers["Server-Timing"] = run.server_timing()
+
+    (response, cache_status) = await run.get("response")
+    if cache_status:
+        http_response.headers["X-Response-Cache"] = cache_status
+    (query_id, query_ts) = await run.get("user_message")
+    (response_id, response_ts) = await run.get("response_message")
 
     return ChatMessageResponse(
         message=Message(
@@ -431,17 +759,131 @@ async def add_chat_message(
         )
     )
 
+@router.post("/chats/{chat_id}/messages/stream")
+async def stream_chat_message(
+    request: ChatMessageRequest,
+    db: DbHandle,
+    llm: LLMHandle,
+    knowledge: KnowledgeHandle,
+    context: ContextHandle,
+    intent_cache: IntentCacheHandle,
+    response_cache: ResponseCacheHandle,
+    bypass_response_cache: ResponseCacheBypass,
+    chat_id: str = Path(..., description="The UUID of the chat session"),
+) -> StreamingResponse:
+    """
+    Add a message to a chat session and stream the response as NDJSON.
+
+    Emits a `message` event with the stored user message, `delta` events with
+    response text as it is generated, and finally a `response` event with the
+    stored assistant message, or an `error` event if generating or saving
+    the response failed.
+    A cached response is sent as a single `delta` event.
+    """
+    chat = await db.get_chat(chat_id)
+    if not chat:
+        raise HTTPException(status_code=404, detail=f"Chat with ID {chat_id} not found")
+
+    if not request or not request.content.strip():
+        raise HTTPException(status_code=400, detail="Message content cannot be empty")
+
+    pipeline = build_turn_pipeline(
+        db, llm, knowledge, chat_id, request,
+        chat=chat,
+        context=context,
+        intent_cache=intent_cache
+    )
+
+    async def events():
+        chunks = []
+        key = None
+        cached = None
+        async with llm.trace("customer_support_chat"):
+            run = pipeline.start(["user_message", "conversation", "analysis"])
+            try:
+                (query_id, query_ts) = await run.get("user_message")
+                yield ndjson(ChatMessageStreamEvent(
+                    type="message",
+                    message=Message(
+                        id=query_id,
+                        chat_id=chat_id,
+                        role='user',
+                        content=request.content,
+                        created_at=query_ts,
+                        metadata=request.metadata
+                    )
+                ))
+
+                conversation = await run.get("conversation")
+                analysis = await run.get("analysis")
+                if response_cache is not None:
+                    key = response_cache_key(
+                        conversation, analysis, response_cache.recent_messages
+                    )
+                (cached, _) = await lookup_response(
+                    response_cache, "chat_message_stream", key, bypass_response_cache
+                )
+                if cached is not None:
+                    chunks.append(cached)
+                    yield ndjson(ChatMessageStreamEvent(type="delta", delta=cached))
+                else:
+                    async for delta in stream_response(llm, conversation, analysis):
+                        chunks.append(delta)
+                        yield ndjson(ChatMessageStreamEvent(type="delta", delta=delta))
+                await run.wait()
+            except Exception:
+                run.cancel()
+                logger.exception("Failed to generate response.")
+                yield ndjson(ChatMessageStreamEvent(
+                    type="error", detail="Failed to generate response"
+                ))
+                return
+
+        # Persist the assistant response once the stream is complete. Not
+        # retried: a write that timed out may still have been applied
+        response = "".join(chunks)
+        try:
+            (response_id, response_ts) = await db.add_message(
+                chat_id, "assistant", response, chat=chat
+            )
+        except Exception:
+            logger.exception(f"Failed to save response to chat {chat_id}.")
+            yield ndjson(ChatMessageStreamEvent(
+                type="error", detail="Failed to save response"
+            ))
+            return
+        if response_cache is not None and cached is None:
+            await response_cache.set(key, response)
+
+        yield ndjson(ChatMessageStreamEvent(
+            type="response",
+            response=Message(
+                id=response_id,
+                chat_id=chat_id,
+                role='assistant',
+                content=response,
+                created_at=response_ts,
+                metadata={}
+            )
+        ))
+
+    return StreamingResponse(
+        events(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.delete("/chats/{chat_id}", response_model=MessageResponse)
 async def delete_chat(
     db: DbHandle,
     chat_id: str = Path(..., description="The UUID of the chat session"),
 ) -> MessageResponse:
     """Delete a chat session and all its messages."""
-    chat = db.get_chat(chat_id)
+    chat = await db.get_chat(chat_id)
     if not chat:
         raise HTTPException(status_code=404, detail=f"Chat with ID {chat_id} not found")
 
-    success = db.delete_chat(chat_id)
+    success = await db.delete_chat(chat_id)
     if not success:
         raise HTTPException(status_code=500, detail="Failed to delete chat")
 
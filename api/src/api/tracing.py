@@ -0,0 +1,349 @@
+import contextlib
+import contextvars
+import functools
+import inspect
+import json
+import queue
+import random
+import re
+import threading
+import time
+import urllib.request
+from typing import Any, Callable, ContextManager, Iterator, Optional
+
+from .utils import log
+
+logger = log.get_logger(__name__)
+
+#### Types ####
+
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+# OTLP span kinds
+INTERNAL = 1
+SERVER = 2
+CLIENT = 3
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+def parse_traceparent(header: Optional[str]) -> Optional[tuple[str, str]]:
+    """
+    Parse a W3C `traceparent` header.
+
+    Returns:
+        The trace ID and parent span ID, or None if absent or malformed
+    """
+    if not header:
+        return None
+    match = TRACEPARENT.match(header.strip().lower())
+    if not match or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    return (match.group(1), match.group(2))
+
+class Span:
+    """A timed operation within a trace."""
+    __slots__ = (
+        "trace_id", "span_id", "parent_id", "name", "kind",
+        "start_ns", "end_ns", "attributes", "error"
+    )
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: Optional[str] = None,
+        kind: int = INTERNAL,
+        attributes: Optional[dict[str, Any]] = None
+    ):
+        self.trace_id = trace_id
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes or {}
+        self.error: Optional[str] = None
+
+    @property
+    def traceparent(self) -> str:
+        """The W3C `traceparent` header value identifying this span."""
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set(self, key: str, value: Any) -> None:
+        """Set an attribute."""
+        self.attributes[key] = value
+
+    def to_otlp(self) -> dict[str, Any]:
+        """The span in OTLP/JSON form."""
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [
+                {"key": key, "value": {"stringValue": str(value)}}
+                for (key, value) in self.attributes.items()
+            ],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+class NoopSpan:
+    """Stands in for spans while tracing is off, recording nothing."""
+    trace_id = None
+    span_id = None
+    parent_id = None
+    traceparent = None
+    name = None
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+_NOOP = contextlib.nullcontext(NoopSpan())
+
+#### Exporters ####
+
+class FileExporter:
+    """Appends spans to a file, one OTLP/JSON span per line."""
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, spans: list[dict[str, Any]]) -> None:
+        with open(self.path, "a") as f:
+            f.write("".join(json.dumps(span) + "\n" for span in spans))
+
+class OtlpExporter:
+    """
+    Posts spans to an OTLP/HTTP collector as JSON.
+
+    Args:
+        endpoint: Base URL of the collector; spans go to `{endpoint}/v1/traces`
+        service_name: The `service.name` resource attribute
+        timeout: Request timeout in seconds
+    """
+    def __init__(self, endpoint: str, service_name: str = "api", timeout: float = 5.0):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self.timeout = timeout
+
+    def export(self, spans: list[dict[str, Any]]) -> None:
+        body = {
+            "resourceSpans": [{
+                "resource": {"attributes": [
+                    {"key": "service.name", "value": {"stringValue": self.service_name}}
+                ]},
+                "scopeSpans": [{"scope": {"name": "api"}, "spans": spans}],
+            }]
+        }
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(body).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+Exporter = FileExporter | OtlpExporter
+
+class BatchProcessor:
+    """
+    Hands finished spans to an exporter in batches, from a background thread,
+    so exporting never blocks the code being traced.
+
+    Args:
+        exporter: Where spans go
+        max_batch: Maximum spans per export
+        interval: Maximum seconds a span waits before being exported
+    """
+    def __init__(self, exporter: Exporter, max_batch: int = 512, interval: float = 1.0):
+        self.exporter = exporter
+        self.max_batch = max_batch
+        self.interval = interval
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="span-export", daemon=True)
+        self._thread.start()
+
+    def on_end(self, span: Span) -> None:
+        self._queue.put(span)
+
+    def _drain(self, timeout: Optional[float]) -> list[dict[str, Any]]:
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=timeout).to_otlp())
+            while len(batch) < self.max_batch:
+                batch.append(self._queue.get_nowait().to_otlp())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _export(self, batch: list[dict[str, Any]]) -> None:
+        try:
+            self.exporter.export(batch)
+        except Exception as e:
+            logger.warning(f"Failed to export {len(batch)} spans: {e}")
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            if batch := self._drain(self.interval):
+                self._export(batch)
+
+    def shutdown(self) -> None:
+        """Stop the export thread and export the spans still queued."""
+        self._stopping.set()
+        self._thread.join(timeout=self.interval + 1)
+        while batch := self._drain(0):
+            self._export(batch)
+
+#### Tracing ####
+
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar(
+    "current_span", default=None
+)
+_processor: Optional[BatchProcessor] = None
+
+def init(exporter: Optional[Exporter]) -> None:
+    """Start exporting finished spans, or stop if `exporter` is None."""
+    global _processor
+    shutdown()
+    if exporter is not None:
+        _processor = BatchProcessor(exporter)
+
+def shutdown() -> None:
+    """Export the remaining spans and stop exporting."""
+    global _processor
+    if _processor is not None:
+        _processor.shutdown()
+        _processor = None
+
+def current_span() -> Optional[Span]:
+    """The span the current context is in, if any."""
+    return _current.get()
+
+def _start(name: str, kind: int, attributes: dict[str, Any]) -> Span:
+    parent = _current.get()
+    if parent is None:
+        return Span(name, _new_id(128), None, kind, attributes)
+    return Span(name, parent.trace_id, parent.span_id, kind, attributes)
+
+def _end(span: Span, error: Optional[BaseException] = None) -> None:
+    span.end_ns = time.time_ns()
+    if error is not None:
+        span.error = f"{type(error).__name__}: {error}"
+    if _processor is not None:
+        _processor.on_end(span)
+
+def span(
+    name: str,
+    kind: int = INTERNAL,
+    traceparent: Optional[str] = None,
+    **attributes: Any
+) -> ContextManager[Span | NoopSpan]:
+    """
+    Record a span around a block, as a child of the current span. Log lines
+    written inside it carry its trace and span IDs.
+
+    While tracing is off this returns a shared no-op context yielding a
+    NoopSpan, so untraced code pays for neither IDs nor log context.
+
+    Args:
+        name: Name of the span
+        kind: SERVER, CLIENT or INTERNAL
+        traceparent: Optional W3C header of a remote parent, which takes
+            precedence over the current span
+        attributes: Attributes of the span
+    """
+    if _processor is None:
+        return _NOOP
+    return _span(name, kind, traceparent, attributes)
+
+@contextlib.contextmanager
+def _span(
+    name: str,
+    kind: int,
+    traceparent: Optional[str],
+    attributes: dict[str, Any]
+) -> Iterator[Span]:
+    remote = parse_traceparent(traceparent)
+    if remote is not None:
+        current = Span(name, remote[0], remote[1], kind, attributes)
+    else:
+        current = _start(name, kind, attributes)
+    token = _current.set(current)
+    try:
+        with log.bind(trace_id=current.trace_id, span_id=current.span_id):
+            yield current
+    except BaseException as e:
+        _end(current, e)
+        raise
+    else:
+        _end(current)
+    finally:
+        _current.reset(token)
+
+def _traced_generator(generator, current: Span):
+    try:
+        result = yield from generator
+    except BaseException as e:
+        _end(current, e)
+        raise
+    _end(current)
+    return result
+
+async def _traced_async_generator(generator, current: Span):
+    try:
+        async for item in generator:
+            yield item
+    except BaseException as e:
+        _end(current, e)
+        raise
+    _end(current)
+
+def traced(name: str, kind: int = INTERNAL) -> Callable:
+    """
+    Decorator recording each call as a span. Works on plain and coroutine
+    functions; functions returning generators or async generators get a span
+    lasting until the generator is exhausted, which isn't made current since
+    the generator may be advanced from other contexts. While tracing is off,
+    calls go straight through.
+    """
+    def decorate(fn: Callable) -> Callable:
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def traced_async(*args: Any, **kwargs: Any) -> Any:
+                if _processor is None:
+                    return await fn(*args, **kwargs)
+                with _span(name, kind, None, {}):
+                    return await fn(*args, **kwargs)
+            return traced_async
+
+        @functools.wraps(fn)
+        def traced_sync(*args: Any, **kwargs: Any) -> Any:
+            if _processor is None:
+                return fn(*args, **kwargs)
+            current = _start(name, kind, {})
+            token = _current.set(current)
+            try:
+                with log.bind(trace_id=current.trace_id, span_id=current.span_id):
+                    result = fn(*args, **kwargs)
+            except BaseException as e:
+                _end(current, e)
+                raise
+            finally:
+                _current.reset(token)
+            if inspect.isgenerator(result):
+                # End the span when the generator is exhausted, not just created
+                return _traced_generator(result, current)
+            if inspect.isasyncgen(result):
+                return _traced_async_generator(result, current)
+            _end(current)
+            return result
+        return traced_sync
+    return decorate
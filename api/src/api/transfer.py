@@ -0,0 +1,520 @@
+import argparse
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from datetime import timedelta
+import functools
+import itertools
+import json
+import os
+import time
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from couchbase.kv_range_scan import RangeScan, ScanTerm
+from couchbase.options import ScanOptions, UpsertMultiOptions
+
+from . import conf
+from .clients.couchbase import CouchbaseChatClient
+from .utils import log
+
+log.init(conf.get_log_level(), conf.get_log_format())
+logger = log.get_logger(__name__)
+
+#### Formats ####
+
+# Each record is one chat with its messages:
+# {"id", "created_at", "updated_at", "metadata", "messages": [{"id", "role", "content", "created_at", "metadata"}]}
+
+def read_jsonl(path: str, start: int = 0) -> Iterator[tuple[dict[str, Any], int]]:
+    """
+    Stream chat records from a JSONL file.
+
+    Args:
+        path: Path to the file
+        start: Byte offset to start reading from
+
+    Returns:
+        Each record with the byte offset just past it
+    """
+    with open(path, "rb") as f:
+        f.seek(start)
+        while line := f.readline():
+            if line.strip():
+                yield (json.loads(line), f.tell())
+
+def read_parquet(path: str, start: int = 0) -> Iterator[tuple[dict[str, Any], int]]:
+    """
+    Stream chat records from a Parquet file, one record batch at a time.
+
+    Args:
+        path: Path to the file
+        start: Number of rows to skip
+
+    Returns:
+        Each record with the number of rows read so far
+    """
+    import pyarrow.parquet as pq
+
+    row = 0
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=1024):
+        if row + batch.num_rows <= start:
+            row += batch.num_rows
+            continue
+        for record in batch.to_pylist():
+            row += 1
+            if row > start:
+                yield (from_parquet_record(record), row)
+
+def parquet_schema():
+    """Schema of Parquet chat files. Metadata is stored as JSON text."""
+    import pyarrow as pa
+
+    message = pa.struct([
+        ("id", pa.int64()),
+        ("role", pa.string()),
+        ("content", pa.string()),
+        ("created_at", pa.string()),
+        ("metadata", pa.string()),
+    ])
+    return pa.schema([
+        ("id", pa.string()),
+        ("created_at", pa.string()),
+        ("updated_at", pa.string()),
+        ("metadata", pa.string()),
+        ("messages", pa.list_(message)),
+    ])
+
+def to_parquet_record(record: dict[str, Any]) -> dict[str, Any]:
+    return {
+        **record,
+        "metadata": json.dumps(record.get("metadata") or {}),
+        "messages": [
+            {**msg, "metadata": json.dumps(msg.get("metadata") or {})}
+            for msg in record["messages"]
+        ]
+    }
+
+def from_parquet_record(record: dict[str, Any]) -> dict[str, Any]:
+    return {
+        **record,
+        "metadata": json.loads(record["metadata"] or "{}"),
+        "messages": [
+            {**msg, "metadata": json.loads(msg["metadata"] or "{}")}
+            for msg in record["messages"] or []
+        ]
+    }
+
+class JsonlWriter:
+    """
+    Appends chat records to a JSONL file.
+
+    Args:
+        path: Path to the file
+        resume_offset: Byte offset to truncate the file to and continue from,
+            or None to start a new file
+    """
+    def __init__(self, path: str, resume_offset: Optional[int] = None):
+        if resume_offset is None:
+            self.file = open(path, "wb")
+        else:
+            self.file = open(path, "r+b")
+            self.file.truncate(resume_offset)
+            self.file.seek(resume_offset)
+
+    def write(self, records: list[dict[str, Any]]) -> None:
+        self.file.write(b"".join(
+            json.dumps(record).encode() + b"\n" for record in records
+        ))
+
+    def position(self) -> Optional[int]:
+        """Flush and return the offset to resume from."""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def close(self) -> None:
+        self.file.close()
+
+class ParquetWriter:
+    """
+    Writes chat records to a Parquet file, one row group per batch.
+
+    Parquet files can't be appended to, so exports to Parquet can't resume.
+
+    Args:
+        path: Path to the file
+    """
+    def __init__(self, path: str):
+        import pyarrow.parquet as pq
+
+        self.schema = parquet_schema()
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, records: list[dict[str, Any]]) -> None:
+        import pyarrow as pa
+
+        self.writer.write_table(pa.Table.from_pylist(
+            [to_parquet_record(record) for record in records], schema=self.schema
+        ))
+
+    def position(self) -> Optional[int]:
+        return None
+
+    def close(self) -> None:
+        self.writer.close()
+
+#### Progress ####
+
+class Checkpoint:
+    """
+    Progress of a transfer, saved after each batch that is fully written.
+
+    Saves replace the file atomically, so a crash never leaves a partial
+    checkpoint behind.
+
+    Args:
+        path: Path to the checkpoint file
+        restart: Whether to ignore any saved progress
+    """
+    def __init__(self, path: str, restart: bool = False):
+        self.path = path
+        self.state: dict[str, Any] = {}
+        if not restart and os.path.exists(path):
+            with open(path) as f:
+                self.state = json.load(f)
+            logger.info(f"Resuming from checkpoint {path}: {self.state}")
+
+    def save(self, **state) -> None:
+        self.state = state
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+class Progress:
+    """Counts transferred chats and messages, logging a rate every few seconds."""
+    def __init__(self, action: str, interval: float = 5.0):
+        self.action = action
+        self.interval = interval
+        self.chats = 0
+        self.messages = 0
+        self.started_at = time.perf_counter()
+        self.logged_at = self.started_at
+
+    def add(self, chats: int, messages: int) -> None:
+        self.chats += chats
+        self.messages += messages
+        if time.perf_counter() - self.logged_at >= self.interval:
+            self.log()
+
+    def log(self) -> None:
+        self.logged_at = time.perf_counter()
+        elapsed = self.logged_at - self.started_at
+        logger.info(
+            f"{self.action} {self.chats} chats, {self.messages} messages "
+            f"({self.chats / elapsed:.0f} chats/s)"
+        )
+
+#### Transfer ####
+
+def bounded_map(
+    executor: Executor,
+    fn: Callable,
+    items: Iterable,
+    window: int
+) -> Iterator:
+    """
+    Like `executor.map`, but keeps at most `window` calls in flight, so the
+    items are consumed lazily and results come back in order.
+    """
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def _raise_on_errors(result) -> None:
+    if not result.all_ok:
+        raise next(iter(result.exceptions.values()))
+
+def import_batch(
+    db: CouchbaseChatClient,
+    batch: tuple[tuple[dict[str, Any], int], ...]
+) -> tuple[int, int, int]:
+    """
+    Write a batch of chat records with two batched upserts.
+
+    Upserts make replaying a batch after a crash harmless. Messages without
+    an ID are numbered by their position in the chat. A record repeating a
+    message ID is rejected rather than letting one message overwrite the
+    other; fix it and resume from the checkpoint. Each chat's message ID
+    counter is then raised to its highest message ID, so messages added
+    after the import get higher ones. With a retention period, documents get
+    its expiry from now and chats are stamped, as live writes do.
+
+    Returns:
+        The number of chats and messages written, and the source position
+        just past the batch
+
+    Raises:
+        ValueError: If a chat appears twice in the batch, or repeats a message ID
+    """
+    chats = {}
+    docs = {}
+    last_ids = {}
+    messages = 0
+    for (record, _) in batch:
+        chat_id = record["id"]
+        if chat_id in chats:
+            raise ValueError(f"Chat {chat_id} appears twice in the batch")
+        message_ids = []
+        for (i, msg) in enumerate(record.get("messages") or [], start=1):
+            message_id = int(msg["id"]) if msg.get("id") is not None else i
+            if db.message_key(chat_id, message_id) in docs:
+                raise ValueError(f"Chat {chat_id} has more than one message with ID {message_id}")
+            docs[db.message_key(chat_id, message_id)] = {
+                "id": message_id,
+                "chat_id": chat_id,
+                "role": msg["role"],
+                "content": msg["content"],
+                "created_at": msg.get("created_at") or record.get("created_at"),
+                "metadata": msg.get("metadata") or {}
+            }
+            message_ids.append(message_id)
+        docs[db.manifest_key(chat_id)] = {"message_ids": sorted(message_ids)}
+        messages += len(message_ids)
+        if message_ids:
+            last_ids[chat_id] = max(message_ids)
+        chats[chat_id] = {
+            "id": chat_id,
+            "created_at": record.get("created_at"),
+            "updated_at": record.get("updated_at") or record.get("created_at"),
+            "metadata": record.get("metadata") or {}
+        }
+        if db.retention:
+            chats[chat_id]["retention"] = db.retention_stamp
+
+    # Messages and manifests first, so a chat never appears without its history
+    options = UpsertMultiOptions(**db.expiry())
+    _raise_on_errors(db.messages.upsert_multi(docs, options))
+    db.advance_message_ids(last_ids)
+    _raise_on_errors(db.chats.upsert_multi(chats, options))
+    return (len(chats), messages, batch[-1][1])
+
+def import_chats(
+    db: CouchbaseChatClient,
+    path: str,
+    fmt: str,
+    checkpoint: Checkpoint,
+    batch_size: int = 200,
+    concurrency: int = 8
+) -> None:
+    """
+    Import chats from a JSONL or Parquet file, resuming from the checkpoint.
+
+    Records are streamed from the file in batches and written by a pool of
+    `concurrency` workers. The checkpoint only advances past a batch once it
+    and every batch before it are written.
+    """
+    read = read_parquet if fmt == "parquet" else read_jsonl
+    records = read(path, checkpoint.state.get("position", 0))
+    progress = Progress("Imported")
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = bounded_map(
+            executor,
+            functools.partial(import_batch, db),
+            itertools.batched(records, batch_size),
+            concurrency * 2
+        )
+        for (chats, messages, position) in results:
+            checkpoint.save(position=position)
+            progress.add(chats, messages)
+    progress.log()
+
+# Chats are exported one key range at a time, in key order within each range;
+# the boundaries split random UUIDs evenly and cover every possible key
+SHARD_BOUNDARIES = [f"{i:02x}" for i in range(1, 256)]
+
+def shard_scans() -> list[RangeScan]:
+    bounds = [None, *SHARD_BOUNDARIES, None]
+    return [
+        RangeScan(
+            start=ScanTerm(start) if start else None,
+            end=ScanTerm(end, exclusive=True) if end else None
+        )
+        for (start, end) in zip(bounds, bounds[1:])
+    ]
+
+def export_batch(db: CouchbaseChatClient, chat_ids: tuple[str, ...]) -> list[dict[str, Any]]:
+    """
+    Read a batch of chats and their messages with three batched gets.
+
+    Returns:
+        Chat records, skipping chats deleted since they were listed
+    """
+    chats = db.chats.get_multi(list(chat_ids)).results
+    chat_ids = [chat_id for chat_id in chat_ids if chat_id in chats]
+
+    manifests = db.messages.get_multi(
+        [db.manifest_key(chat_id) for chat_id in chat_ids]
+    ).results
+    message_ids = {}
+    for chat_id in chat_ids:
+        manifest = manifests.get(db.manifest_key(chat_id))
+        message_ids[chat_id] = (
+            sorted(manifest.value["message_ids"]) if manifest
+            else db.get_message_ids(chat_id)
+        )
+
+    keys = [
+        db.message_key(chat_id, message_id)
+        for chat_id in chat_ids
+        for message_id in message_ids[chat_id]
+    ]
+    messages = db.messages.get_multi(keys).results if keys else {}
+
+    records = []
+    for chat_id in chat_ids:
+        chat = chats[chat_id].value
+        chat_messages = []
+        for message_id in message_ids[chat_id]:
+            result = messages.get(db.message_key(chat_id, message_id))
+            if result is None:
+                continue
+            msg = result.value
+            chat_messages.append({
+                "id": msg["id"],
+                "role": msg["role"],
+                "content": msg["content"],
+                "created_at": msg.get("created_at"),
+                "metadata": msg.get("metadata") or {}
+            })
+        records.append({
+            "id": chat_id,
+            "created_at": chat.get("created_at"),
+            "updated_at": chat.get("updated_at"),
+            "metadata": chat.get("metadata") or {},
+            "messages": chat_messages
+        })
+    return records
+
+def export_chats(
+    db: CouchbaseChatClient,
+    path: str,
+    fmt: str,
+    checkpoint: Checkpoint,
+    batch_size: int = 200,
+    concurrency: int = 8
+) -> None:
+    """
+    Export all chats to a JSONL or Parquet file, resuming from the checkpoint.
+
+    Chat IDs are listed with a KV range scan per key range, so no query index
+    is needed and only one range's IDs are held in memory. Batches of chats
+    are read by a pool of `concurrency` workers and written in order. JSONL
+    exports are checkpointed after each key range.
+    """
+    first_shard = checkpoint.state.get("shard", 0)
+    if fmt == "parquet":
+        if first_shard:
+            logger.warning("Parquet exports can't resume; starting over.")
+            first_shard = 0
+        writer = ParquetWriter(path)
+    else:
+        writer = JsonlWriter(path, checkpoint.state.get("position") if first_shard else None)
+
+    progress = Progress("Exported")
+    scans = shard_scans()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for shard in range(first_shard, len(scans)):
+                chat_ids = sorted(
+                    result.id
+                    for result in db.chats.scan(scans[shard], ScanOptions(ids_only=True))
+                )
+                results = bounded_map(
+                    executor,
+                    functools.partial(export_batch, db),
+                    itertools.batched(chat_ids, batch_size),
+                    concurrency * 2
+                )
+                for records in results:
+                    writer.write(records)
+                    progress.add(
+                        len(records), sum(len(record["messages"]) for record in records)
+                    )
+                position = writer.position()
+                if position is not None:
+                    checkpoint.save(shard=shard + 1, position=position)
+    finally:
+        writer.close()
+    progress.log()
+
+#### Entrypoint ####
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="api-transfer",
+        description="Bulk import or export chats and their messages as JSONL or Parquet."
+    )
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("path", help="JSONL or Parquet file to read or write")
+    parser.add_argument(
+        "--format",
+        choices=["jsonl", "parquet"],
+        help="File format (default: from the file extension)"
+    )
+    parser.add_argument("--batch-size", type=int, default=200, help="Chats per batch")
+    parser.add_argument("--concurrency", type=int, default=8, help="Batches in flight")
+    parser.add_argument(
+        "--checkpoint",
+        help="Checkpoint file to resume from (default: <path>.checkpoint)"
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Ignore any saved checkpoint and start over"
+    )
+    args = parser.parse_args()
+
+    fmt = args.format or ("parquet" if args.path.endswith(".parquet") else "jsonl")
+    checkpoint = Checkpoint(args.checkpoint or f"{args.path}.checkpoint", args.restart)
+
+    cb_conf = conf.get_couchbase_conf()
+    retention_conf = conf.get_retention_conf()
+    db = CouchbaseChatClient(
+        url=cb_conf.url,
+        username=cb_conf.username,
+        password=cb_conf.password,
+        bucket_name=cb_conf.bucket,
+        scope=cb_conf.scope,
+        retention=(
+            timedelta(days=retention_conf.days) if retention_conf.days > 0 else None
+        )
+    )
+    db.connect()
+    if not db.chats:
+        db.init()
+
+    transfer = import_chats if args.command == "import" else export_chats
+    try:
+        transfer(
+            db,
+            args.path,
+            fmt,
+            checkpoint,
+            batch_size=args.batch_size,
+            concurrency=args.concurrency
+        )
+        checkpoint.clear()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
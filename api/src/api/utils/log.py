@@ -1,7 +1,12 @@
+import atexit
 import contextlib
+import contextvars
 from datetime import datetime, UTC
+import json
 import logging
+import logging.handlers
 import os
+import queue
 import re
 
 def colorize(text, color_code):
@@ -45,10 +50,11 @@ LEVEL_LABELS = {
     'WARNING': yellow('WARNING'),
 }
 
+ANSI_ESCAPE = re.compile(r'\x1B\[.*?[a-zA-Z]')
+
 def strip_ansi(s: str) -> str:
     """Removes ANSI escape sequences from the given string."""
-    r = re.compile(r'\x1B\[.*?[a-zA-Z]')
-    return r.sub('', s)
+    return ANSI_ESCAPE.sub('', s) if '\x1b' in s else s
 
 def disp_len(s: str) -> int:
     """Returns the display length of the given string."""
@@ -56,27 +62,162 @@ def disp_len(s: str) -> int:
 
 def indent_rest(input_string: str, indent: int) -> str:
     """Indents all but the first line of the given string."""
+    if "\n" not in input_string:
+        return input_string
     lines = input_string.split("\n")
     return "\n".join([lines[0]] + [f"{' ' * indent}{line}" for line in lines[1:]])
 
+_context: contextvars.ContextVar[dict[str, str]] = contextvars.ContextVar('log_context', default={})
+
+def get_context() -> dict[str, str]:
+    """Returns the fields attached to log lines written in the current context."""
+    return _context.get()
+
+@contextlib.contextmanager
+def bind(**fields: str):
+    """Attaches fields, such as a request ID, to log lines written within the block.
+    Usage:
+    ```
+    with log.bind(request_id=request_id):
+        ...
+    ```
+    """
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+class _ContextFilter(logging.Filter):
+    """Copies the context fields onto records, in the thread that logs them."""
+    def filter(self, record):
+        record.context = _context.get()
+        return True
+
+class _Timestamps:
+    """Formats record times as ISO 8601 UTC, reusing the part up to the second."""
+    def __init__(self):
+        self._second = None
+        self._prefix = ''
+
+    def format(self, created: float) -> str:
+        second = int(created)
+        if second != self._second:
+            self._prefix = datetime.fromtimestamp(second, UTC).strftime('%Y-%m-%dT%H:%M:%S')
+            self._second = second
+        return f"{self._prefix}.{int((created - second) * 1000):03d}Z"
+
 class Formatter(logging.Formatter):
     """Pretty-printing log formatter."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._timestamps = _Timestamps()
+        self._names: dict[str, tuple[str, int]] = {}
+
+    def _name(self, n: str) -> tuple[str, int]:
+        """The colored logger name and its display length, cached per logger."""
+        cached = self._names.get(n)
+        if cached is None:
+            cached = (colorize(n, sum([ord(x) for x in n]) % 6 + 32), len(n))
+            self._names[n] = cached
+        return cached
+
     def format(self, record):
-        ts = (datetime
-              .fromtimestamp(record.created, UTC)
-              .strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z')
+        ts = self._timestamps.format(record.created)
         level = LEVEL_LABELS.get(record.levelname, record.levelname)
-        n = record.name
-        color = sum([ord(x) for x in n]) % 6 + 32
+        (name, name_len) = self._name(record.name)
         msg = record.getMessage()
-        base = f"{italic(ts)} – {colorize(n, color)} – {level} – "
+        base = f"{italic(ts)} – {name} – {level} – "
+        w = len(ts) + name_len + len(record.levelname) + 9
+        request_id = getattr(record, 'context', {}).get('request_id')
+        if request_id:
+            base += faint(f"[{request_id}] ")
+            w += len(request_id) + 3
         ex = '\n' + self.formatException(record.exc_info) if record.exc_info else ''
-        w = disp_len(base)
         return f"{base}{indent_rest(msg, w)}{indent_rest(ex, w)}"
 
     def formatException(self, exc_info):
         return super().formatException(exc_info)
 
+# Same output as json.dumps for a string
+_encode = json.encoder.encode_basestring_ascii
+
+class JsonFormatter(logging.Formatter):
+    """
+    Single-line JSON log formatter for production.
+
+    Each record becomes one object with `ts`, `level`, `logger` and `msg`,
+    plus `exc` if it carries an exception and the context fields bound with
+    `bind`, such as `request_id` and `trace_id`. ANSI colors are stripped from
+    messages. The encoded level and logger fields are cached per logger, and
+    the encoded context fields per context; `bind` makes a new dict rather
+    than changing one, so records sharing a context share its encoding.
+    Strings are encoded with the json module's C string encoder rather than
+    `json.dumps`, which costs about twice as much per call.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._timestamps = _Timestamps()
+        self._fields: dict[tuple[str, str], str] = {}
+        self._context: dict[str, str] | None = None
+        self._context_fields = ''
+
+    def _fields_of(self, record) -> str:
+        key = (record.name, record.levelname)
+        fields = self._fields.get(key)
+        if fields is None:
+            fields = f'"level":{_encode(record.levelname)},"logger":{_encode(record.name)},"msg":'
+            self._fields[key] = fields
+        return fields
+
+    def _context_fields_of(self, context: dict[str, str]) -> str:
+        if context is not self._context:
+            self._context_fields = ''.join(
+                f',{_encode(key)}:{_encode(value) if isinstance(value, str) else json.dumps(value)}'
+                for (key, value) in context.items()
+            )
+            # Holding the dict keeps its identity from being reused
+            self._context = context
+        return self._context_fields
+
+    def format(self, record):
+        msg = record.getMessage()
+        if '\x1b' in msg:
+            msg = strip_ansi(msg)
+        exc = (
+            f',"exc":{_encode(self.formatException(record.exc_info))}'
+            if record.exc_info else ''
+        )
+        return (
+            f'{{"ts":"{self._timestamps.format(record.created)}",{self._fields_of(record)}'
+            f'{_encode(msg)}{self._context_fields_of(getattr(record, "context", {}))}{exc}}}'
+        )
+
+FORMATTERS = {
+    'pretty': Formatter,
+    'json': JsonFormatter,
+}
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler leaving all formatting to the listener thread.
+
+    Only the message is interpolated up front, so later changes to its
+    arguments can't leak into it; exceptions are formatted by the listener.
+    """
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+_listener: logging.handlers.QueueListener | None = None
+
+def _stop_listener():
+    global _listener
+    if _listener:
+        _listener.stop()
+        _listener = None
+
 def get_logger(name):
     """Gets a logger with the custom trace method."""
     logger = logging.getLogger(name)
@@ -94,8 +235,17 @@ def set_level(level):
         logging.getLogger(__name__).warning('Invalid log level %s; ignoring.',
                                             red(level))
 
-def init(level: str | int = None):
-    """Initializes the logging system with TRACE support."""
+def init(level: str | int = None, log_format: str = None, use_queue: bool = True):
+    """
+    Initializes the logging system with TRACE support.
+
+    Args:
+        level: Log level; defaults to the LOG_LEVEL env var, or INFO
+        log_format: 'pretty' or 'json'; defaults to the LOG_FORMAT env var, or pretty
+        use_queue: Whether records are handed to a background thread through
+            a queue, so formatting and I/O don't block the caller
+    """
+    global _listener
     logging.addLevelName(TRACE, 'TRACE')
 
     def trace(self, message, *args, **kwargs):
@@ -105,11 +255,24 @@ def init(level: str | int = None):
 
     logging.captureWarnings(True)
     level = level or os.environ.get('LOG_LEVEL', 'INFO').upper()
+    log_format = log_format or os.environ.get('LOG_FORMAT', 'pretty').lower()
     logger = logging.getLogger()
     handler = logging.StreamHandler()
-    handler.setFormatter(Formatter('%(message)s'))
+    handler.setFormatter(FORMATTERS.get(log_format, Formatter)('%(message)s'))
+
+    _stop_listener()
+    if use_queue:
+        records = queue.SimpleQueue()
+        _listener = logging.handlers.QueueListener(records, handler)
+        _listener.start()
+        atexit.register(_stop_listener)
+        handler = _QueueHandler(records)
+    # Context fields are read when logging, as the listener thread can't see them
+    handler.addFilter(_ContextFilter())
     logger.handlers = [handler]
     set_level(level)
+    if log_format not in FORMATTERS:
+        logger.warning('Invalid log format %s; using pretty.', log_format)
 
 @contextlib.contextmanager
 def level(level):
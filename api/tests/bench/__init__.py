@@ -0,0 +1,10 @@
+"""
+Benchmarks, run as modules from the api directory, e.g.
+
+    PYTHONPATH=src python -m tests.bench.llm
+"""
+
+def percentile(samples: list[float], p: float) -> float:
+    """The p-th percentile of the samples, by nearest rank."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))]
@@ -0,0 +1,113 @@
+"""
+Prompt size and latency benchmark of the context window.
+
+Builds the conversation for a new message in chats of increasing length,
+once with the whole history and once fitted to the token budget with a
+rolling summary of the older turns, as the context window keeps it. Reports
+the prompt size and the end-to-end latency of the turn's two model calls
+(intent and response) against the fake LLM server, whose prefill time grows
+with the prompt as a real model's does.
+
+    cd api && PYTHONPATH=src python -m tests.bench.context
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Any, Optional
+
+from api.clients.http import create_client
+from api.clients.llm import OpenAIProvider
+from api.context import ContextWindow, estimate_tokens
+from api.routes import IntentClassification
+from tests.bench import percentile
+from tests.fake_llm import create_app, serve
+
+WORDS = (
+    "the dishwasher filter drain pump error code reset warranty part order "
+    "door seal leak water cycle heating element noise display button model"
+).split()
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choices(WORDS, k=words)).capitalize() + "."
+
+def history(turns: int, rng: random.Random) -> list[dict[str, Any]]:
+    messages = [{"id": 1, "role": "system", "content": "You are a support assistant."}]
+    for _ in range(turns):
+        messages.append({"id": len(messages) + 1, "role": "user", "content": sentence(rng, 30)})
+        messages.append({"id": len(messages) + 1, "role": "assistant", "content": sentence(rng, 100)})
+    return messages
+
+def steady_summary(
+    context: ContextWindow,
+    messages: list[dict[str, Any]],
+    rng: random.Random
+) -> Optional[dict[str, Any]]:
+    """
+    The summary the context window settles on, with the older turns folded
+    in until the rest fit in half the budget.
+    """
+    turns = [msg for msg in messages if msg["role"] != "system"]
+    if sum(estimate_tokens(msg["content"]) for msg in turns) <= context.token_budget:
+        return None
+    remaining = context.token_budget // 2
+    for (i, msg) in enumerate(reversed(turns)):
+        remaining -= estimate_tokens(msg["content"])
+        if remaining < 0:
+            return {"summary": sentence(rng, 200), "summary_upto": turns[-i - 1]["id"]}
+    return None
+
+async def turn_latencies(
+    llm: OpenAIProvider,
+    build,
+    repeat: int
+) -> list[float]:
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conversation = build()
+        await llm.call("determine_intent", "Classify.", {"messages": conversation}, IntentClassification)
+        await llm.call("bake_response", "Answer.", {"messages": conversation})
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+async def run(url: str, args: argparse.Namespace) -> None:
+    http = create_client(http2=False)
+    llm = OpenAIProvider(http, url)
+    rng = random.Random(0)
+    print(f"{'context':<8}{'turns':>8}{'prompt KiB':>12}{'p50 ms':>10}{'p99 ms':>10}")
+    try:
+        for turns in args.turns:
+            messages = history(turns, rng)
+            content = sentence(rng, 30)
+            full = ContextWindow(None, llm, token_budget=0)
+            window = ContextWindow(None, llm, token_budget=args.budget)
+            summary = steady_summary(window, messages, rng)
+            for (name, context, context_summary) in [("full", full, None), ("window", window, summary)]:
+                def build():
+                    return context.build(messages, context_summary, content)
+                size = len(json.dumps(build()))
+                latencies = await turn_latencies(llm, build, args.repeat)
+                print(
+                    f"{name:<8}{turns:>8}{size / 1024:>12.1f}"
+                    f"{percentile(latencies, 50) * 1000:>10.0f}"
+                    f"{percentile(latencies, 99) * 1000:>10.0f}"
+                )
+    finally:
+        await http.aclose()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--budget", type=int, default=3000, help="Token budget of the window")
+    parser.add_argument("--latency", type=float, default=0.05, help="Model latency in seconds")
+    parser.add_argument("--prefill", type=float, default=0.05, help="Seconds per 1000 prompt tokens")
+    parser.add_argument("--repeat", type=int, default=5, help="Turns timed per chat")
+    args = parser.parse_args()
+
+    with serve(create_app(args.latency, prefill=args.prefill)) as url:
+        asyncio.run(run(url, args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Latency benchmark of knowledge base searches.
+
+Compares the keyword scan the routes used to run over every item with the
+BM25 and vector indexes, on synthetic items drawn from the vocabulary of the
+bundled knowledge base, at increasing numbers of items.
+
+    cd api && PYTHONPATH=src python -m tests.bench.knowledge
+"""
+import argparse
+import json
+import random
+import time
+from typing import Any, Callable, Optional
+
+from api.knowledge.search import create_index
+from tests.bench import percentile
+
+CATEGORIES = ["troubleshooting", "policy", "service", "parts"]
+
+def vocabulary(path: str) -> list[str]:
+    words = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            item = json.loads(line)
+            words.update(f"{item['title']} {item['content']}".lower().split())
+    return sorted(words)
+
+def synthetic_items(words: list[str], count: int, rng: random.Random) -> list[dict[str, Any]]:
+    return [
+        {
+            "id": f"kb-{i}",
+            "title": " ".join(rng.choices(words, k=6)),
+            "content": " ".join(rng.choices(words, k=40)),
+            "category": rng.choice(CATEGORIES),
+            "tags": rng.choices(words, k=3),
+        }
+        for i in range(count)
+    ]
+
+def scan(
+    items: list[dict[str, Any]],
+    query: str,
+    category: Optional[str] = None,
+    limit: int = 5
+) -> list[dict[str, Any]]:
+    """The keyword overlap scan the routes ran before there was an index."""
+    query_terms = query.lower().split()
+    results = []
+    for item in items:
+        if category and item.get("category") != category:
+            continue
+        content_text = (item["title"] + " " + item["content"]).lower()
+        score = sum(1 for term in query_terms if term in content_text)
+        if score > 0:
+            results.append({**item, "relevance_score": score / len(query_terms)})
+    results.sort(key=lambda x: x["relevance_score"], reverse=True)
+    return results[:limit]
+
+def time_queries(search: Callable, queries: list[tuple[str, Optional[str]]]) -> list[float]:
+    latencies = []
+    for (query, category) in queries:
+        start = time.perf_counter()
+        search(query, category=category)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=50, help="Queries per engine and size")
+    parser.add_argument("--source", default="data/knowledge_base.jsonl", help="Vocabulary source")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    words = vocabulary(args.source)
+    print(f"{'engine':<8}{'items':>8}{'build ms':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for size in args.sizes:
+        items = synthetic_items(words, size, rng)
+        queries = [
+            (" ".join(rng.choices(words, k=8)), rng.choice([None, *CATEGORIES]))
+            for _ in range(args.queries)
+        ]
+        engines: list[tuple[str, Callable, float]] = [
+            ("scan", lambda query, category: scan(items, query, category), 0.0)
+        ]
+        for mode in ["bm25", "vector"]:
+            start = time.perf_counter()
+            index = create_index(mode, items)
+            engines.append((mode, index.search, time.perf_counter() - start))
+
+        for (name, search, build) in engines:
+            latencies = time_queries(search, queries)
+            print(
+                f"{name:<8}{size:>8}{build * 1000:>10.0f}"
+                f"{percentile(latencies, 50) * 1000:>10.2f}"
+                f"{percentile(latencies, 99) * 1000:>10.2f}"
+            )
+
+if __name__ == "__main__":
+    main()
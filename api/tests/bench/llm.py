@@ -0,0 +1,74 @@
+"""
+Concurrency benchmark of model calls against the fake LLM server.
+
+Compares a blocking client called from the handler coroutine, as the Opper
+SDK was, with the async OpenAI-compatible provider on the shared pool, for
+increasing numbers of concurrent turns on one event loop.
+
+    cd api && PYTHONPATH=src python -m tests.bench.llm
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from api.clients.http import create_client
+from api.clients.llm import OpenAIProvider
+from tests.bench import percentile
+from tests.fake_llm import create_app, serve
+
+async def blocking_turns(url: str, concurrency: int) -> list[float]:
+    client = httpx.Client()
+
+    async def turn() -> float:
+        start = time.perf_counter()
+        # Wait for the loop as a request being received would, so the
+        # latency includes the time spent queued behind other turns
+        await asyncio.sleep(0)
+        response = client.post(f"{url}/chat/completions", json={"messages": []})
+        response.raise_for_status()
+        return time.perf_counter() - start
+
+    try:
+        return await asyncio.gather(*(turn() for _ in range(concurrency)))
+    finally:
+        client.close()
+
+async def async_turns(url: str, concurrency: int) -> list[float]:
+    http = create_client(
+        max_connections=concurrency, max_keepalive_connections=concurrency, http2=False
+    )
+    llm = OpenAIProvider(http, url)
+
+    async def turn() -> float:
+        start = time.perf_counter()
+        await llm.call("bake_response", "Answer.", {"messages": []})
+        return time.perf_counter() - start
+
+    try:
+        return await asyncio.gather(*(turn() for _ in range(concurrency)))
+    finally:
+        await http.aclose()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency", type=float, default=0.05, help="Model latency in seconds")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 100])
+    args = parser.parse_args()
+
+    with serve(create_app(args.latency)) as url:
+        print(f"{'client':<10}{'turns':>8}{'wall ms':>10}{'p50 ms':>10}{'p99 ms':>10}")
+        for concurrency in args.concurrency:
+            for (name, run) in [("blocking", blocking_turns), ("async", async_turns)]:
+                start = time.perf_counter()
+                latencies = asyncio.run(run(url, concurrency))
+                wall = time.perf_counter() - start
+                print(
+                    f"{name:<10}{concurrency:>8}{wall * 1000:>10.0f}"
+                    f"{percentile(latencies, 50) * 1000:>10.0f}"
+                    f"{percentile(latencies, 99) * 1000:>10.0f}"
+                )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Throughput benchmark of the log formatters.
+
+Formats the same records with the pretty and JSON formatters, and times
+logger calls as the caller sees them, with records written straight to the
+stream or handed to the listener thread through the queue.
+
+    cd api && PYTHONPATH=src python -m tests.bench.log
+"""
+import argparse
+import logging
+import os
+import time
+
+from api.utils import log
+
+def records(count: int) -> list[logging.LogRecord]:
+    # Records logged within a request share its context dict, as the filter
+    # copies the dict bound with `bind` rather than the fields in it
+    contexts = [{"request_id": f"req-{i}"} for i in range(100)]
+    made = []
+    for i in range(count):
+        record = logging.LogRecord(
+            "api.clients.couchbase", logging.INFO, __file__, 1,
+            "Added message %s to chat %s", (i, "6f1c2d3e-4b5a-6978-8a9b-0c1d2e3f4a5b"), None
+        )
+        record.context = contexts[i // 5 % 100]
+        made.append(record)
+    return made
+
+def format_rate(formatter: logging.Formatter, batch: list[logging.LogRecord]) -> float:
+    start = time.perf_counter()
+    for record in batch:
+        formatter.format(record)
+    return len(batch) / (time.perf_counter() - start)
+
+def logging_rate(log_format: str, use_queue: bool, count: int) -> float:
+    log.init("INFO", log_format, use_queue=use_queue)
+    root = logging.getLogger()
+    # Write to a file rather than the terminal, so writes still make system calls
+    stream = open(os.devnull, "w")
+    handler = log._listener.handlers[0] if use_queue else root.handlers[0]
+    handler.setStream(stream)
+    logger = log.get_logger("api.clients.couchbase")
+    start = time.perf_counter()
+    with log.bind(request_id="req-1"):
+        for i in range(count):
+            logger.info("Added message %s to chat %s", i, "6f1c2d3e-4b5a-6978-8a9b-0c1d2e3f4a5b")
+    rate = count / (time.perf_counter() - start)
+    log._stop_listener()
+    stream.close()
+    return rate
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--records", type=int, default=100_000)
+    args = parser.parse_args()
+
+    batch = records(args.records)
+    print(f"{'benchmark':<24}{'records/s':>12}")
+    # Alternate the formatters' rounds, so a noisy stretch doesn't favor one
+    formatters = {name: formatter("%(message)s") for (name, formatter) in log.FORMATTERS.items()}
+    rates = {name: 0.0 for name in formatters}
+    for _ in range(5):
+        for (name, formatter) in formatters.items():
+            rates[name] = max(rates[name], format_rate(formatter, batch))
+    for (name, rate) in rates.items():
+        print(f"{'format ' + name:<24}{rate:>12,.0f}")
+    for log_format in log.FORMATTERS:
+        for use_queue in [False, True]:
+            rate = logging_rate(log_format, use_queue, args.records)
+            name = f"log {log_format} {'queued' if use_queue else 'direct'}"
+            print(f"{name:<24}{rate:>12,.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Load test of chat turns against an in-memory stand-in for Couchbase.
+
+Every KV round trip to the stand-in sleeps for a fixed latency, as a network
+hop would. Each chat runs turns that read the chat, read its history and add
+a question and an answer. The synchronous client called from the handler
+coroutines, as the routes did, runs them one at a time; the async client
+overlaps them on its thread pool. Turn latencies include the time a turn
+waits for the event loop.
+
+    cd api && PYTHONPATH=src python -m tests.bench.store
+"""
+import argparse
+import asyncio
+import functools
+import time
+from typing import Any
+
+from api.clients.couchbase import AsyncCouchbaseChatClient, CouchbaseChatClient
+from tests.bench import percentile
+from tests.fakes import FakeCollection, fake_client
+
+class SlowCollection:
+    """A fake collection whose operations each take `latency` seconds."""
+    def __init__(self, collection: FakeCollection, latency: float):
+        self.collection = collection
+        self.latency = latency
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self.collection, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def slow(*args: Any, **kwargs: Any) -> Any:
+            time.sleep(self.latency)
+            return attr(*args, **kwargs)
+        return slow
+
+def slow_client(latency: float) -> CouchbaseChatClient:
+    db = fake_client()
+    db.chats = SlowCollection(db.chats, latency)
+    db.messages = SlowCollection(db.messages, latency)
+    return db
+
+async def sync_turns(db: CouchbaseChatClient, chat_ids: list[str], turns: int) -> list[float]:
+    async def chat(chat_id: str) -> list[float]:
+        latencies = []
+        for i in range(turns):
+            start = time.perf_counter()
+            # Wait for the loop as a request being received would, so the
+            # latency includes the time spent queued behind other chats
+            await asyncio.sleep(0)
+            db.get_chat(chat_id)
+            db.get_messages(chat_id)
+            db.add_messages(chat_id, [("user", f"q{i}", None), ("assistant", f"a{i}", None)])
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    results = await asyncio.gather(*(chat(chat_id) for chat_id in chat_ids))
+    return [latency for latencies in results for latency in latencies]
+
+async def async_turns(db: CouchbaseChatClient, chat_ids: list[str], turns: int) -> list[float]:
+    store = AsyncCouchbaseChatClient(db, max_workers=len(chat_ids))
+
+    async def chat(chat_id: str) -> list[float]:
+        latencies = []
+        for i in range(turns):
+            start = time.perf_counter()
+            await asyncio.sleep(0)
+            await store.get_chat(chat_id)
+            await store.get_messages(chat_id)
+            await store.add_messages(chat_id, [("user", f"q{i}", None), ("assistant", f"a{i}", None)])
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    try:
+        results = await asyncio.gather(*(chat(chat_id) for chat_id in chat_ids))
+    finally:
+        await store.close()
+    return [latency for latencies in results for latency in latencies]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency", type=float, default=0.002, help="KV round trip in seconds")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 100, 200])
+    parser.add_argument("--turns", type=int, default=3, help="Turns per chat")
+    args = parser.parse_args()
+
+    print(f"{'client':<8}{'chats':>8}{'wall ms':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for concurrency in args.concurrency:
+        for (name, run) in [("sync", sync_turns), ("async", async_turns)]:
+            db = slow_client(args.latency)
+            chat_ids = [db.create_chat() for _ in range(concurrency)]
+            start = time.perf_counter()
+            latencies = asyncio.run(run(db, chat_ids, args.turns))
+            wall = time.perf_counter() - start
+            print(
+                f"{name:<8}{concurrency:>8}{wall * 1000:>10.0f}"
+                f"{percentile(latencies, 50) * 1000:>10.0f}"
+                f"{percentile(latencies, 99) * 1000:>10.0f}"
+            )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import threading
+import time
+from typing import Any, Iterator
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+#### Fake LLM ####
+
+def create_app(
+    latency: float = 0.05,
+    content: str = "Hello from the fake model!",
+    prefill: float = 0.0
+) -> FastAPI:
+    """
+    An OpenAI-compatible chat completions server answering after a fixed
+    latency, plus a prefill time growing with the prompt, standing in for
+    the Kong AI route in tests and benchmarks.
+
+    Requests in JSON mode get `{"thoughts": ..., "intent": "troubleshooting"}`;
+    other requests get `content`, streamed word by word over SSE if asked.
+
+    Args:
+        latency: Seconds before each response, or before the first delta
+        content: Text of plain responses
+        prefill: Extra seconds per 1000 prompt tokens, estimated from the body size
+    """
+    app = FastAPI()
+    app.state.requests = 0
+
+    def completion(text: str) -> dict[str, Any]:
+        return {
+            "id": f"chatcmpl-{app.state.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "fake",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop",
+            }],
+        }
+
+    async def deltas():
+        for (i, word) in enumerate(content.split(" ")):
+            chunk = {"choices": [{"index": 0, "delta": {"content": word if i == 0 else f" {word}"}}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(0)
+        yield "data: [DONE]\n\n"
+
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        raw = await request.body()
+        body = json.loads(raw)
+        app.state.requests += 1
+        await asyncio.sleep(latency + prefill * len(raw) / 4000)
+        if body.get("stream"):
+            return StreamingResponse(deltas(), media_type="text/event-stream")
+        if body.get("response_format", {}).get("type") == "json_object":
+            return JSONResponse(completion(json.dumps({
+                "thoughts": "The user needs help with their appliance.",
+                "intent": "troubleshooting",
+            })))
+        return JSONResponse(completion(content))
+
+    return app
+
+@contextlib.contextmanager
+def serve(app: FastAPI) -> Iterator[str]:
+    """
+    Serve an app with uvicorn on a free local port, from a background thread.
+
+    Yields:
+        The base URL of the server
+    """
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, port=0, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join()
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run the fake LLM server")
+    parser.add_argument("--port", type=int, default=32000)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per response")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency), host="0.0.0.0", port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+import asyncio
+import copy
+import itertools
+import threading
+from typing import Any, Optional
+
+from couchbase.exceptions import (
+    CasMismatchException,
+    DocumentExistsException,
+    DocumentNotFoundException
+)
+from couchbase.subdocument import SubDocOp
+
+from fastapi import FastAPI
+import httpx
+
+from api.clients.couchbase import AsyncCouchbaseChatClient, CouchbaseChatClient
+from api.clients.http import AsyncClient
+from api.clients.llm import OpenAIProvider
+from api.knowledge.store import KnowledgeStore
+from api.routes import router
+from tests.fake_llm import create_app
+
+#### Fake Couchbase ####
+
+class Result:
+    """A KV or scan result."""
+    def __init__(self, key: str, value: Any = None, cas: int = 0):
+        self.id = key
+        self.key = key
+        self.value = value
+        self.content = value
+        self.cas = cas
+        self.content_as = {dict: value, int: value}
+
+class MultiResult:
+    """A batched KV result."""
+    def __init__(self, results: dict[str, Result], exceptions: dict[str, Exception]):
+        self.results = results
+        self.exceptions = exceptions
+        self.all_ok = not exceptions
+
+def _options(options: tuple, kwargs: dict[str, Any]) -> dict[str, Any]:
+    merged = {}
+    for option in options:
+        merged.update(option)
+    merged.update(kwargs)
+    return merged
+
+def _value(option: Any) -> Any:
+    return getattr(option, "value", option)
+
+class FakeBinary:
+    def __init__(self, collection: "FakeCollection"):
+        self.collection = collection
+
+    def increment(self, key: str, *options: Any, **kwargs: Any) -> Result:
+        opts = _options(options, kwargs)
+        delta = _value(opts.get("delta")) or 1
+        with self.collection.lock:
+            if key in self.collection.docs:
+                self.collection._write(key, self.collection.docs[key] + delta, opts)
+            else:
+                self.collection._write(key, _value(opts.get("initial")) or 0, opts)
+            return self.collection._result(key)
+
+class FakeCollection:
+    """
+    In-memory stand-in for a Couchbase collection, implementing the KV,
+    sub-document and scan operations the chat store uses. Thread-safe, so
+    it can back the async client's worker threads. Expiries are recorded
+    but never enforced.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.docs: dict[str, Any] = {}
+        self.cas: dict[str, int] = {}
+        self.expiry: dict[str, Any] = {}
+        self.ops = 0
+        self.lock = threading.RLock()
+        self._cas = itertools.count(1)
+
+    def _write(self, key: str, value: Any, opts: dict[str, Any]) -> None:
+        self.ops += 1
+        self.docs[key] = copy.deepcopy(value)
+        self.cas[key] = next(self._cas)
+        if opts.get("expiry"):
+            self.expiry[key] = opts["expiry"]
+
+    def _result(self, key: str) -> Result:
+        return Result(key, copy.deepcopy(self.docs[key]), self.cas[key])
+
+    def _check(self, key: str, opts: dict[str, Any]) -> None:
+        if key not in self.docs:
+            raise DocumentNotFoundException()
+        if opts.get("cas") and opts["cas"] != self.cas[key]:
+            raise CasMismatchException()
+
+    def binary(self) -> FakeBinary:
+        return FakeBinary(self)
+
+    def get(self, key: str, *options: Any, **kwargs: Any) -> Result:
+        with self.lock:
+            self.ops += 1
+            if key not in self.docs:
+                raise DocumentNotFoundException()
+            return self._result(key)
+
+    def exists(self, key: str, *options: Any, **kwargs: Any) -> Result:
+        with self.lock:
+            self.ops += 1
+            result = Result(key, cas=self.cas.get(key, 0))
+            result.exists = key in self.docs
+            return result
+
+    def upsert(self, key: str, value: Any, *options: Any, **kwargs: Any) -> Result:
+        with self.lock:
+            self._write(key, value, _options(options, kwargs))
+            return Result(key, cas=self.cas[key])
+
+    def insert(self, key: str, value: Any, *options: Any, **kwargs: Any) -> Result:
+        with self.lock:
+            if key in self.docs:
+                raise DocumentExistsException()
+            return self.upsert(key, value, *options, **kwargs)
+
+    def replace(self, key: str, value: Any, *options: Any, **kwargs: Any) -> Result:
+        with self.lock:
+            opts = _options(options, kwargs)
+            self._check(key, opts)
+            self._write(key, value, opts)
+            return Result(key, cas=self.cas[key])
+
+    def remove(self, key: str, *options: Any, **kwargs: Any) -> Result:
+        with self.lock:
+            self.ops += 1
+            self._check(key, _options(options, kwargs))
+            del self.docs[key]
+            self.expiry.pop(key, None)
+            return Result(key)
+
+    def touch(self, key: str, expiry: Any, *options: Any, **kwargs: Any) -> Result:
+        with self.lock:
+            self.ops += 1
+            self._check(key, {})
+            self.expiry[key] = expiry
+            return Result(key, cas=self.cas[key])
+
+    def _multi(self, keys, op) -> MultiResult:
+        results = {}
+        exceptions = {}
+        for key in keys:
+            try:
+                results[key] = op(key)
+            except Exception as e:
+                exceptions[key] = e
+        return MultiResult(results, exceptions)
+
+    def get_multi(self, keys: list[str], *options: Any, **kwargs: Any) -> MultiResult:
+        return self._multi(keys, self.get)
+
+    def exists_multi(self, keys: list[str], *options: Any, **kwargs: Any) -> MultiResult:
+        return self._multi(keys, self.exists)
+
+    def insert_multi(self, docs: dict[str, Any], *options: Any, **kwargs: Any) -> MultiResult:
+        return self._multi(docs, lambda key: self.insert(key, docs[key], *options, **kwargs))
+
+    def upsert_multi(self, docs: dict[str, Any], *options: Any, **kwargs: Any) -> MultiResult:
+        return self._multi(docs, lambda key: self.upsert(key, docs[key], *options, **kwargs))
+
+    def remove_multi(self, keys: list[str], *options: Any, **kwargs: Any) -> MultiResult:
+        return self._multi(keys, self.remove)
+
+    def touch_multi(self, keys: list[str], expiry: Any, *options: Any, **kwargs: Any) -> MultiResult:
+        return self._multi(keys, lambda key: self.touch(key, expiry))
+
+    def mutate_in(self, key: str, specs: list, *options: Any, **kwargs: Any) -> Result:
+        with self.lock:
+            opts = _options(options, kwargs)
+            self._check(key, opts)
+            doc = self.docs[key]
+            for spec in specs:
+                (op, path, value) = (spec[0], spec[1], spec[-1])
+                *parents, field = path.split(".")
+                target = doc
+                for parent in parents:
+                    target = target.setdefault(parent, {})
+                if op == SubDocOp.DICT_UPSERT:
+                    target[field] = copy.deepcopy(value)
+                elif op == SubDocOp.ARRAY_PUSH_LAST:
+                    target.setdefault(field, []).extend(copy.deepcopy(list(value)))
+                elif op == SubDocOp.REMOVE:
+                    target.pop(field, None)
+                else:
+                    raise NotImplementedError(op)
+            self.ops += 1
+            self.cas[key] = next(self._cas)
+            if opts.get("expiry"):
+                self.expiry[key] = opts["expiry"]
+            return Result(key, cas=self.cas[key])
+
+    def scan(self, scan_type: Any, *options: Any, **kwargs: Any):
+        opts = _options(options, kwargs)
+        prefix = getattr(scan_type, "_prefix", None)
+        start = getattr(getattr(scan_type, "_start", None), "_term", None)
+        end = getattr(getattr(scan_type, "_end", None), "_term", None)
+        with self.lock:
+            self.ops += 1
+            keys = sorted(self.docs)
+            results = []
+            for key in keys:
+                if prefix is not None and not key.startswith(prefix):
+                    continue
+                if start is not None and key < start:
+                    continue
+                if end is not None and key > end:
+                    continue
+                result = self._result(key)
+                if opts.get("ids_only"):
+                    result.value = result.content = None
+                    result.content_as = {dict: None}
+                results.append(result)
+        return iter(results)
+
+class FakeScope:
+    def __init__(self):
+        self.collections: dict[str, FakeCollection] = {}
+
+    def collection(self, name: str) -> FakeCollection:
+        return self.collections.setdefault(name, FakeCollection(name))
+
+class FakeCluster:
+    """
+    Stand-in for a cluster's query service, answering each statement with
+    the rows registered for the first fragment it contains. The first
+    `failures` statements fail, as while the cluster is still starting.
+    """
+    def __init__(self, failures: int = 0):
+        self.statements: list[str] = []
+        self.answers: list[tuple[str, list[dict[str, Any]]]] = []
+        self.failures = failures
+
+    def answer(self, fragment: str, rows: list[dict[str, Any]]) -> None:
+        self.answers.append((fragment, rows))
+
+    def query(self, statement: str, *options: Any, **kwargs: Any) -> list[dict[str, Any]]:
+        self.statements.append(statement)
+        if len(self.statements) <= self.failures:
+            raise ConnectionError("The query service isn't up yet")
+        for (fragment, rows) in self.answers:
+            if fragment in statement:
+                return copy.deepcopy(rows)
+        return []
+
+    def close(self) -> None:
+        pass
+
+def fake_client(retention: Optional[Any] = None) -> CouchbaseChatClient:
+    """A chat store on a fake, connected cluster."""
+    client = CouchbaseChatClient(
+        url="couchbase://fake",
+        bucket_name="main",
+        retention=retention
+    )
+    client.cluster = FakeCluster()
+    client.scope = FakeScope()
+    client.chats = client.scope.collection(client.chats_coll)
+    client.messages = client.scope.collection(client.messages_coll)
+    return client
+
+#### Fake API ####
+
+def fake_api(db: AsyncCouchbaseChatClient, **state: Any) -> FastAPI:
+    """
+    The API's routes on a ready chat store and the fake LLM server, without
+    the lifespan. Other app state, such as caches, is None unless given.
+    """
+    app = FastAPI()
+    app.include_router(router, prefix="/api")
+    db.ready = True
+    http = AsyncClient(transport=httpx.ASGITransport(app=create_app(latency=0)), base_url="http://fake")
+    app.state.db = db
+    app.state.llm = OpenAIProvider(http, "http://fake", model="fake")
+    app.state.knowledge = KnowledgeStore(source=None)
+    app.state.context = None
+    app.state.intent_cache = None
+    app.state.response_cache = None
+    for (name, value) in state.items():
+        setattr(app.state, name, value)
+    return app
+
+def call_api(app: FastAPI, method: str, path: str, **kwargs: Any) -> httpx.Response:
+    """Make one request to the app, returning server errors as 500 responses."""
+    async def run() -> httpx.Response:
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://api") as client:
+            return await client.request(method, path, **kwargs)
+    return asyncio.run(run())
@@ -0,0 +1,51 @@
+import os
+from datetime import timedelta
+
+import pytest
+
+from api.clients.couchbase import CHAT_CLIENT_INDEX, CHAT_LIST_INDEX, CouchbaseChatClient
+from tests.fakes import fake_client
+
+def plan(index: str, sort: bool = False) -> list[dict]:
+    """An EXPLAIN result in the shape the query service returns."""
+    children = [
+        {"#operator": "IndexScan3", "index": index, "index_order": [{"keypos": 0, "desc": True}]},
+        {"#operator": "Fetch", "keyspace": "chats"},
+        {"#operator": "Filter"},
+        {"#operator": "InitialProject"},
+    ]
+    if sort:
+        children.append({"#operator": "Order", "sort_terms": [{"expr": "updated_at", "desc": True}]})
+    return [{"plan": {"#operator": "Sequence", "~children": children}}]
+
+def client_with_plans(listing: list[dict], by_client: list[dict]) -> CouchbaseChatClient:
+    db = fake_client()
+    db.cluster.answer("metadata.`client_id`", by_client)
+    db.cluster.answer("EXPLAIN", listing)
+    return db
+
+def test_indexed_listings_pass():
+    db = client_with_plans(plan(CHAT_LIST_INDEX), plan(CHAT_CLIENT_INDEX))
+    assert db.check_chat_list_indexes()
+    assert all(statement.startswith("EXPLAIN") for statement in db.cluster.statements)
+
+@pytest.mark.parametrize("listing,by_client", [
+    (plan("#primary"), plan(CHAT_CLIENT_INDEX)),
+    (plan(CHAT_LIST_INDEX), plan(CHAT_LIST_INDEX)),
+    (plan(CHAT_LIST_INDEX, sort=True), plan(CHAT_CLIENT_INDEX)),
+    ([], plan(CHAT_CLIENT_INDEX)),
+])
+def test_unindexed_or_sorted_listings_fail(listing, by_client):
+    assert not client_with_plans(listing, by_client).check_chat_list_indexes()
+
+@pytest.mark.skipif(not os.getenv("COUCHBASE_URL"), reason="needs COUCHBASE_URL")
+def test_live_listings_use_their_indexes():
+    db = CouchbaseChatClient(
+        url=os.environ["COUCHBASE_URL"],
+        username=os.getenv("COUCHBASE_USERNAME"),
+        password=os.getenv("COUCHBASE_PASSWORD"),
+        bucket_name=os.getenv("COUCHBASE_BUCKET", "main"),
+        ready_timeout=timedelta(seconds=30)
+    )
+    with db:
+        assert db.check_chat_list_indexes(), "run util/init-couchbase to create the chat listing indexes"
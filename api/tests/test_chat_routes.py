@@ -0,0 +1,98 @@
+import asyncio
+import json
+
+import httpx
+
+from api.clients.couchbase import AsyncCouchbaseChatClient
+from api.main import count_store_round_trips
+from tests.fakes import call_api, fake_api, fake_client
+
+def post(app, path: str, **kwargs) -> httpx.Response:
+    return call_api(app, "POST", path, **kwargs)
+
+def new_chat() -> tuple[AsyncCouchbaseChatClient, str]:
+    db = AsyncCouchbaseChatClient(fake_client())
+    return (db, asyncio.run(db.create_chat()))
+
+def stream(db: AsyncCouchbaseChatClient, chat_id: str) -> list[dict]:
+    response = post(fake_api(db), f"/api/chats/{chat_id}/messages/stream", json={"content": "Hi"})
+    return [json.loads(line) for line in response.text.splitlines()]
+
+def test_turn_saves_both_messages():
+    (db, chat_id) = new_chat()
+    response = post(fake_api(db), f"/api/chats/{chat_id}/messages", json={"content": "Hi"})
+    body = response.json()
+    assert body["response"]["content"] == "Hello from the fake model!"
+    assert body["response"]["id"] > body["message"]["id"]
+    history = db.client.get_messages(chat_id)
+    assert [(m["id"], m["role"]) for m in history] == [
+        (body["message"]["id"], "user"), (body["response"]["id"], "assistant")
+    ]
+
+def test_turn_keeps_the_user_message_when_the_model_fails():
+    (db, chat_id) = new_chat()
+    app = fake_api(db)
+
+    async def fail(*args, **kwargs):
+        raise TimeoutError()
+
+    async def run():
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://api") as client:
+            response = await client.post(f"/api/chats/{chat_id}/messages", json={"content": "Hi"})
+        # The shielded write may finish after the failed response is sent
+        for _ in range(100):
+            if messages := db.client.get_messages(chat_id):
+                return (response, messages)
+            await asyncio.sleep(0.01)
+        return (response, [])
+
+    app.state.llm.call = fail
+    (response, messages) = asyncio.run(run())
+    assert response.status_code == 500
+    assert [(m["role"], m["content"]) for m in messages] == [("user", "Hi")]
+
+def test_history_leaves_out_the_new_message():
+    (db, chat_id) = new_chat()
+    asyncio.run(db.add_message(chat_id, "user", "Earlier"))
+    app = fake_api(db)
+    sent = []
+    call = app.state.llm.call
+
+    async def record(name, instructions, input, *args, **kwargs):
+        sent.append([m["content"] for m in input["messages"]])
+        return await call(name, instructions, input, *args, **kwargs)
+
+    app.state.llm.call = record
+    post(app, f"/api/chats/{chat_id}/messages", json={"content": "Hi"})
+    assert sent and all(contents.count("Hi") == 1 for contents in sent)
+
+def test_turn_reports_store_round_trips():
+    (db, chat_id) = new_chat()
+    asyncio.run(db.add_message(chat_id, "user", "Earlier"))
+    app = fake_api(db)
+    app.middleware("http")(count_store_round_trips)
+    response = post(app, f"/api/chats/{chat_id}/messages", json={"content": "Hi"})
+    # Chat get, manifest get and batched message get for the history, then
+    # four round trips for each of the two messages saved
+    assert response.headers["X-Store-Round-Trips"] == "11"
+
+def test_stream_ends_with_stored_response():
+    (db, chat_id) = new_chat()
+    events = stream(db, chat_id)
+    assert [event["type"] for event in events[:2]] == ["message", "delta"]
+    assert events[-1]["type"] == "response"
+    assert events[-1]["response"]["content"] == "Hello from the fake model!"
+
+def test_stream_reports_failed_save():
+    (db, chat_id) = new_chat()
+    add_message = db.add_message
+
+    async def fail_for_assistant(chat_id, role, *args, **kwargs):
+        if role == "assistant":
+            raise TimeoutError()
+        return await add_message(chat_id, role, *args, **kwargs)
+
+    db.add_message = fail_for_assistant
+    events = stream(db, chat_id)
+    assert events[-1] == {"type": "error", "detail": "Failed to save response"}
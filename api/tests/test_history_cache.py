@@ -0,0 +1,78 @@
+import asyncio
+import threading
+
+from api.cache import MemoryCache
+from api.clients.couchbase import AsyncCouchbaseChatClient
+from tests.fakes import fake_client
+
+def test_memory_cache_returns_copies():
+    async def run():
+        cache = MemoryCache("history")
+        history = [{"id": 1}]
+        await cache.set("chat", history)
+        history.append({"id": 2})
+        cached = await cache.get("chat")
+        await cache.append("chat", {"id": 3})
+        assert cached == [{"id": 1}]
+        assert await cache.get("chat") == [{"id": 1}, {"id": 3}]
+    asyncio.run(run())
+
+def test_fill_racing_a_write_isnt_cached():
+    raw = fake_client()
+    read = threading.Event()
+    written = threading.Event()
+    get_messages = raw.get_messages
+
+    def slow_get_messages(chat_id, *args):
+        messages = get_messages(chat_id, *args)
+        read.set()
+        written.wait(5)
+        return messages
+    raw.get_messages = slow_get_messages
+
+    async def run():
+        db = AsyncCouchbaseChatClient(raw, history_cache=MemoryCache("history"))
+        chat_id = await db.create_chat()
+        await db.add_message(chat_id, "user", "first")
+        # Evicted, say
+        await db.history_cache.delete(chat_id)
+
+        fill = asyncio.create_task(db.get_messages(chat_id))
+        assert await asyncio.to_thread(read.wait, 5)
+        await db.add_message(chat_id, "assistant", "second")
+        written.set()
+        assert [m["content"] for m in await fill] == ["first"]
+
+        assert [m["content"] for m in await db.get_messages(chat_id)] == ["first", "second"]
+        assert [m["content"] for m in await db.get_messages(chat_id)] == ["first", "second"]
+    asyncio.run(run())
+
+def test_delete_invalidates_after_the_store_delete():
+    async def run():
+        db = AsyncCouchbaseChatClient(fake_client(), history_cache=MemoryCache("history"))
+        chat_id = await db.create_chat()
+        await db.add_message(chat_id, "user", "hello")
+        assert len(await db.get_messages(chat_id)) == 1
+        assert await db.delete_chat(chat_id)
+        assert await db.history_cache.get(chat_id) is None
+        assert await db.get_messages(chat_id) == []
+    asyncio.run(run())
+
+def test_unknown_chat_leaves_nothing_behind():
+    async def run():
+        raw = fake_client()
+        db = AsyncCouchbaseChatClient(raw, history_cache=MemoryCache("history"))
+        assert await db.get_messages("missing") == []
+        assert raw.messages.docs == {}
+        assert len(db.history_cache) == 0
+    asyncio.run(run())
+
+def test_new_chats_are_cached_empty():
+    async def run():
+        raw = fake_client()
+        db = AsyncCouchbaseChatClient(raw, history_cache=MemoryCache("history"))
+        chat_id = await db.create_chat()
+        ops = raw.messages.ops
+        assert await db.get_messages(chat_id) == []
+        assert raw.messages.ops == ops
+    asyncio.run(run())
@@ -0,0 +1,55 @@
+import asyncio
+
+from api.clients.couchbase import AsyncCouchbaseChatClient
+from tests.fakes import call_api, fake_api, fake_client
+
+def chat_with_messages(count: int):
+    db = AsyncCouchbaseChatClient(fake_client())
+    chat_id = asyncio.run(db.create_chat())
+    asyncio.run(db.add_messages(chat_id, [("user", f"m{i}", None) for i in range(count)]))
+    ids = asyncio.run(db.get_message_ids(chat_id))
+    return (fake_api(db), chat_id, ids)
+
+def history(app, chat_id: str, headers: dict = None, **params):
+    return call_api(app, "GET", f"/api/chats/{chat_id}/messages", params=params, headers=headers)
+
+def page(response) -> tuple[list[int], bool]:
+    assert response.status_code == 200
+    body = response.json()
+    return ([m["id"] for m in body["messages"]], body["has_more"])
+
+def test_pages():
+    (app, chat_id, ids) = chat_with_messages(5)
+    assert page(history(app, chat_id)) == (ids, False)
+    assert page(history(app, chat_id, limit=2)) == (ids[3:], True)
+    assert page(history(app, chat_id, limit=2, before=ids[3])) == (ids[1:3], True)
+    assert page(history(app, chat_id, limit=2, before=ids[2])) == (ids[:2], False)
+    assert page(history(app, chat_id, limit=2, after=ids[0])) == (ids[1:3], True)
+    assert page(history(app, chat_id, limit=3, after=ids[1])) == (ids[2:], False)
+
+def test_since():
+    (app, chat_id, ids) = chat_with_messages(3)
+    assert page(history(app, chat_id, since=ids[0])) == (ids[1:], False)
+    response = history(app, chat_id, since=ids[-1])
+    assert response.status_code == 304
+    assert response.headers["ETag"].startswith('W/"')
+    assert history(app, chat_id, since=ids[0], after=ids[0]).status_code == 400
+
+def test_etag():
+    (app, chat_id, ids) = chat_with_messages(3)
+    etag = history(app, chat_id).headers["ETag"]
+    assert etag.startswith('W/"') and etag.endswith('"')
+    assert history(app, chat_id, limit=2).headers["ETag"] != etag
+
+    for if_none_match in [etag, etag.removeprefix("W/"), "*", f'"other", {etag}']:
+        response = history(app, chat_id, headers={"If-None-Match": if_none_match})
+        assert response.status_code == 304, if_none_match
+        assert response.headers["ETag"] == etag
+        assert response.content == b""
+    assert history(app, chat_id, headers={"If-None-Match": '"other"'}).status_code == 200
+
+    db = app.state.db
+    asyncio.run(db.add_message(chat_id, "assistant", "new"))
+    response = history(app, chat_id, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
@@ -0,0 +1,42 @@
+import asyncio
+
+import httpx
+
+from api.clients.http import AsyncClient
+
+def client(handler, **kwargs) -> AsyncClient:
+    return AsyncClient(transport=httpx.MockTransport(handler), backoff=0.001, **kwargs)
+
+def test_retries_idempotent_requests():
+    attempts = []
+
+    def handler(request):
+        attempts.append(request.method)
+        return httpx.Response(503 if len(attempts) < 3 else 200)
+
+    async def run():
+        http = client(handler, retries=2)
+        assert (await http.get("http://api/")).status_code == 200
+        attempts.clear()
+        assert (await http.post("http://api/")).status_code == 503
+        assert attempts == ["POST"]
+        attempts.clear()
+        assert (await http.request("POST", "http://api/", idempotent=True)).status_code == 200
+    asyncio.run(run())
+
+def test_hedges_slow_requests():
+    attempts = []
+
+    async def handler(request):
+        attempts.append(request)
+        if len(attempts) == 1:
+            await asyncio.sleep(1)
+            return httpx.Response(200, text="slow")
+        return httpx.Response(200, text="fast")
+
+    async def run():
+        http = client(handler, hedge_delay=0.01)
+        response = await http.request("POST", "http://api/", idempotent=True, hedge=True)
+        assert response.text == "fast"
+        assert len(attempts) == 2
+    asyncio.run(run())
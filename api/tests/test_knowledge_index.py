@@ -0,0 +1,38 @@
+from api.knowledge.index import InvertedIndex
+
+ITEMS = [
+    {"id": "1", "title": "Dishwasher not draining", "content": "Clean the filter.", "category": "troubleshooting"},
+    {"id": "2", "title": "Warranty coverage", "content": "Two years on parts.", "category": "policy"},
+    {"id": "3", "title": "Replacement filter", "content": "Order a dishwasher filter.", "category": "parts"},
+]
+
+def test_search_ranks_and_filters():
+    index = InvertedIndex()
+    index.build(ITEMS)
+    assert [item["id"] for item in index.search("dishwasher filter")][:2] in (["1", "3"], ["3", "1"])
+    assert [item["id"] for item in index.search("dishwasher filter", category="parts")] == ["3"]
+    assert index.search("dishwasher", category="policy") == []
+
+def test_build_replaces_contents():
+    index = InvertedIndex()
+    index.build(ITEMS)
+    index.build([{**ITEMS[1], "title": "Old"}, ITEMS[1]])
+    assert len(index) == 1
+    assert index.total_length == index.doc_lengths["2"]
+    assert index.search("dishwasher") == []
+    assert [item["title"] for item in index.search("warranty")] == ["Warranty coverage"]
+
+def test_incremental_updates_match_a_rebuild():
+    index = InvertedIndex()
+    index.build(ITEMS[:2])
+    index.add(ITEMS[2])
+    index.add({**ITEMS[0], "content": "Run a rinse cycle."})
+    index.remove("2")
+    index.remove("missing")
+
+    rebuilt = InvertedIndex()
+    rebuilt.build([{**ITEMS[0], "content": "Run a rinse cycle."}, ITEMS[2]])
+    assert index.total_length == rebuilt.total_length
+    assert "warranty" not in index.postings
+    assert index.score("dishwasher filter rinse") == rebuilt.score("dishwasher filter rinse")
+    assert index.search("warranty") == []
@@ -0,0 +1,40 @@
+from api.knowledge.store import CouchbaseSource
+from tests.fakes import fake_client
+
+ITEMS = {
+    "1": {"title": "Dishwasher not draining", "content": "Clean the filter.", "category": "troubleshooting"},
+    "2": {"title": "Warranty coverage", "content": "Two years on parts.", "category": "policy"},
+}
+
+def source() -> tuple[CouchbaseSource, object]:
+    db = fake_client()
+    collection = db.scope.collection("knowledge")
+    for (key, item) in ITEMS.items():
+        collection.upsert(key, item)
+    return (CouchbaseSource(db, "knowledge", batch_size=1), collection)
+
+def test_fingerprint_reads_no_content():
+    (src, collection) = source()
+    scans = []
+    scan = collection.scan
+    collection.scan = lambda *args, **kwargs: scans.append(args) or scan(*args, **kwargs)
+    src.fingerprint()
+    assert len(scans) == 1 and scans[0][1]["ids_only"]
+
+def test_fingerprint_tracks_changes():
+    (src, collection) = source()
+    fingerprint = src.fingerprint()
+    assert src.fingerprint() == fingerprint
+
+    collection.upsert("2", {**ITEMS["2"], "content": "Three years on parts."})
+    edited = src.fingerprint()
+    assert edited != fingerprint
+
+    collection.remove("1")
+    assert src.fingerprint() not in (fingerprint, edited)
+
+def test_load():
+    (src, _) = source()
+    assert sorted(src.load(), key=lambda item: item["id"]) == [
+        {"id": key, **item} for (key, item) in ITEMS.items()
+    ]
@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from api.clients.http import AsyncClient
+from api.clients.llm import LLMProvider, OpenAIProvider, create_provider
+from api.routes import IntentClassification
+from tests.fake_llm import create_app
+
+def provider(latency: float = 0.0) -> OpenAIProvider:
+    app = create_app(latency)
+    http = AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://fake")
+    return OpenAIProvider(http, "http://fake", model="fake")
+
+def test_call():
+    async def run():
+        llm = provider()
+        assert await llm.call("bake_response", "Answer.", {"q": "hi"}) == "Hello from the fake model!"
+    asyncio.run(run())
+
+def test_call_structured():
+    async def run():
+        llm = provider()
+        intent = await llm.call("determine_intent", "Classify.", {"q": "hi"}, IntentClassification)
+        assert intent.intent == "troubleshooting"
+    asyncio.run(run())
+
+def test_stream():
+    async def run():
+        llm = provider()
+        deltas = [delta async for delta in llm.stream("stream_response", "Answer.", {"q": "hi"})]
+        assert "".join(deltas) == "Hello from the fake model!"
+        assert len(deltas) > 1
+    asyncio.run(run())
+
+def test_calls_overlap():
+    async def run():
+        llm = provider(latency=0.1)
+        start = time.perf_counter()
+        await asyncio.gather(*(llm.call("bake_response", "Answer.", {"i": i}) for i in range(20)))
+        return time.perf_counter() - start
+    # 20 sequential calls would take 2 s
+    assert asyncio.run(run()) < 1.0
+
+def test_create_provider_unknown():
+    with pytest.raises(ValueError):
+        create_provider("opeanai", AsyncClient())
+
+def test_create_provider_opper_without_key():
+    with pytest.raises(ValueError):
+        create_provider("opper", AsyncClient(), opper_api_key=None)
+
+def test_provider_must_implement_call_and_stream():
+    class Partial(LLMProvider):
+        async def call(self, name, instructions, input, output_type=str):
+            return ""
+
+    with pytest.raises(TypeError):
+        Partial()
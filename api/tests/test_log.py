@@ -0,0 +1,26 @@
+import json
+import logging
+
+from api.utils import log
+
+def record(msg: str, context: dict = None) -> logging.LogRecord:
+    made = logging.LogRecord("api.test", logging.INFO, __file__, 1, msg, (), None)
+    if context is not None:
+        made.context = context
+    return made
+
+def test_json_lines_follow_the_context():
+    formatter = log.JsonFormatter("%(message)s")
+    first = {"request_id": "req-1"}
+    lines = [
+        formatter.format(record("\x1b[31mred\x1b[39m", first)),
+        formatter.format(record("again", first)),
+        formatter.format(record("other", {"request_id": "req-2", "attempt": 2})),
+        formatter.format(record("none")),
+    ]
+    parsed = [json.loads(line) for line in lines]
+    assert [(p["msg"], p.get("request_id")) for p in parsed] == [
+        ("red", "req-1"), ("again", "req-1"), ("other", "req-2"), ("none", None)
+    ]
+    assert parsed[2]["attempt"] == 2
+    assert (parsed[0]["level"], parsed[0]["logger"]) == ("INFO", "api.test")
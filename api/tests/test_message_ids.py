@@ -0,0 +1,61 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from api.clients.couchbase import AsyncCouchbaseChatClient
+from tests.fakes import fake_client
+
+WRITERS = 32
+MESSAGES_PER_WRITER = 100
+
+def check_history(db, chat_id: str, added: list[int]) -> None:
+    """Every added ID is unique, and the history holds every message, in ID order."""
+    assert len(set(added)) == len(added)
+    history = db.get_messages(chat_id)
+    assert [message["id"] for message in history] == sorted(added)
+    assert len(db.messages.docs) == len(added) + 2
+
+def test_concurrent_writers_from_threads():
+    db = fake_client()
+    chat_id = db.create_chat()
+
+    def write(writer: int) -> list[int]:
+        return [
+            db.add_message(chat_id, "user", f"{writer}:{i}")[0]
+            for i in range(MESSAGES_PER_WRITER)
+        ]
+
+    with ThreadPoolExecutor(WRITERS) as executor:
+        added = [message_id for ids in executor.map(write, range(WRITERS)) for message_id in ids]
+
+    check_history(db, chat_id, added)
+    # Each writer's messages read back in the order it wrote them
+    history = db.get_messages(chat_id)
+    for writer in range(WRITERS):
+        mine = [m["content"] for m in history if m["content"].startswith(f"{writer}:")]
+        assert mine == [f"{writer}:{i}" for i in range(MESSAGES_PER_WRITER)]
+
+def test_concurrent_batches_from_tasks():
+    raw = fake_client()
+
+    async def run() -> tuple[str, list[int]]:
+        db = AsyncCouchbaseChatClient(raw, max_workers=WRITERS)
+        chat_id = await db.create_chat()
+
+        async def write(writer: int) -> list[int]:
+            added = []
+            for i in range(MESSAGES_PER_WRITER // 2):
+                turn = [("user", f"{writer}:{i}:q", None), ("assistant", f"{writer}:{i}:a", None)]
+                added.extend(message_id for (message_id, _) in await db.add_messages(chat_id, turn))
+            return added
+
+        results = await asyncio.gather(*(write(writer) for writer in range(WRITERS)))
+        return (chat_id, [message_id for ids in results for message_id in ids])
+
+    (chat_id, added) = asyncio.run(run())
+    check_history(raw, chat_id, added)
+    # Both messages of a turn get consecutive IDs
+    history = raw.get_messages(chat_id)
+    for (question, answer) in zip(history, history[1:]):
+        if question["role"] == "user":
+            assert answer["content"] == question["content"][:-1] + "a"
+            assert answer["id"] == question["id"] + 1
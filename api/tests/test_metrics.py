@@ -0,0 +1,38 @@
+from api import metrics
+
+def test_render_names_families_like_their_samples():
+    errors = metrics.Counter("store_errors", "Failed operations", ["operation"])
+    latency = metrics.Histogram("store_seconds", "Operation latency", ["operation"], buckets=(0.1, 1.0))
+    errors.inc("get")
+    latency.observe(0.5, "get")
+
+    lines = metrics.render([errors, latency]).splitlines()
+    assert "# HELP store_errors_total Failed operations" in lines
+    assert "# TYPE store_errors_total counter" in lines
+    assert 'store_errors_total{operation="get"} 1' in lines
+    assert "# TYPE store_seconds histogram" in lines
+    assert 'store_seconds_bucket{operation="get",le="1"} 1' in lines
+
+    # Every sample belongs to the family declared before it
+    family = None
+    for line in lines:
+        if line.startswith("# TYPE "):
+            (family, _) = line[len("# TYPE "):].split(" ")
+        elif not line.startswith("#"):
+            assert line.startswith(family)
+
+def test_timed_records_calls_and_errors():
+    latency = metrics.Histogram("calls_seconds", "Call latency", ["fn"])
+    errors = metrics.Counter("call_errors", "Failed calls", ["fn"])
+
+    @metrics.timed(latency, errors, "fail")
+    def fail():
+        raise ValueError()
+
+    for _ in range(3):
+        try:
+            fail()
+        except ValueError:
+            pass
+    assert sum(latency.labels("fail").counts) == 3
+    assert 'call_errors_total{fn="fail"} 3' in list(errors.samples())
@@ -0,0 +1,39 @@
+import asyncio
+
+from api.clients import couchbase
+from api.clients.couchbase import AsyncCouchbaseChatClient
+from tests.fakes import FakeCluster, call_api, fake_api, fake_client
+
+def starting_store(failures: int) -> AsyncCouchbaseChatClient:
+    client = fake_client()
+    client.cluster = FakeCluster(failures=failures)
+    return AsyncCouchbaseChatClient(client)
+
+def test_wait_until_ready_backs_off(monkeypatch):
+    db = starting_store(failures=4)
+    delays = []
+
+    async def sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(couchbase.asyncio, "sleep", sleep)
+    asyncio.run(db.wait_until_ready(initial_delay=1.0, max_delay=2.0))
+    assert delays == [1.0, 1.5, 2.0, 2.0]
+    assert len(db.client.cluster.statements) == 5
+    assert db.ready
+
+def test_ready_probe_turns_ready():
+    db = starting_store(failures=2)
+    app = fake_api(db)
+    db.ready = False
+    response = call_api(app, "GET", "/api/health/ready")
+    assert response.status_code == 503
+    response = call_api(app, "POST", "/api/chats")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+    asyncio.run(db.wait_until_ready(initial_delay=0.01))
+    response = call_api(app, "GET", "/api/health/ready")
+    assert response.status_code == 200
+    assert response.json() == {"message": "ready"}
+    assert call_api(app, "POST", "/api/chats").status_code == 200
@@ -0,0 +1,51 @@
+import asyncio
+
+from api.cache import MemoryCache, ResponseCache
+from api.clients.couchbase import AsyncCouchbaseChatClient
+from tests.fakes import call_api, fake_api, fake_client
+
+def cached_api():
+    db = AsyncCouchbaseChatClient(fake_client())
+    cache = ResponseCache(MemoryCache("response", max_size=16))
+    return (db, fake_api(db, response_cache=cache))
+
+def turn(db, app, content: str = "Where is my order?", **kwargs):
+    chat_id = asyncio.run(db.create_chat())
+    return call_api(app, "POST", f"/api/chats/{chat_id}/messages", json={"content": content}, **kwargs)
+
+def test_turn_misses_then_hits():
+    (db, app) = cached_api()
+    first = turn(db, app)
+    second = turn(db, app)
+    assert first.headers["X-Response-Cache"] == "miss"
+    assert second.headers["X-Response-Cache"] == "hit"
+    assert second.json()["response"]["content"] == first.json()["response"]["content"]
+
+def test_turn_misses_for_another_message():
+    (db, app) = cached_api()
+    turn(db, app)
+    assert turn(db, app, "How do I reset my password?").headers["X-Response-Cache"] == "miss"
+
+def test_no_cache_bypasses():
+    (db, app) = cached_api()
+    turn(db, app)
+    response = turn(db, app, headers={"Cache-Control": "no-cache"})
+    assert response.headers["X-Response-Cache"] == "bypass"
+
+def test_no_header_without_cache():
+    db = AsyncCouchbaseChatClient(fake_client())
+    assert "X-Response-Cache" not in turn(db, fake_api(db)).headers
+
+def test_stats_per_route():
+    (db, app) = cached_api()
+    turn(db, app)
+    turn(db, app)
+    chat_id = asyncio.run(db.create_chat())
+    call_api(app, "POST", f"/api/chats/{chat_id}/messages/stream", json={"content": "Where is my order?"})
+    turn(db, app, headers={"Cache-Control": "no-cache"})
+
+    stats = call_api(app, "GET", "/api/cache/stats").json()["caches"]["response"]
+    assert stats["routes"]["chat_message"]["hits"] == 1
+    assert stats["routes"]["chat_message"]["misses"] == 1
+    assert stats["routes"]["chat_message_stream"]["hits"] == 1
+    assert stats["routes"]["chat_message_stream"]["misses"] == 0
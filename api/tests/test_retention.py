@@ -0,0 +1,85 @@
+import asyncio
+from datetime import datetime, timedelta
+import itertools
+
+import pytest
+
+from api.cache import MemoryCache
+from api.clients.couchbase import AsyncCouchbaseChatClient
+from api import retention
+from api.retention import RetentionSweeper
+from tests.fakes import fake_client
+
+RETENTION = timedelta(days=30)
+
+needs_batched = pytest.mark.skipif(
+    not hasattr(itertools, "batched"), reason="sweeps need Python 3.12"
+)
+
+def test_writes_stamp_chats():
+    db = fake_client(retention=RETENTION)
+    chat_id = db.create_chat()
+    assert db.chats.docs[chat_id]["retention"] == db.retention_stamp
+    db.chats.docs[chat_id].pop("retention")
+    db.add_message(chat_id, "user", "hello")
+    assert db.chats.docs[chat_id]["retention"] == db.retention_stamp
+
+@needs_batched
+def test_sweep_skips_chats_written_under_retention():
+    db = fake_client(retention=RETENTION)
+    chat_id = db.create_chat()
+    db.add_message(chat_id, "user", "hello")
+    ops = db.messages.ops
+    stats = RetentionSweeper(db, pause=0).sweep()
+    assert (stats.scanned, stats.skipped, stats.updated) == (1, 1, 0)
+    assert db.messages.ops == ops
+
+@needs_batched
+def test_sweep_invalidates_deleted_chats():
+    raw = fake_client()
+    store = AsyncCouchbaseChatClient(raw, history_cache=MemoryCache("history"))
+
+    async def run():
+        chat_id = await store.create_chat()
+        await store.add_message(chat_id, "user", "hello")
+        raw.chats.docs[chat_id]["updated_at"] = (datetime.utcnow() - 2 * RETENTION).isoformat()
+        raw.retention = RETENTION
+
+        sweeper = RetentionSweeper(raw, pause=0, invalidate=store.invalidate)
+        sweeper.start()
+        while chat_id in raw.chats.docs:
+            await asyncio.sleep(0.01)
+        await sweeper.close()
+        assert await store.get_messages(chat_id) == []
+    asyncio.run(run())
+
+def test_restamping_a_chat_sets_the_counter_expiry():
+    db = fake_client()
+    chat_id = db.create_chat()
+    db.add_message(chat_id, "user", "before retention")
+    counter = db.sequence_key(chat_id)
+    assert counter not in db.messages.expiry
+
+    db.retention = RETENTION
+    chat = db.get_chat(chat_id)
+    db.add_message(chat_id, "user", "hello", chat=chat)
+    assert db.messages.expiry[counter] == RETENTION
+    assert chat["retention"] == db.retention_stamp
+
+    ops = db.messages.ops
+    db.add_message(chat_id, "assistant", "hi", chat=chat)
+    # Increment, insert and manifest append, with no touch
+    assert db.messages.ops == ops + 3
+
+def test_delete_gives_up_on_a_stuck_invalidation(monkeypatch):
+    db = fake_client(retention=RETENTION)
+    chat_id = db.create_chat()
+    monkeypatch.setattr(retention, "INVALIDATE_TIMEOUT", 0.05)
+
+    async def run():
+        stuck = asyncio.Event()
+        sweeper = RetentionSweeper(db, invalidate=lambda chat_id: stuck.wait())
+        sweeper._event_loop = asyncio.get_running_loop()
+        await asyncio.wait_for(asyncio.to_thread(sweeper._delete, chat_id), 5)
+    asyncio.run(run())
+    assert chat_id not in db.chats.docs
@@ -0,0 +1,42 @@
+import asyncio
+
+from api.cache import SemanticCache
+
+def test_exact_match_ignores_case_and_punctuation():
+    async def run():
+        cache = SemanticCache("intent")
+        await cache.set("My dishwasher will not drain", "troubleshooting")
+        assert await cache.get("my dishwasher, will NOT drain!") == "troubleshooting"
+        assert await cache.get("My dishwasher will not dry") is None
+        assert (cache.stats.hits, cache.stats.misses, cache.similar_hits) == (1, 1, 0)
+    asyncio.run(run())
+
+def test_paraphrase_hits_above_the_threshold():
+    async def run():
+        cache = SemanticCache("intent", similarity=0.8)
+        await cache.set("My dishwasher will not drain", "troubleshooting")
+        assert await cache.get("The dishwasher will not drain at all") == "troubleshooting"
+        assert cache.similar_hits == 1
+    asyncio.run(run())
+
+def test_unrelated_and_distant_prompts_miss():
+    async def run():
+        cache = SemanticCache("intent", similarity=0.8)
+        await cache.set("My dishwasher will not drain", "troubleshooting")
+        assert await cache.get("How long is the warranty?") is None
+        # Shares words, but falls below the threshold
+        assert await cache.get("my dishwasher won't drain") is None
+        assert (cache.stats.hits, cache.stats.misses, cache.similar_hits) == (0, 2, 0)
+    asyncio.run(run())
+
+def test_hits_count_the_average_computed_latency_as_saved():
+    async def run():
+        cache = SemanticCache("intent")
+        await cache.get("Where is my order?")
+        await cache.set("Where is my order?", "order_status", computed_ms=300.0)
+        await cache.set("How long is the warranty?", "policy", computed_ms=100.0)
+        await cache.get("Where is my order?")
+        await cache.get("where is my order")
+        assert cache.saved_ms == 400.0
+        assert cache.stats_dict()["saved_ms"] == 400.0
+    asyncio.run(run())
@@ -0,0 +1,55 @@
+import asyncio
+
+from api import tracing
+from api.utils import log
+
+class ListExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, spans):
+        self.spans.extend(spans)
+
+def test_untraced_spans_are_noops():
+    tracing.init(None)
+    with tracing.span("request", traceparent=f"00-{'a' * 32}-{'b' * 16}-01") as span:
+        span.set("http.status_code", 200)
+        assert span.traceparent is None
+        assert tracing.current_span() is None
+        assert "trace_id" not in log.get_context()
+
+    @tracing.traced("helper")
+    def helper():
+        return tracing.current_span()
+    assert helper() is None
+
+def test_spans_nest_and_continue_remote_parents():
+    exporter = ListExporter()
+    tracing.init(exporter)
+
+    @tracing.traced("helper")
+    async def helper():
+        return tracing.current_span()
+
+    @tracing.traced("numbers")
+    def numbers():
+        yield from range(3)
+
+    async def run():
+        with tracing.span("request", tracing.SERVER, traceparent=f"00-{'a' * 32}-{'b' * 16}-01") as request:
+            assert log.get_context()["span_id"] == request.span_id
+            inner = await helper()
+            assert list(numbers()) == [0, 1, 2]
+        return (request, inner)
+
+    try:
+        (request, inner) = asyncio.run(run())
+    finally:
+        tracing.shutdown()
+
+    spans = {span["name"]: span for span in exporter.spans}
+    assert set(spans) == {"request", "helper", "numbers"}
+    assert spans["request"]["traceId"] == "a" * 32
+    assert spans["request"]["parentSpanId"] == "b" * 16
+    assert spans["helper"]["parentSpanId"] == request.span_id == spans["numbers"]["parentSpanId"]
+    assert inner.trace_id == "a" * 32
@@ -0,0 +1,67 @@
+from datetime import timedelta
+
+import pytest
+
+from api.transfer import import_batch
+from tests.fakes import fake_client
+
+RECORD = {
+    "id": "chat-1",
+    "created_at": "2025-01-01T00:00:00",
+    "metadata": {"client_id": "c"},
+    "messages": [
+        {"role": "user", "content": "Hi"},
+        {"role": "assistant", "content": "Hello"},
+    ],
+}
+
+def test_import_sets_the_message_counter():
+    db = fake_client()
+    assert import_batch(db, ((RECORD, 1),)) == (1, 2, 1)
+    assert db.messages.docs[db.sequence_key("chat-1")] == 2
+    (message_id, _) = db.add_message("chat-1", "user", "Still there?")
+    assert message_id == 3
+    assert [m["content"] for m in db.get_messages("chat-1")] == ["Hi", "Hello", "Still there?"]
+
+def test_import_never_lowers_the_message_counter():
+    db = fake_client()
+    chat_id = db.create_chat()
+    (message_id, _) = db.add_message(chat_id, "user", "Hi")
+    import_batch(db, (({**RECORD, "id": chat_id}, 1),))
+    assert db.messages.docs[db.sequence_key(chat_id)] == message_id
+    (next_id, _) = db.add_message(chat_id, "user", "Still there?")
+    assert next_id == message_id + 1
+
+def test_advance_message_ids_raises_lagging_counters():
+    db = fake_client()
+    db.messages.upsert(db.sequence_key("behind"), 5)
+    db.messages.upsert(db.sequence_key("ahead"), 50)
+    db.advance_message_ids({"behind": 10, "ahead": 10, "new": 10})
+    assert db.messages.docs[db.sequence_key("behind")] == 10
+    assert db.messages.docs[db.sequence_key("ahead")] == 50
+    assert db.messages.docs[db.sequence_key("new")] == 10
+
+def test_import_applies_retention():
+    db = fake_client(retention=timedelta(days=30))
+    import_batch(db, ((RECORD, 1), ({"id": "chat-2", "messages": []}, 2)))
+    assert db.chats.docs["chat-1"]["retention"] == db.retention_stamp
+    assert set(db.chats.expiry) == {"chat-1", "chat-2"}
+    assert set(db.messages.expiry) == set(db.messages.docs)
+
+def test_import_rejects_repeated_message_ids():
+    db = fake_client()
+    record = {**RECORD, "messages": [
+        {"id": 1, "role": "user", "content": "Hi"},
+        {"id": 1, "role": "user", "content": "Hi again"},
+    ]}
+    with pytest.raises(ValueError):
+        import_batch(db, ((record, 1),))
+    with pytest.raises(ValueError):
+        import_batch(db, ((RECORD, 1), (RECORD, 2)))
+    assert db.messages.docs == {} and db.chats.docs == {}
+
+def test_import_counts_written_messages():
+    db = fake_client()
+    other = {"id": "chat-2", "messages": [{"id": 7, "role": "user", "content": "Hey"}]}
+    assert import_batch(db, ((RECORD, 1), (other, 2))) == (2, 3, 2)
+    assert len(db.messages.docs) == 3 + 2 + 2
@@ -3,6 +3,8 @@ import { ApiClientRest } from '../rest/api_client_rest';
 import { createChatApi, Message, Source } from '../rest/modules/chat';
 import { updateChatLastMessage } from '../services/chatStorage';
 
+const POLL_INTERVAL_MS = 5000;
+
 interface ChatProps {
   chatId: string;
   client: ApiClientRest;
@@ -20,13 +22,31 @@ const Chat: React.FC<ChatProps> = ({ chatId, client }) => {
   // We don't need any URL or pending message checking anymore
   // The WelcomeScreen component awaits the response before navigating here
 
-  // Load chat history when chatId changes
+  // ID of the newest message we have, to fetch only what came after it
+  const lastIdRef = useRef<number | undefined>(undefined);
+  const isLoadingRef = useRef(false);
+  isLoadingRef.current = isLoading;
+
+  // Load chat history when chatId changes, then poll for messages added elsewhere
   useEffect(() => {
     if (!chatId) return;
+    lastIdRef.current = undefined;
+    let cancelled = false;
 
     const loadChatHistory = async () => {
+      // Skip polls while we are adding messages ourselves
+      if (isLoadingRef.current) return;
+      const since = lastIdRef.current;
       try {
-        const chatMessages = await chatApi.getChatMessages(chatId);
+        // The first load is revalidated by the browser against the ETag; after
+        // that we ask only for newer messages, and get a 304 while there are none
+        const chatMessages = await chatApi.getChatMessages(
+          chatId,
+          since === undefined ? undefined : { since }
+        );
+        if (cancelled || isLoadingRef.current || lastIdRef.current !== since) return;
+        if (chatMessages.length === 0) return;
+        lastIdRef.current = chatMessages[chatMessages.length - 1].id;
 
         // Convert assistant to bot for rendering
         const formattedMessages = chatMessages.map(msg => ({
@@ -34,10 +54,11 @@ const Chat: React.FC<ChatProps> = ({ chatId, client }) => {
           role: msg.role === 'assistant' ? 'bot' as const : msg.role
         })).filter(msg => msg.role !== 'system'); // Exclude system messages from display
 
-        // If we have messages from the server, replace our local state
-        if (formattedMessages.length > 0) {
+        // The first load replaces our local state, later ones append to it
+        if (since === undefined) {
           setMessages(formattedMessages);
-          setIsLoading(false); // Turn off loading if it was on
+        } else {
+          setMessages(prev => prev.concat(formattedMessages));
         }
       } catch (error) {
         // Error loading chat history
@@ -45,6 +66,11 @@ const Chat: React.FC<ChatProps> = ({ chatId, client }) => {
     };
 
     loadChatHistory();
+    const interval = setInterval(loadChatHistory, POLL_INTERVAL_MS);
+    return () => {
+      cancelled = true;
+      clearInterval(interval);
+    };
   }, [chatId, chatApi]);
 
   // Scroll to bottom when messages change
@@ -69,7 +95,12 @@ const Chat: React.FC<ChatProps> = ({ chatId, client }) => {
     ]);
 
     try {
-      const response = await chatApi.sendMessage(chatId, userMessage.content);
+      const response = await chatApi.sendMessageStream(chatId, userMessage.content, (text) => {
+        // Render the partial response in place of the loading message
+        setMessages((prev) => prev.map(msg =>
+          msg.isLoading ? { ...msg, content: text } : msg
+        ));
+      });
 
       // Format assistant message as bot for rendering
       const botMessage: Message = {
@@ -79,6 +110,7 @@ const Chat: React.FC<ChatProps> = ({ chatId, client }) => {
 
       // Replace the loading message with the actual response
       setMessages((prev) => prev.filter(msg => !msg.isLoading).concat([botMessage]));
+      lastIdRef.current = response.response.id;
 
       // Update chat in storage with the new last message
       updateChatLastMessage(chatId, userMessage.content);
@@ -1,6 +1,11 @@
-import React, { useEffect, useState } from 'react';
+import React, { useCallback, useEffect, useMemo, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { getStoredChats, removeStoredChat, StoredChatSession } from '../services/chatStorage';
+import { ApiClientRest } from '../rest/api_client_rest';
+import { createChatApi } from '../rest/modules/chat';
+import { chatFromApi, getClientId, removeStoredChat, setClientId, StoredChatSession } from '../services/chatStorage';
+
+const PAGE_SIZE = 30;
+const REFRESH_INTERVAL_MS = 5000;
 
 interface ChatSidebarProps {
   activeChatId?: string | null;
@@ -10,36 +15,83 @@ interface ChatSidebarProps {
 
 const ChatSidebar: React.FC<ChatSidebarProps> = ({ activeChatId, onSelectChat, onNewChat }) => {
   const [chats, setChats] = useState<StoredChatSession[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | undefined>();
+  const [clientId, setClientIdState] = useState(getClientId);
+  const apiClient = useMemo(() => new ApiClientRest(), []);
+  const chatApi = useMemo(() => createChatApi(apiClient), [apiClient]);
   const navigate = useNavigate();
 
-  // Load chats from session storage
-  useEffect(() => {
-    const storedChats = getStoredChats();
-    setChats(storedChats);
-
-    // Set up listener for storage events
-    const handleStorageChange = () => {
-      setChats(getStoredChats());
-    };
+  // Load the first page of the user's chats, newest first
+  const loadChats = useCallback(async () => {
+    try {
+      const page = await chatApi.listChats({ metadata: { client_id: clientId }, limit: PAGE_SIZE });
+      // Switched to another ID meanwhile
+      if (clientId !== getClientId()) return;
+      const first = page.chats.map(chatFromApi);
+      setChats(prev => {
+        if (!page.next_cursor || first.length === 0) return first;
+        // Keep the older chats loaded with "Load more"
+        const ids = new Set(first.map(chat => chat.id));
+        const oldest = first[first.length - 1].lastUpdated;
+        return first.concat(prev.filter(chat => !ids.has(chat.id) && chat.lastUpdated < oldest));
+      });
+      // Cursors are positions in the listing, so one from an earlier load stays valid
+      setNextCursor(prev => (prev && page.next_cursor ? prev : page.next_cursor));
+    } catch (e) {
+      // Keep showing the chats we have
+    }
+  }, [chatApi, clientId]);
 
-    window.addEventListener('storage', handleStorageChange);
-    return () => window.removeEventListener('storage', handleStorageChange);
-  }, []);
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    try {
+      const page = await chatApi.listChats({ metadata: { client_id: clientId }, limit: PAGE_SIZE, cursor: nextCursor });
+      setChats(prev => {
+        const ids = new Set(prev.map(chat => chat.id));
+        return prev.concat(page.chats.map(chatFromApi).filter(chat => !ids.has(chat.id)));
+      });
+      setNextCursor(page.next_cursor);
+    } catch (e) {
+      // Try again on the next click
+    }
+  };
 
-  // Manually check for changes every second
+  // Load chats from the API, and refresh them periodically
   useEffect(() => {
-    const interval = setInterval(() => {
-      setChats(getStoredChats());
-    }, 1000);
+    loadChats();
+    const interval = setInterval(loadChats, REFRESH_INTERVAL_MS);
     return () => clearInterval(interval);
-  }, []);
+  }, [loadChats]);
 
-  const handleDeleteChat = (e: React.MouseEvent, chatId: string) => {
+  // Switch to the chats of another ID, e.g. one copied from another device
+  const handleChangeClientId = () => {
+    const entered = window.prompt(
+      'Enter the ID your chats are saved under on your other device, or any ID (like your email) to use from now on:',
+      clientId
+    );
+    if (entered === null || entered.trim() === clientId) return;
+    if (!setClientId(entered)) {
+      alert('The ID must be between 1 and 128 characters.');
+      return;
+    }
+    setChats([]);
+    setNextCursor(undefined);
+    setClientIdState(getClientId());
+    navigate('/');
+  };
+
+  const handleDeleteChat = async (e: React.MouseEvent, chatId: string) => {
     e.stopPropagation();
 
     if (window.confirm('Are you sure you want to delete this chat?')) {
+      try {
+        await chatApi.deleteChat(chatId);
+      } catch (e) {
+        alert('Failed to delete chat. Please try again.');
+        return;
+      }
       removeStoredChat(chatId);
-      setChats(getStoredChats());
+      setChats(prev => prev.filter(chat => chat.id !== chatId));
 
       // Navigate away if we're on the deleted chat
       if (activeChatId === chatId) {
@@ -92,9 +144,24 @@ const ChatSidebar: React.FC<ChatSidebarProps> = ({ activeChatId, onSelectChat, o
                 </button>
               </li>
             ))}
+            {nextCursor && (
+              <li>
+                <button className="btn btn-ghost btn-sm w-full" onClick={loadMore}>
+                  Load more
+                </button>
+              </li>
+            )}
           </ul>
         )}
       </div>
+
+      <div className="p-4 border-t text-xs">
+        <div className="opacity-70">Chats saved under</div>
+        <div className="font-mono truncate" title={clientId}>{clientId}</div>
+        <button className="btn btn-ghost btn-xs mt-1 px-0" onClick={handleChangeClientId}>
+          Use on another device
+        </button>
+      </div>
     </div>
   );
 };
@@ -2,7 +2,7 @@ import React, { useState, useMemo } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { ApiClientRest } from '../rest/api_client_rest';
 import { createChatApi } from '../rest/modules/chat';
-import { addChatFromApi, setActiveChat } from '../services/chatStorage';
+import { addChatFromApi, getChatTitle, getClientId, setActiveChat } from '../services/chatStorage';
 
 interface WelcomeScreenProps {
   onChatCreated: (chatId: string) => void;
@@ -24,8 +24,8 @@ const WelcomeScreen: React.FC<WelcomeScreenProps> = ({ onChatCreated }) => {
     setIsLoading(true);
 
     try {
-      // Create a new chat
-      const chat = await chatApi.createChat();
+      // Create a new chat, tagged so the sidebar can list it
+      const chat = await chatApi.createChat({ client_id: getClientId(), title: getChatTitle(message) });
 
       // Store in session storage
       addChatFromApi(chat, message);
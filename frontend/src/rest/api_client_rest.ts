@@ -34,7 +34,8 @@ export class ApiClientRest implements ApiClientInterface {
                 on_error([error_data.detail || 'Not authorized']);
                 throw new Error('Not authorized');
             }
-            if (response.status === 204) {
+            // 304: nothing changed since the ETag or `since` we sent
+            if (response.status === 204 || response.status === 304) {
                 return null;
             }
             if (!response.ok) {
@@ -48,6 +49,48 @@ export class ApiClientRest implements ApiClientInterface {
         }
     }
 
+    // POSTs data and calls on_event for each line of a newline-delimited JSON response
+    public async postStream<T>(
+        path: string,
+        on_error: (messages: string[]) => void,
+        data: any,
+        on_event: (event: T) => void
+    ): Promise<void> {
+        const full_url = new URL(path, config.api_base_url).toString();
+        const response = await fetch(full_url, {
+            method: 'POST',
+            headers: {
+                'Accept': 'application/x-ndjson',
+                'Content-Type': 'application/json',
+            },
+            credentials: 'include' as const,
+            body: JSON.stringify(data),
+        });
+        if (!response.ok || !response.body) {
+            const error_data = await response.json().catch(() => ({}));
+            on_error([error_data.detail || `HTTP error! status: ${response.status}`]);
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop() || '';
+            for (const line of lines) {
+                if (line.trim()) {
+                    on_event(JSON.parse(line));
+                }
+            }
+        }
+        if (buffer.trim()) {
+            on_event(JSON.parse(buffer));
+        }
+    }
+
     public get<T>(path: string, on_error: (messages: string[]) => void): Promise<T> {
         return this.request<T>('GET', path, on_error) as Promise<T>;
     }
@@ -28,11 +28,44 @@ export interface ChatSession {
   metadata: any;
 }
 
+export interface ChatList {
+  chats: ChatSession[];
+  next_cursor?: string;
+}
+
+export interface ChatListQuery {
+  metadata?: Record<string, string>;
+  limit?: number;
+  cursor?: string;
+}
+
 export interface ChatMessageResponse {
   message: Message;
   response: Message;
 }
 
+export interface ChatMessageStreamEvent {
+  type: 'message' | 'delta' | 'response' | 'error';
+  message?: Message;
+  delta?: string;
+  response?: Message;
+  detail?: string;
+}
+
+export interface ChatHistory {
+  chat_id: string;
+  messages: Message[];
+  has_more: boolean;
+}
+
+export interface ChatHistoryPage {
+  limit?: number;
+  before?: number;
+  after?: number;
+  // Like after, but the server answers 304 when there is nothing newer
+  since?: number;
+}
+
 export interface MessageResponse {
   message: string;
 }
@@ -48,6 +81,23 @@ export function createChatApi(client: ApiClientInterface) {
       return response;
     },
 
+    async listChats(query?: ChatListQuery): Promise<ChatList> {
+      const on_error = () => {
+        // Error is handled by caller
+      };
+
+      const params = new URLSearchParams();
+      Object.entries(query?.metadata || {}).forEach(([key, value]) => {
+        params.set(`metadata.${key}`, value);
+      });
+      if (query?.limit !== undefined) params.set('limit', String(query.limit));
+      if (query?.cursor) params.set('cursor', query.cursor);
+      const search = params.toString() ? `?${params}` : '';
+
+      const response = await client.get<ChatList>(`/api/chats${search}`, on_error);
+      return response;
+    },
+
     async getChat(chatId: string): Promise<ChatSession> {
       const on_error = () => {
         // Error is handled by caller
@@ -57,13 +107,20 @@ export function createChatApi(client: ApiClientInterface) {
       return response;
     },
 
-    async getChatMessages(chatId: string): Promise<Message[]> {
+    async getChatMessages(chatId: string, page?: ChatHistoryPage): Promise<Message[]> {
       const on_error = () => {
         // Error is handled by caller
       };
 
-      const response = await client.get<{ chat_id: string, messages: Message[] }>(`/api/chats/${chatId}/messages`, on_error);
-      return response.messages;
+      const params = new URLSearchParams();
+      Object.entries(page || {}).forEach(([key, value]) => {
+        if (value !== undefined) params.set(key, String(value));
+      });
+      const query = params.toString() ? `?${params}` : '';
+
+      const response = await client.get<ChatHistory | null>(`/api/chats/${chatId}/messages${query}`, on_error);
+      // Not modified: no messages newer than `since`
+      return response ? response.messages : [];
     },
 
     async sendMessage(chatId: string, content: string, metadata?: any): Promise<{ message: Message, response: Message }> {
@@ -83,6 +140,43 @@ export function createChatApi(client: ApiClientInterface) {
       };
     },
 
+    async sendMessageStream(
+      chatId: string,
+      content: string,
+      onDelta: (text: string) => void,
+      metadata?: any
+    ): Promise<{ message: Message, response: Message }> {
+      const on_error = () => {
+        // Error is handled by caller
+      };
+
+      let message: Message | undefined;
+      let response: Message | undefined;
+      let text = '';
+      await client.postStream<ChatMessageStreamEvent>(
+        `/api/chats/${chatId}/messages/stream`,
+        on_error,
+        { content, metadata },
+        (event) => {
+          if (event.type === 'message') {
+            message = event.message;
+          } else if (event.type === 'delta' && event.delta) {
+            text += event.delta;
+            onDelta(text);
+          } else if (event.type === 'response') {
+            response = event.response;
+          } else if (event.type === 'error') {
+            throw new Error(event.detail || 'Failed to generate response');
+          }
+        }
+      );
+
+      if (!message || !response) {
+        throw new Error('Response stream ended unexpectedly');
+      }
+      return { message, response };
+    },
+
     async deleteChat(chatId: string): Promise<MessageResponse> {
       const on_error = () => {
         // Error is handled by caller
@@ -3,6 +3,7 @@ export interface ApiClientInterface {
     post<T>(url: string, on_error: (messages: string[]) => void, data: any): Promise<T>;
     put<T>(url: string, on_error: (messages: string[]) => void, data: any): Promise<T>;
     delete<T = null>(url: string, on_error: (messages: string[]) => void): Promise<T>;
+    postStream<T>(url: string, on_error: (messages: string[]) => void, data: any, on_event: (event: T) => void): Promise<void>;
 }
 
 export type ApiModuleFactory = (client: ApiClientInterface) => Record<string, Function>;
@@ -10,6 +10,40 @@ export interface StoredChatSession {
 
 const CHATS_STORAGE_KEY = 'customer_support_chats';
 const ACTIVE_CHAT_KEY = 'active_chat_id';
+const CLIENT_ID_KEY = 'customer_support_client_id';
+
+// Get the ID chats are tagged with, so they can be listed from the API. It
+// starts out random per browser; setting the same ID on another device, such
+// as an email address or a copied sync code, lists the same chats there.
+export const getClientId = (): string => {
+  let clientId = localStorage.getItem(CLIENT_ID_KEY);
+  if (!clientId) {
+    clientId = crypto.randomUUID();
+    localStorage.setItem(CLIENT_ID_KEY, clientId);
+  }
+  return clientId;
+};
+
+// Set the ID chats are tagged with, returning false if it's blank or too long
+export const setClientId = (clientId: string): boolean => {
+  const trimmed = clientId.trim();
+  if (!trimmed || trimmed.length > 128) return false;
+  localStorage.setItem(CLIENT_ID_KEY, trimmed);
+  // Titles and last messages stored for the previous ID's chats don't apply
+  sessionStorage.removeItem(CHATS_STORAGE_KEY);
+  return true;
+};
+
+// Convert a chat listed by the API, keeping the title and last message stored for it
+export const chatFromApi = (chat: ChatSession): StoredChatSession => {
+  const stored = getStoredChats().find(c => c.id === chat.id);
+  return {
+    id: chat.id,
+    title: stored?.title || chat.metadata?.title || new Date(chat.created_at).toLocaleString(),
+    lastMessage: stored?.lastMessage,
+    lastUpdated: chat.updated_at
+  };
+};
 
 // Get all chat sessions from session storage
 export const getStoredChats = (): StoredChatSession[] => {
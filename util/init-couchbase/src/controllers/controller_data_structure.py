@@ -1,9 +1,12 @@
+import time
 from couchbase.management.collections import CreateCollectionSettings
+from couchbase.options import QueryOptions
 from couchbase.exceptions import ScopeAlreadyExistsException, CollectionAlreadyExistsException
 
 class ControllerDataStructure:
-    def __init__(self, bucket):
+    def __init__(self, bucket, cluster=None):
         self.bucket = bucket
+        self.cluster = cluster
 
     def create_scope(self, collection_manager, scope_name):
         try:
@@ -24,10 +27,71 @@ class ControllerDataStructure:
             except CollectionAlreadyExistsException:
                 print(f"Collection '{collection_name}' already exists in scope '{scope_name}'.")
 
-    def create(self, spec):
+    def keyspace(self, scope_name, collection_name):
+        return f"`{self.bucket.name}`.`{scope_name}`.`{collection_name}`"
+
+    def index_states(self, scope_name, collection_name):
+        result = self.cluster.query(
+            "SELECT i.name, i.state FROM system:indexes AS i "
+            "WHERE i.bucket_id = $bucket AND i.scope_id = $scope AND i.keyspace_id = $collection",
+            QueryOptions(named_parameters={
+                'bucket': self.bucket.name,
+                'scope': scope_name,
+                'collection': collection_name
+            })
+        )
+        return {row['name']: row['state'] for row in result}
+
+    def create_indexes(self, scope_name, collection_name, indexes):
+        keyspace = self.keyspace(scope_name, collection_name)
+        for index_name, keys in indexes.items():
+            self.cluster.query(
+                f"CREATE INDEX `{index_name}` IF NOT EXISTS ON {keyspace}({', '.join(keys)}) "
+                'WITH {"defer_build": true}'
+            ).execute()
+            print(f"Index '{index_name}' defined on '{scope_name}.{collection_name}'.")
+
+    def build_indexes(self, scope_name, collection_name, index_names):
+        # Includes indexes left deferred by an earlier interrupted run
+        states = self.index_states(scope_name, collection_name)
+        deferred = [name for name in index_names if states.get(name) in ('deferred', 'created')]
+        if not deferred:
+            print(f"Indexes on '{scope_name}.{collection_name}' already built.")
+            return
+        names = ', '.join(f"`{name}`" for name in deferred)
+        self.cluster.query(
+            f"BUILD INDEX ON {self.keyspace(scope_name, collection_name)}({names})"
+        ).execute()
+        print(f"Building indexes {deferred} on '{scope_name}.{collection_name}'.")
+
+    def wait_for_indexes_online(self, scope_name, collection_name, index_names, max_retries=300, retry_interval=1):
+        for attempt in range(max_retries):
+            states = self.index_states(scope_name, collection_name)
+            pending = [name for name in index_names if states.get(name) != 'online']
+            if not pending:
+                print(f"Indexes on '{scope_name}.{collection_name}' are online.")
+                return
+            if attempt == max_retries - 1:
+                raise Exception(f"Timeout: waiting until indexes {pending} are online.")
+            print(f"Waiting until indexes {pending} are online ...")
+            time.sleep(retry_interval)
+
+    def ensure_indexes(self, index_spec):
+        # Indexes are created deferred and built together with one BUILD INDEX
+        # per collection, so its data is scanned once rather than per index
+        for scope_name, collections in index_spec.items():
+            for collection_name, indexes in collections.items():
+                self.create_indexes(scope_name, collection_name, indexes)
+                self.build_indexes(scope_name, collection_name, list(indexes))
+        for scope_name, collections in index_spec.items():
+            for collection_name, indexes in collections.items():
+                self.wait_for_indexes_online(scope_name, collection_name, list(indexes))
+
+    def create(self, spec, index_spec=None):
         collection_manager = self.bucket.collections()
         for scope_name, collection_names in spec.items():
             if scope_name != '_default':
                 self.create_scope(collection_manager, scope_name)
             self.create_collections(collection_manager, scope_name, collection_names)
-
+        if index_spec:
+            self.ensure_indexes(index_spec)
@@ -22,6 +22,21 @@ COUCHBASE_TYPE = get_env_var('COUCHBASE_TYPE', 'server')
 
 data_structure_spec = {"_default": ["chats", "chat_messages"]}
 
+# Secondary indexes, as scope -> collection -> index name -> index keys, one
+# for each query the API issues. Chat messages are only read by key and KV
+# range scans, so they need none.
+# idx_chats_updated_at serves the chat listing (GET /chats) in keyset order;
+# idx_chats_client_id serves it when filtered on the client_id metadata the
+# frontend tags its chats with.
+index_spec = {
+    "_default": {
+        "chats": {
+            "idx_chats_updated_at": ["updated_at DESC", "id DESC"],
+            "idx_chats_client_id": ["metadata.client_id", "updated_at DESC", "id DESC"],
+        }
+    }
+}
+
 def main():
     controller_cluster = ControllerCluster(COUCHBASE_HOST, COUCHBASE_USERNAME, COUCHBASE_PASSWORD, COUCHBASE_TLS, COUCHBASE_TYPE)
     if COUCHBASE_TYPE == 'server':
@@ -31,8 +46,8 @@ def main():
         controller_bucket = ControllerBucket(controller_cluster, cluster)
         bucket = controller_bucket.ensure_created(COUCHBASE_MAIN_BUCKET_NAME)
 
-        controller_data_structure = ControllerDataStructure(bucket)
-        controller_data_structure.create(data_structure_spec)
+        controller_data_structure = ControllerDataStructure(bucket, cluster)
+        controller_data_structure.create(data_structure_spec, index_spec)
     finally:
         cluster.close()
     sys.exit(0)